@@ -1,36 +1,68 @@
-from agents.query_parser_agent import QueryParserAgent
+from agents.query_parser_agent import QueryParserAgent, CONVERSATION_KEY
 from agents.sql_executor_agent import SQLExecutorAgent
 from agents.feedback_agent import FeedbackAgent
+from agents.index_advisor_agent import IndexAdvisorAgent
+from agents.revert_planner_agent import RevertPlannerAgent
+from agents.csv_loader_agent import CSVLoaderAgent
+from agents.speculative_translator import SpeculativeTranslator
 from database.history_manager import HistoryManager
-from database.db_connection import DBConnection
-import streamlit as st
+from database.connection_router import ConnectionRouter
+from database.local_engine import LocalEngine, LocalRouter, LOCAL_SCHEMA
+from database.schema_browser import SchemaBrowser
+from database.stats_catalog import StatsCatalog
 from utils.logger import Logger
-import re
+from utils.sql_classifier import requires_confirmation, classify, classify_all
+from utils.cost_guard import QueryBlockedError, ConfirmationRequiredError
+from utils.csv_partitioner import read_sample
+from utils.csv_upload import CSV_UPLOAD_KEY, is_csv_intent, csv_target_table, column_name
 import datetime
+import os
+import time
 
 class ControllerAgent:
-    def __init__(self):
-        self.parser = QueryParserAgent()
-        self.executor = SQLExecutorAgent()
+    def __init__(self, db_params, config, session=None):
+        # Context is injected so the pipeline runs without Streamlit; session is
+        # st.session_state in the UI and a plain dict in batch/scripted use
+        self.db_params = db_params
+        self.config = config
+        self.session = session if session is not None else {}
+        # One router per session: read-only work may go to replicas, and its write
+        # timestamp gives this session read-your-writes stickiness on the primary
+        self.router = ConnectionRouter.from_config(db_params, config)
+        # History and state capture always use the primary
+        self.history = HistoryManager(db_params)
+        self.parser = QueryParserAgent(db_params, config, self.session, self.history.translation_index, self.router)
+        self.executor = SQLExecutorAgent(db_params, config, self.router)
         self.feedback = FeedbackAgent()
-        self.history = HistoryManager()
+        self.index_advisor = IndexAdvisorAgent(db_params, self.history, self.router)
+        self.revert_planner = RevertPlannerAgent(db_params, self.history, self.router)
+        self.csv_loader = CSVLoaderAgent(db_params, config, self.router)
+        # Opt-in: drafts are translated in the background while the user is still typing
+        self.speculator = SpeculativeTranslator.from_config(self.parser, config)
+        # Sidebar table list and per-table details, read lazily and cached until the schema changes
+        self.schema_browser = SchemaBrowser.from_config(db_params, config)
+        self._local = None  # (LocalEngine, its QueryParserAgent), created on first use
         self.logger = Logger()
 
-    def process_query(self, user_input, schema_name):
+    def process_query(self, user_input, schema_name, sql_query=None):
+        # sql_query lets callers that translated ahead of time (e.g. TranslationScheduler) skip the parser
         self.logger.debug(f"Starting process_query for input: {user_input}")
         
-        sql_query = self.parser.parse_query(user_input, schema_name)
+        if sql_query is None and self.is_csv_load(user_input, schema_name):
+            return self.load_csv(user_input, schema_name)
+        if schema_name == LOCAL_SCHEMA:
+            return self.query_local(user_input, sql_query)
+        if sql_query is None:
+            sql_query = self._translate(user_input, schema_name)
         self.logger.debug(f"Parsed SQL query: {sql_query}")
         
         if sql_query.startswith("CLARIFY:"):
             self.logger.debug("Query needs clarification")
-            return {"status": "clarification_needed", "message": sql_query[8:]}
+            return self._clarification_needed(user_input, sql_query[8:])
         
-        if "delete" in sql_query.lower() or "update" in sql_query.lower() or "alter" in sql_query.lower():
+        if requires_confirmation(sql_query):
             self.logger.debug("Query requires confirmation")
-            st.session_state.confirm_needed = True
-            st.session_state.pending_query = {"input": user_input, "sql": sql_query}
-            return {"status": "confirmation_needed", "sql_query": sql_query}
+            return self._request_confirmation(user_input, sql_query, self._estimate(sql_query, schema_name), schema_name)
         
         try:
             # Capture state before execution
@@ -40,23 +72,350 @@ class ControllerAgent:
                 return {"status": "error", "message": state_error}
 
             self.logger.debug("Executing the main query")
-            result = self.executor.execute(sql_query, schema_name)
+            result, estimate = self.executor.execute_with_estimate(sql_query, schema_name)
+            executed_query = estimate["sql_query"] if estimate else sql_query
             
-            version_id = self.history.save_query(user_input, sql_query, schema_name, operation_type, table_name, state_data)
+            version_id = self.history.save_query(user_input, executed_query, schema_name, operation_type, table_name, state_data)
             self.logger.debug(f"Saved query to history with version_id: {version_id}")
+            self._tables_changed(executed_query, schema_name)
             
             self.logger.debug("Query processing completed successfully")
-            return {
-                "status": "success",
-                "result": result,
-                "sql_query": sql_query,
-                "learning_output": f"For your request: '{user_input}'\nGenerated SQL: {sql_query}",
-                "version_id": version_id
-            }
+            return self._success(user_input, sql_query, executed_query, result, estimate, version_id)
+        except ConfirmationRequiredError as e:
+            self.logger.debug(str(e))
+            return self._request_confirmation(user_input, sql_query, e.estimate, schema_name)
+        except QueryBlockedError as e:
+            self.logger.error(str(e))
+            return {"status": "error", "message": str(e), "sql_query": sql_query, "cost_estimate": e.estimate}
         except Exception as e:
             self.logger.error(f"Error executing query: {str(e)}")
             return {"status": "error", "message": f"Error executing query: {str(e)}"}
 
+    def execute_confirmed(self, user_input, sql_query, schema_name):
+        self.logger.debug(f"Executing confirmed query: {sql_query}")
+        try:
+            operation_type, table_name, state_data, state_error = self._capture_for_confirmed(sql_query, schema_name)
+            if state_error:
+                self.logger.error(state_error)
+                return {"status": "error", "message": state_error}
+
+            result, estimate = self.executor.execute_with_estimate(sql_query, schema_name, confirmed=True)
+            executed_query = estimate["sql_query"] if estimate else sql_query
+            version_id = self.history.save_query(user_input, executed_query, schema_name, operation_type, table_name, state_data)
+            self._tables_changed(executed_query, schema_name)
+
+            self.session["confirm_needed"] = False
+            self.session["pending_query"] = None
+            return self._success(user_input, sql_query, executed_query, result, estimate, version_id)
+        except QueryBlockedError as e:
+            self.logger.error(str(e))
+            return {"status": "error", "message": str(e), "sql_query": sql_query, "cost_estimate": e.estimate}
+        except Exception as e:
+            self.logger.error(f"Error executing confirmed query: {str(e)}")
+            return {"status": "error", "message": f"Error executing confirmed query: {str(e)}"}
+
+    def start_query(self, user_input, schema_name, sql_query=None, confirmed=False, max_execution_ms=None):
+        """Like process_query, but runs the statement on a background QueryJob.
+
+        Returns {"status": "running"} once the job is started; poll_query() then reports
+        progress and, when the job ends, the same result dict process_query would return.
+        """
+        if sql_query is None and self.is_csv_load(user_input, schema_name):
+            return self.load_csv(user_input, schema_name)
+        if schema_name == LOCAL_SCHEMA:
+            return self.query_local(user_input, sql_query)
+        if sql_query is None:
+            sql_query = self._translate(user_input, schema_name)
+        self.logger.debug(f"Starting background query: {sql_query}")
+        if sql_query.startswith("CLARIFY:"):
+            return self._clarification_needed(user_input, sql_query[8:])
+        if not confirmed and requires_confirmation(sql_query):
+            return self._request_confirmation(user_input, sql_query, self._estimate(sql_query, schema_name), schema_name)
+        try:
+            capture = self._capture_for_confirmed(sql_query, schema_name) if confirmed else self.history.capture_state(sql_query, schema_name)
+            if capture[3]:
+                self.logger.error(capture[3])
+                return {"status": "error", "message": capture[3]}
+            job = self.executor.submit(sql_query, schema_name, confirmed, max_execution_ms)
+        except Exception as e:
+            self.logger.error(f"Error starting query: {str(e)}")
+            return {"status": "error", "message": f"Error executing query: {str(e)}"}
+        self.session["running_query"] = {
+            "job": job, "user_input": user_input, "schema_name": schema_name,
+            "sql_query": sql_query, "confirmed": confirmed, "capture": capture[:3]
+        }
+        return {"status": "running", "sql_query": sql_query}
+
+    def speculate(self, user_input, schema_name):
+        """Start translating a draft that has not been submitted yet; see SpeculativeTranslator."""
+        if not user_input.strip() or not schema_name or schema_name == LOCAL_SCHEMA or self.is_csv_load(user_input, schema_name):
+            return
+        self.speculator.update(user_input, schema_name)
+
+    def process_clarification(self, clarification, schema_name, max_execution_ms=None, user_input=None):
+        """Answer a clarification_needed result; the parser continues its conversation instead of starting over.
+
+        `user_input` is the result's original request, used if the conversation is gone.
+        """
+        user_input, sql_query = self.parser.clarify(clarification, schema_name, user_input)
+        return self.start_query(user_input, schema_name, sql_query=sql_query, max_execution_ms=max_execution_ms)
+
+    def poll_query(self):
+        """Progress of the background query, or its final result once it has finished; None if nothing is running."""
+        running = self.session.get("running_query")
+        if not running:
+            return None
+        job = running["job"]
+        if job.running:
+            return {"status": "running", "sql_query": running["sql_query"], "elapsed_ms": job.elapsed_ms,
+                    "rows_fetched": job.rows_fetched, "connection_id": job.connection_id,
+                    "cancel_requested": job.cancel_requested}
+        self.session["running_query"] = None
+        user_input, sql_query = running["user_input"], running["sql_query"]
+        if job.status in ("cancelled", "timeout"):
+            reason = "cancelled" if job.status == "cancelled" else "stopped by the max execution time limit"
+            self.logger.debug(f"Query {reason} after {job.elapsed_ms} ms")
+            return {"status": "error", "message": f"Query {reason} after {job.elapsed_ms / 1000:.1f} s ({job.rows_fetched:,} rows fetched)",
+                    "sql_query": job.executed_query, "cost_estimate": job.estimate}
+        if isinstance(job.error, ConfirmationRequiredError):
+            return self._request_confirmation(user_input, sql_query, job.error.estimate, running["schema_name"])
+        if isinstance(job.error, QueryBlockedError):
+            return {"status": "error", "message": str(job.error), "sql_query": sql_query, "cost_estimate": job.error.estimate}
+        if job.error is not None:
+            self.logger.error(f"Error executing query: {str(job.error)}")
+            return {"status": "error", "message": f"Error executing query: {str(job.error)}"}
+        try:
+            operation_type, table_name, state_data = running["capture"]
+            version_id = self.history.save_query(user_input, job.executed_query, running["schema_name"], operation_type, table_name, state_data)
+        except Exception as e:
+            self.logger.error(f"Error saving query history: {str(e)}")
+            return {"status": "error", "message": f"Query ran but could not be saved to history: {str(e)}"}
+        self._tables_changed(job.executed_query, running["schema_name"])
+        if running["confirmed"]:
+            self.session["confirm_needed"] = False
+            self.session["pending_query"] = None
+        result = self._success(user_input, sql_query, job.executed_query, job.result, job.estimate, version_id)
+        result["elapsed_ms"] = job.elapsed_ms
+        return result
+
+    def cancel_query(self):
+        running = self.session.get("running_query")
+        if not running:
+            return False
+        try:
+            return running["job"].cancel()
+        except Exception as e:
+            self.logger.error(f"Error cancelling query: {str(e)}")
+            return False
+
+    def revert_chain(self, version_id, dry_run=False):
+        """Undo `version_id` and every later version that touched the same tables, as one plan."""
+        self.logger.debug(f"Planning revert to before version {version_id} (dry_run={dry_run})")
+        try:
+            result = self.revert_planner.revert(version_id, dry_run)
+            if result["status"] == "success" and not dry_run:
+                plan = result["plan"]
+                self.parser.stats_catalog.invalidate(plan["schema_name"], [step["table"] for step in plan["steps"] if step["table"]])
+                self.schema_browser.invalidate(plan["schema_name"])  # a revert may recreate or drop tables
+            return self._serialize_result(result)
+        except Exception as e:
+            self.logger.error(f"Error planning revert for version {version_id}: {str(e)}")
+            return {"status": "error", "message": f"Error planning revert for version {version_id}: {str(e)}"}
+
+    def is_csv_load(self, user_input, schema_name):
+        """True when `user_input` asks to load the uploaded CSV rather than query it.
+
+        On LOCAL_SCHEMA the file is already queryable, so "rows from the csv" is a query
+        there; only an explicit "upload csv into <table>" counts as a load (and is refused).
+        """
+        if not is_csv_intent(user_input):
+            return False
+        return schema_name != LOCAL_SCHEMA or csv_target_table(user_input) is not None
+
+    def load_csv(self, user_input, schema_name, progress=None):
+        """Load the uploaded CSV into the table named in `user_input` without translating the request.
+
+        Headers are mapped onto an existing table's columns (see QueryParserAgent.map_csv_columns);
+        a new table gets one VARCHAR(255) column per header and a history version whose revert drops it.
+        """
+        upload = self.session.get(CSV_UPLOAD_KEY)
+        if not upload or not os.path.exists(upload["path"]):
+            return {"status": "clarification_needed", "message": "Please upload a CSV file first."}
+        table_name = csv_target_table(user_input)
+        if schema_name == LOCAL_SCHEMA:
+            return {"status": "clarification_needed", "message": "Select a MySQL schema to load the CSV into."}
+        if not table_name:
+            return {"status": "clarification_needed", "message": f"Which table should {upload['name']} be loaded into? (e.g. 'upload csv into my_table')"}
+        try:
+            header, sample = read_sample(upload["path"])
+            if not header:
+                return {"status": "error", "message": f"{upload['name']} has no header row"}
+            db = self.router.connect()
+            try:
+                existing = db.get_columns(schema_name, table_name)
+            finally:
+                db.close()
+
+            create_sql = None
+            if existing:
+                columns, unresolved = self.parser.map_csv_columns(header, sample, table_name, existing)
+                if unresolved:
+                    return {"status": "clarification_needed",
+                            "message": f"Could not match CSV column(s) {', '.join(unresolved)} to {table_name} ({', '.join(existing)}). Rename them in the file and upload it again."}
+            else:
+                columns = [column_name(name) for name in header]
+                create_sql = f"CREATE TABLE {schema_name}.{table_name} ({', '.join(f'`{col}` VARCHAR(255)' for col in columns)})"
+                capture = self.history.capture_state(create_sql, schema_name)
+                if capture[3]:
+                    self.logger.error(capture[3])
+                    return {"status": "error", "message": capture[3]}
+
+            message = self.csv_loader._load_csv_to_table(upload["path"], table_name, schema_name, progress, columns)
+            if message.startswith("Error"):
+                return {"status": "error", "message": message}
+            self.parser.stats_catalog.invalidate(schema_name, [table_name])
+            self.schema_browser.invalidate(schema_name, [table_name])
+            # Appending to an existing table is not versioned: its new rows cannot be told apart afterwards
+            version_id = self.history.save_query(user_input, create_sql, schema_name, *capture[:3]) if create_sql else None
+            executed = create_sql or f"-- {upload['name']} appended to {schema_name}.{table_name} ({', '.join(columns)})"
+            return self._success(user_input, executed, executed, {"columns": ["Result"], "rows": [[message]]}, None, version_id)
+        except Exception as e:
+            self.logger.error(f"Error loading CSV: {str(e)}")
+            return {"status": "error", "message": f"Error loading CSV: {str(e)}"}
+
+    def local_engine(self):
+        """The session's LocalEngine with the current upload registered, or None without an upload."""
+        upload = self.session.get(CSV_UPLOAD_KEY)
+        if not upload or not self.config.get("local_engine_enabled", True):
+            self.release_local_engine()
+            return None
+        if self._local is None:
+            engine = LocalEngine.from_config(self.config)
+            parser = QueryParserAgent(self.db_params, self.config, self.session, None, LocalRouter(engine))
+            parser.stats_catalog = StatsCatalog(self.db_params, enabled=False)  # sampled through MySQL only
+            self._local = (engine, parser)
+        engine = self._local[0]
+        for name, entry in list(engine.tables.items()):
+            if entry["path"] != upload["path"]:
+                engine.unregister(name)  # replaced or removed upload
+        engine.register(upload["path"], column_name(os.path.splitext(upload["name"])[0]), upload["file_id"])
+        return engine
+
+    def shutdown(self):
+        """Stop the session's background work (speculative translation threads, LocalEngine) when it is dropped."""
+        self.speculator.shutdown()
+        self.release_local_engine()
+
+    def release_local_engine(self):
+        """Shut the LocalEngine down (deleting its SQLite copy of the CSVs); the next local_engine() starts afresh."""
+        if self._local is not None:
+            self._local[0].shutdown()
+            self._local = None
+
+    def query_local(self, user_input, sql_query=None):
+        """Answer a request from the uploaded CSV with the in-process LocalEngine; MySQL is not touched."""
+        try:
+            engine = self.local_engine()
+            if engine is None:
+                return {"status": "clarification_needed", "message": "Please upload a CSV file first."}
+            if sql_query is None:
+                sql_query = self._local[1].parse_query(user_input, LOCAL_SCHEMA)
+            if sql_query.startswith("CLARIFY:"):
+                return self._clarification_needed(user_input, sql_query[8:])
+            if not all(statement.is_read_only for statement in classify_all(sql_query)):
+                return {"status": "error", "sql_query": sql_query,
+                        "message": "Uploaded CSVs are read-only here; select a MySQL schema and say 'upload csv into <table>' to load the file."}
+            result = engine.execute_query(sql_query)
+            return self._success(user_input, sql_query, sql_query, result, None, None)
+        except Exception as e:
+            self.logger.error(f"Error querying the uploaded CSV: {str(e)}")
+            return {"status": "error", "message": f"Error querying the uploaded CSV: {str(e)}", "sql_query": sql_query}
+
+    def export_result(self, sql_query, schema_name, fmt="csv"):
+        """Export the full result of a SELECT (without the cost guard's display LIMIT) to a file."""
+        try:
+            stats = self.executor.export(sql_query, schema_name, fmt)
+            self.logger.debug(f"Exported {stats['rows']} rows to {stats['path']} at {stats['rows_per_second']} rows/s")
+            return {"status": "success", **stats}
+        except Exception as e:
+            self.logger.error(f"Error exporting query result: {str(e)}")
+            return {"status": "error", "message": f"Error exporting query result: {str(e)}"}
+
+    def _translate(self, user_input, schema_name):
+        sql_query = self.speculator.take(user_input, schema_name)
+        if sql_query is None:
+            return self.parser.parse_query(user_input, schema_name)
+        self.session.pop(CONVERSATION_KEY, None)  # same reset parse_query does for a new request
+        return sql_query
+
+    def _tables_changed(self, sql_query, schema_name):
+        # Column statistics of written tables are rebuilt on the next prompt that names them
+        statements = classify_all(sql_query)
+        if not all(statement.is_read_only for statement in statements):
+            self.parser.stats_catalog.invalidate(schema_name, [t for statement in statements for t in statement.tables])
+        ddl_tables = [t for statement in statements if statement.statement_type not in ("SELECT", "INSERT", "UPDATE", "DELETE", "REPLACE") for t in statement.tables]
+        if ddl_tables or any(not statement.tables and not statement.is_read_only for statement in statements):
+            self.schema_browser.invalidate(schema_name, ddl_tables or None)
+
+    def _clarification_needed(self, user_input, message):
+        # "followup": the parser kept the conversation, so an answer can continue it; CLARIFYs
+        # from API errors or prompt failures have none and the request should be rephrased instead
+        return {"status": "clarification_needed", "message": message, "user_input": user_input,
+                "followup": self.session.get(CONVERSATION_KEY) is not None}
+
+    def _success(self, user_input, sql_query, executed_query, result, estimate, version_id):
+        return {
+            "status": "success",
+            "result": result,
+            "sql_query": executed_query,
+            "generated_sql": sql_query,  # before cost-guard rewrites; exports use this
+            "cost_estimate": estimate,
+            "learning_output": f"For your request: '{user_input}'\nGenerated SQL: {executed_query}",
+            "version_id": version_id
+        }
+
+    def _request_confirmation(self, user_input, sql_query, estimate=None, schema_name=None):
+        self.session["confirm_needed"] = True
+        self.session["pending_query"] = {"input": user_input, "sql": sql_query}
+        result = {"status": "confirmation_needed", "sql_query": sql_query, "cost_estimate": estimate}
+        # Skip the preview when EXPLAIN says running the statement would itself be expensive,
+        # or could not say (guard off, EXPLAIN failed): an unbounded statement is not run blind
+        affordable = estimate is not None and estimate["rows_examined"] <= self.config.get("dry_run_max_rows", 100000)
+        preview = self._dry_run(sql_query, schema_name) if schema_name and affordable else None
+        if preview:
+            result["preview"] = {key: preview[key] for key in ("affected_rows", "before", "after")}
+            # The preview's pre-image is what capture_state would read; confirming reuses it
+            statement = classify(sql_query)
+            self.session["pending_query"].update({
+                "schema_name": schema_name,
+                "captured_at": time.time(),
+                "capture": (statement.statement_type, statement.target_table, preview["before"]["rows"], None)
+            })
+        return result
+
+    def _dry_run(self, sql_query, schema_name):
+        try:
+            return self.executor.dry_run(sql_query, schema_name)
+        except Exception as e:
+            self.logger.debug(f"Dry run unavailable: {str(e)}")
+            return None
+
+    def _capture_for_confirmed(self, sql_query, schema_name):
+        """The pre-image captured by the confirmation dry run if it is for this statement and recent, else a fresh capture."""
+        pending = self.session.get("pending_query") or {}
+        if (pending.get("capture") and pending.get("sql") == sql_query and pending.get("schema_name") == schema_name
+                and time.time() - pending["captured_at"] <= self.config.get("dry_run_capture_ttl_seconds", 60)):
+            self.logger.debug("Reusing the pre-image captured by the dry run")
+            return pending["capture"]
+        return self.history.capture_state(sql_query, schema_name)
+
+    def _estimate(self, sql_query, schema_name):
+        try:
+            return self.executor.estimate(sql_query, schema_name)
+        except Exception as e:
+            self.logger.debug(f"Cost estimate unavailable: {str(e)}")
+            return None
+
     def _serialize_result(self, result):
         def convert_dates(obj):
             if isinstance(obj, (datetime.date, datetime.datetime)):
@@ -90,7 +449,8 @@ class ControllerAgent:
             self.logger.error("Schema name not found for this version")
             return {"status": "error", "message": "Schema name not found for this version"}
 
-        db = DBConnection(**st.session_state.db_params)
+        db = self.router.connect()
+        self.router.record_write()
         try:
             if operation_type == "UPDATE" and state_data:
                 self.logger.debug("Reverting an UPDATE query")
@@ -112,7 +472,7 @@ class ControllerAgent:
                 
                 for inverse_query, params in inverse_queries:
                     self.logger.debug(f"Executing: {inverse_query} with params {params}")
-                    db.execute_query(inverse_query, params)
+                    db.execute_prepared(inverse_query, params)
                 
                 result = {
                     "status": "success",
@@ -125,9 +485,12 @@ class ControllerAgent:
             elif operation_type == "INSERT" and state_data:
                 self.logger.debug("Reverting an INSERT query")
                 columns = db.get_columns(schema_name, table_name.split(".")[-1])
-                select_query = f"SELECT {columns[0]} FROM {table_name}"
-                result = db.execute_query(select_query)
-                inserted_ids = [row[0] for row in result["rows"]]
+                if state_data.get("keys"):
+                    inserted_ids = state_data["keys"]  # keys captured from the INSERT's VALUES
+                else:
+                    select_query = f"SELECT {columns[0]} FROM {table_name}"
+                    result = db.execute_query(select_query)
+                    inserted_ids = [row[0] for row in result["rows"]]
                 
                 inverse_query = f"DELETE FROM {table_name} WHERE {columns[0]} IN ({','.join(['%s'] * len(inserted_ids))})"
                 db.execute_query(inverse_query, inserted_ids)
@@ -150,7 +513,7 @@ class ControllerAgent:
                     self.logger.debug(f"Generated inverse query: {insert_query}")
                 
                 for inverse_query, params in inverse_queries:
-                    db.execute_query(inverse_query, params)
+                    db.execute_prepared(inverse_query, params)
                 
                 result = {
                     "status": "success",
@@ -160,7 +523,23 @@ class ControllerAgent:
                 }
                 return self._serialize_result(result)
             
-            elif operation_type == "DROP_TABLE" and state_data:
+            elif isinstance(state_data, dict) and state_data.get("inverse") is not None:
+                # Schema changes carry an inverse computed from SHOW CREATE TABLE when they ran
+                self.logger.debug(f"Reverting {operation_type} with its captured inverse")
+                inverse = state_data["inverse"]
+                db.run_in_transaction([(s["sql"], [tuple(p) for p in s["params"]]) for s in inverse])
+                message = f"Reverted version {version_id} with its recorded inverse" if inverse else f"Version {version_id} changed nothing; no revert needed"
+                if not state_data.get("complete", True):
+                    message += " (only part of the data it destroyed was captured)"
+                result = {
+                    "status": "success",
+                    "message": message,
+                    "sql_query": sql_query,
+                    "inverse_query": "; ".join(s["sql"] for s in inverse)
+                }
+                return self._serialize_result(result)
+
+            elif operation_type == "DROP_TABLE" and isinstance(state_data, dict) and "columns" in state_data:
                 self.logger.debug("Reverting a DROP TABLE query")
                 columns = state_data["columns"]
                 column_types = state_data["column_types"]
@@ -170,7 +549,7 @@ class ControllerAgent:
                 if state_data["data"]:
                     for row in state_data["data"]:
                         insert_query = f"INSERT INTO {table_name} ({','.join(columns)}) VALUES ({','.join(['%s'] * len(row))})"
-                        db.execute_query(insert_query, row)
+                        db.execute_prepared(insert_query, row)
                 
                 result = {
                     "status": "success",
@@ -180,7 +559,7 @@ class ControllerAgent:
                 }
                 return self._serialize_result(result)
             
-            elif operation_type == "ALTER" and state_data:
+            elif operation_type == "ALTER" and isinstance(state_data, dict) and "new_column" in state_data:
                 self.logger.debug("Reverting an ALTER query (column rename)")
                 inverse_query = f"ALTER TABLE {table_name} RENAME COLUMN {state_data['new_column']} TO {state_data['old_column']}"
                 db.execute_query(inverse_query)
@@ -193,7 +572,8 @@ class ControllerAgent:
                 }
                 return self._serialize_result(result)
             
-            # Fallback to inverse query generation
+            # Last resort: no captured inverse (older history, or a change with no deterministic undo,
+            # stored as {"inverse": None, "reason": ...})
             self.logger.debug("Falling back to inverse query generation")
             inverse_query = self.parser.generate_inverse_query(sql_query, schema_name)
             if inverse_query.startswith("CLARIFY:"):
@@ -212,4 +592,5 @@ class ControllerAgent:
             self.logger.error(f"Error reverting version {version_id}: {str(e)}")
             return {"status": "error", "message": f"Error reverting version {version_id}: {str(e)}"}
         finally:
-            db.close()
\ No newline at end of file
+            db.close()
+            self.parser.stats_catalog.invalidate(schema_name, [table_name] if table_name else None)
\ No newline at end of file
@@ -1,14 +1,29 @@
-import pandas as pd
-from database.db_connection import DBConnection
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from database.connection_router import ConnectionRouter
+from utils.csv_partitioner import read_header, split_ranges, parse_range
+from utils.logger import Logger
 import json
+import os
+import queue
+import threading
+import uuid
 
 class CSVLoaderAgent:
+    def __init__(self, db_params, config=None, router=None):
+        self.db_params = db_params
+        self.config = config
+        self.router = router or ConnectionRouter(db_params)
+        self.logger = Logger()
+
+    def _setting(self, key, default):
+        return self.config.get(key, default) if self.config is not None else default
+
     def load_csv(self, user_input, schema_name, st_session):
         file_path = user_input.split("csv ")[1].split(" into ")[0].strip()
         table_name = user_input.split("into ")[1].split()[1].lower() if "into" in user_input else None
         if not table_name:
             table_name = st_session.sidebar.text_input("Enter table name for CSV:", key=f"csv_{file_path}")
-        
+
         if table_name and file_path:
             return self._load_csv_to_table(file_path, table_name, schema_name)
         return "Please specify table name in sidebar"
@@ -21,22 +36,169 @@ class CSVLoaderAgent:
             return self._load_csv_to_table(file_path, table_name, schema_name)
         return "ERROR: Invalid CSV insert details"
 
-    def _load_csv_to_table(self, file_path, table_name, schema_name):
-        df = pd.read_csv(file_path)
-        db = DBConnection()
+    def _load_csv_to_table(self, file_path, table_name, schema_name, progress=None, columns=None):
+        # columns: target column per CSV header, in file order (default: the lowercased headers)
+        # Large files are parsed in a process pool and loaded over several connections
+        if os.path.getsize(file_path) >= self._setting("csv_parallel_min_bytes", 16 * 1024 * 1024):
+            try:
+                return self.load_parallel(file_path, table_name, schema_name, progress, columns)
+            except ValueError as e:
+                self.logger.debug(f"Parallel CSV load not possible, loading serially: {str(e)}")
+
+        import pandas as pd  # deferred: most sessions never upload a CSV
+        df = pd.read_csv(file_path, dtype=str)  # columns are VARCHAR; also keeps numpy types away from the driver
+        db = self.router.connect()
         try:
-            df.columns = [col.lower() for col in df.columns]
+            df.columns = columns or [col.lower() for col in df.columns]
             table_name = table_name.lower()
-            
-            create_table_query = f"CREATE TABLE IF NOT EXISTS {schema_name}.{table_name} ({', '.join(f'{col} VARCHAR(255)' for col in df.columns)})"
+
+            create_table_query = f"CREATE TABLE IF NOT EXISTS {schema_name}.{table_name} ({', '.join(f'`{col}` VARCHAR(255)' for col in df.columns)})"
             db.execute_query(create_table_query)
-            
+
+            column_list = ", ".join(f"`{col}`" for col in df.columns)
+            insert_query = f"INSERT INTO {schema_name}.{table_name} ({column_list}) VALUES ({','.join(['%s'] * len(df.columns))})"
             for _, row in df.iterrows():
-                insert_query = f"INSERT INTO {schema_name}.{table_name} VALUES ({','.join(['%s'] * len(row))})"
-                db.execute_query(insert_query, tuple(row))
-            
-            return f"CSV loaded into {schema_name}.{table_name}"
+                db.execute_prepared(insert_query, tuple(None if pd.isna(value) else value for value in row))
+            if progress:
+                progress(1.0, len(df))
+            self.router.record_write()
+
+            return f"CSV loaded into {schema_name}.{table_name} ({len(df):,} rows)"
         except Exception as e:
             return f"Error loading CSV: {str(e)}"
         finally:
-            db.close()
\ No newline at end of file
+            db.close()
+
+    def load_parallel(self, file_path, table_name, schema_name, progress=None, columns=None):
+        """Load a CSV through a staging table: byte-range chunks parsed in a process pool,
+        batched inserts over `csv_parallel_connections` connections, then one swap into
+        `table_name`, so the table gets every row or none.
+
+        progress(fraction, rows_loaded) is called from the calling thread as batches land.
+        Raises ValueError when the file cannot be split safely (quoted newlines, ragged
+        rows), after dropping the staging table; other failures drop it and return an
+        error message.
+        """
+        header, data_start = read_header(file_path)
+        columns = columns or [col.lower() for col in header]
+        table_name = table_name.lower()
+        ranges = split_ranges(file_path, self._setting("csv_chunk_bytes", 8 * 1024 * 1024), data_start)
+        # The first chunk is parsed up front: a malformed file fails before any table is created
+        first_rows = parse_range(file_path, ranges[0][0], ranges[0][1], len(columns)) if ranges else []
+
+        target = f"{schema_name}.{table_name}"
+        staging = f"{schema_name}.{table_name}__load_{uuid.uuid4().hex[:8]}"
+        column_list = ", ".join(f"`{col}`" for col in columns)
+        db = self.router.connect()
+        try:
+            existing = [c.lower() for c in db.get_columns(schema_name, table_name)]
+            if existing:
+                missing = [col for col in columns if col not in existing]
+                if missing:
+                    return f"Error loading CSV: {target} has no column(s) {', '.join(missing)}"
+                db.execute_query(f"CREATE TABLE {staging} LIKE {target}")
+            else:
+                db.execute_query(f"CREATE TABLE {staging} ({', '.join(f'`{col}` VARCHAR(255)' for col in columns)})")
+            try:
+                loaded = self._fill(file_path, staging, column_list, len(columns), ranges, first_rows, progress)
+                if existing:
+                    db.run_in_transaction([(f"INSERT INTO {target} ({column_list}) SELECT {column_list} FROM {staging}", [])])
+                    db.execute_query(f"DROP TABLE {staging}")
+                else:
+                    db.execute_query(f"RENAME TABLE {staging} TO {target}")
+            except Exception:
+                db.execute_query(f"DROP TABLE IF EXISTS {staging}")
+                raise
+            self.router.record_write()
+            return f"CSV loaded into {target} ({loaded:,} rows)"
+        except ValueError:
+            raise  # unparseable in chunks; the staging table is gone, so the caller can load serially
+        except Exception as e:
+            self.logger.error(f"Parallel CSV load into {target} failed: {str(e)}")
+            return f"Error loading CSV: {str(e)}"
+        finally:
+            db.close()
+
+    def _fill(self, file_path, staging, column_list, width, ranges, first_rows, progress):
+        """Parse ranges[1:] in worker processes and insert every row into `staging`; returns the row count."""
+        batch_rows = self._setting("csv_batch_rows", 1000)
+        connections = max(1, self._setting("csv_parallel_connections", 4))
+        workers = max(1, self._setting("csv_parallel_workers", min(4, os.cpu_count() or 1)))
+        insert_sql = f"INSERT INTO {staging} ({column_list}) VALUES ({', '.join(['%s'] * width)})"
+        total_bytes = sum(end - start for start, end in ranges) or 1
+        # Bounded queue: parsing pauses while the writers are behind
+        batches = queue.Queue(maxsize=connections * 2)
+        failed = threading.Event()
+        errors = []
+        state = {"rows": 0, "bytes": 0}
+        lock = threading.Lock()
+
+        def write():
+            db = None
+            try:
+                db = self.router.connect()
+                while True:
+                    batch = batches.get()
+                    if batch is None:
+                        return
+                    if failed.is_set():
+                        continue  # keep draining so the producer never blocks
+                    rows, chunk_bytes = batch
+                    db.run_in_transaction([(insert_sql, rows)])
+                    with lock:
+                        state["rows"] += len(rows)
+                        state["bytes"] += chunk_bytes
+            except Exception as e:
+                errors.append(e)
+                failed.set()
+                while batches.get() is not None:
+                    pass
+            finally:
+                if db is not None:
+                    db.close()
+
+        def enqueue(rows, chunk_bytes):
+            # Each chunk's bytes are credited to its last batch
+            for i in range(0, len(rows), batch_rows):
+                if failed.is_set():
+                    return
+                last = i + batch_rows >= len(rows)
+                batches.put((rows[i:i + batch_rows], chunk_bytes if last else 0))
+            if not rows:
+                with lock:
+                    state["bytes"] += chunk_bytes
+
+        writers = [threading.Thread(target=write, daemon=True) for _ in range(connections)]
+        for writer in writers:
+            writer.start()
+        try:
+            enqueue(first_rows, ranges[0][1] - ranges[0][0] if ranges else 0)
+            pending = {}
+            remaining = list(ranges[1:])
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                while (remaining or pending) and not failed.is_set():
+                    # At most two chunks per worker parsed ahead of the writers
+                    while remaining and len(pending) < workers * 2:
+                        start, end = remaining.pop(0)
+                        pending[pool.submit(parse_range, file_path, start, end, width)] = end - start
+                    done, _ = wait(pending, timeout=0.5, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        enqueue(future.result(), pending.pop(future))
+                    # Reported from this thread: Streamlit widgets cannot be updated from the writers
+                    if progress:
+                        progress(state["bytes"] / total_bytes, state["rows"])
+                for future in pending:
+                    future.cancel()
+        except Exception as e:
+            errors.append(e)
+            failed.set()
+        finally:
+            for _ in writers:
+                batches.put(None)
+            for writer in writers:
+                writer.join()
+        if errors:
+            raise errors[0]
+        if progress:
+            progress(1.0, state["rows"])
+        return state["rows"]
@@ -2,8 +2,9 @@ from database.history_manager import HistoryManager
 from database.db_connection import DBConnection
 
 class HistoryAgent:
-    def __init__(self):
-        self.history_mgr = HistoryManager()
+    def __init__(self, db_params):
+        self.db_params = db_params
+        self.history_mgr = HistoryManager(db_params)
 
     def save_query(self, user_query, sql_query, schema_name):
         return self.history_mgr.save_query(user_query, sql_query, schema_name)
@@ -14,7 +15,7 @@ class HistoryAgent:
     def revert_to_version(self, version_id):
         sql_query = self.history_mgr.get_query_by_version(version_id)
         if sql_query:
-            db = DBConnection()
+            db = DBConnection(**self.db_params)
             try:
                 db.execute_query(sql_query)
                 return f"Reverted to version {version_id}"
@@ -0,0 +1,292 @@
+import json
+from database.connection_router import ConnectionRouter
+from utils.cost_guard import summarize_plan
+from utils.logger import Logger
+from utils.sql_classifier import classify_all, WORD, IDENT, PUNCT
+
+ADVISED_TYPES = {"SELECT", "UPDATE", "DELETE"}
+EQUALITY_OPERATORS = {"=", "<=>"}
+RANGE_OPERATORS = {"<", ">", "<=", ">="}
+# Relative value of an index that starts with an equality/join column vs. one that only serves a range or sort
+EQUALITY_WEIGHT = 1.0
+RANGE_WEIGHT = 0.5
+MAX_INDEX_COLUMNS = 4
+SANDBOX_SCHEMA = "almostsql_sandbox"
+
+
+class IndexAdvisorAgent:
+    """Proposes composite indexes from the query_history workload.
+
+    Column usage in WHERE, JOIN ... ON and ORDER BY is counted per table, turned into
+    candidate indexes (equality columns first, then one range or the ORDER BY columns)
+    and compared with the indexes already in INFORMATION_SCHEMA.STATISTICS.
+    """
+    def __init__(self, db_params, history, router=None):
+        self.db_params = db_params
+        self.history = history
+        self.router = router or ConnectionRouter(db_params)
+        self.logger = Logger()
+
+    def analyze(self, schema_name, limit=10):
+        workload = [sql for _, _, sql, _, schema in self.history.get_history() if schema == schema_name and sql]
+        db = self.router.connect(read_only=True)
+        try:
+            columns_by_table = {table.lower(): [c.lower() for c in db.get_columns(schema_name, table)]
+                                for table in db.get_tables(schema_name)}
+            usage = {}
+            candidates = {}
+            for sql_query in workload:
+                for statement in classify_all(sql_query):
+                    if statement.statement_type not in ADVISED_TYPES:
+                        continue
+                    for table, parts in self._statement_usage(statement, schema_name, columns_by_table).items():
+                        table_usage = usage.setdefault(table, {})
+                        for kind in ("equality", "join", "range", "order"):
+                            for column in parts[kind]:
+                                counts = table_usage.setdefault(column, {"where": 0, "join": 0, "order": 0})
+                                counts["join" if kind == "join" else "order" if kind == "order" else "where"] += 1
+                        candidate = self._candidate(parts, table_usage)
+                        if candidate:
+                            entry = candidates.setdefault((table, candidate), {"frequency": 0, "queries": []})
+                            entry["frequency"] += 1
+                            if len(entry["queries"]) < 5 and statement.sql not in entry["queries"]:
+                                entry["queries"].append(statement.sql)
+
+            proposals = []
+            for (table, (leading, trailing)), entry in self._fold_prefixes(candidates).items():
+                index_columns = list(leading) + list(trailing)
+                existing = db.get_indexes(schema_name, table)
+                primary_key = {c.lower() for c in existing.get("PRIMARY", [])}
+                if primary_key and primary_key <= set(leading):
+                    continue  # equality on the whole primary key is already a single-row lookup
+                if self._covering_index(existing, leading, trailing):
+                    continue
+                table_rows = db.get_table_rows(schema_name, table)
+                weight = EQUALITY_WEIGHT if leading else RANGE_WEIGHT
+                index_name = f"idx_{table}_{'_'.join(index_columns)}"[:64]
+                proposals.append({
+                    "table": table,
+                    "columns": index_columns,
+                    "frequency": entry["frequency"],
+                    "table_rows": table_rows,
+                    "benefit": round(entry["frequency"] * table_rows * weight, 1),
+                    "existing_indexes": existing,
+                    "column_usage": {c: usage[table][c] for c in index_columns if c in usage.get(table, {})},
+                    "queries": entry["queries"],
+                    "ddl": f"CREATE INDEX {index_name} ON {schema_name}.{table} ({', '.join(index_columns)})",
+                    "index_name": index_name,
+                    "schema_name": schema_name
+                })
+            proposals.sort(key=lambda p: (p["benefit"], p["frequency"]), reverse=True)
+            return proposals[:limit]
+        finally:
+            db.close()
+
+    def validate(self, proposal, sample_rows=100000):
+        """EXPLAIN the proposal's queries against a sampled sandbox copy of the table, before and after adding the index."""
+        schema_name = proposal["schema_name"]
+        table = proposal["table"]
+        sandbox_table = f"{SANDBOX_SCHEMA}.{table}"
+        db = self.router.connect()  # writes the sandbox copy, so always the primary
+        try:
+            db.execute_query(f"CREATE DATABASE IF NOT EXISTS {SANDBOX_SCHEMA}")
+            db.execute_query(f"DROP TABLE IF EXISTS {sandbox_table}")
+            db.execute_query(f"CREATE TABLE {sandbox_table} LIKE {schema_name}.{table}")
+            db.execute_query(f"INSERT INTO {sandbox_table} SELECT * FROM {schema_name}.{table} LIMIT {int(sample_rows)}")
+            db.execute_query(f"ANALYZE TABLE {sandbox_table}")
+
+            queries = [self._rewrite_for_sandbox(q, schema_name, table) for q in proposal["queries"]]
+            before = [self._explain(db, q) for q in queries]
+            db.execute_query(f"CREATE INDEX {proposal['index_name']} ON {sandbox_table} ({', '.join(proposal['columns'])})")
+            db.execute_query(f"ANALYZE TABLE {sandbox_table}")
+            after = [self._explain(db, q) for q in queries]
+
+            rows_before = sum(p["rows_examined"] for p in before if p)
+            rows_after = sum(p["rows_examined"] for p in after if p)
+            return {
+                "status": "success",
+                "sample_rows": int(sample_rows),
+                "rows_examined_before": rows_before,
+                "rows_examined_after": rows_after,
+                "improved": rows_after < rows_before,
+                "per_query": [
+                    {"sql_query": q, "before": b, "after": a} for q, b, a in zip(proposal["queries"], before, after)
+                ]
+            }
+        except Exception as e:
+            self.logger.error(f"Index validation failed: {str(e)}")
+            return {"status": "error", "message": f"Index validation failed: {str(e)}"}
+        finally:
+            try:
+                db.execute_query(f"DROP TABLE IF EXISTS {sandbox_table}")
+            except Exception:
+                pass
+            db.close()
+
+    def _explain(self, db, sql_query):
+        try:
+            result = db.execute_query(f"EXPLAIN FORMAT=JSON {sql_query}")
+            return summarize_plan(json.loads(result["rows"][0][0]))
+        except Exception as e:
+            self.logger.debug(f"EXPLAIN failed in sandbox: {str(e)}")
+            return None
+
+    def _rewrite_for_sandbox(self, sql_query, schema_name, table):
+        """Point references to the advised table at the sandbox copy and pin every other table to its schema."""
+        statement = classify_all(sql_query)[0]
+        pieces = []
+        position = 0
+        for ref in sorted(statement.details.get("table_refs", []), key=lambda r: r["start"]):
+            parts = ref["table"].split(".")
+            if len(parts) == 1 or parts[0].lower() == schema_name.lower():
+                replacement = f"{SANDBOX_SCHEMA}.{table}" if parts[-1].lower() == table else f"{schema_name}.{parts[-1]}"
+            else:
+                replacement = ref["table"]
+            if ref["alias"] is None:
+                replacement += f" AS {parts[-1]}"  # keep table-qualified column references working
+            pieces.append(statement.sql[position:ref["start"]])
+            pieces.append(replacement)
+            position = ref["end"]
+        pieces.append(statement.sql[position:])
+        return "".join(pieces)
+
+    def _statement_usage(self, statement, schema_name, columns_by_table):
+        """Per-table column usage of one statement: {"equality", "join", "range", "order"}."""
+        scope = {}
+        for ref in statement.details.get("table_refs", []):
+            parts = ref["table"].lower().split(".")
+            if len(parts) > 1 and parts[0] != schema_name.lower():
+                continue
+            if parts[-1] in columns_by_table:
+                scope[parts[-1]] = parts[-1]
+                if ref["alias"]:
+                    scope[ref["alias"].lower()] = parts[-1]
+        tables = set(scope.values())
+        usage = {table: {"equality": [], "join": [], "range": [], "order": []} for table in tables}
+        if not tables:
+            return {}
+
+        tokens = statement.tokens
+        clause = None
+        clause_stack = []  # clause in effect outside each open parenthesis
+        i = 0
+        while i < len(tokens):
+            token = tokens[i]
+            if token.type == PUNCT and token.value == "(":
+                clause_stack.append(clause)
+            elif token.type == PUNCT and token.value == ")":
+                clause = clause_stack.pop() if clause_stack else None
+            elif token.is_keyword("WHERE"):
+                clause = "where"
+            elif token.is_keyword("ON"):
+                clause = "on"
+            elif token.is_keyword("ORDER"):
+                clause = "order"
+            elif token.is_keyword("SELECT", "FROM", "JOIN", "GROUP", "HAVING", "LIMIT", "SET", "UNION", "USING"):
+                clause = None
+            reference, next_i = self._column_at(tokens, i, scope, columns_by_table, tables)
+            if reference and clause:
+                table, column = reference
+                if clause == "order":
+                    usage[table]["order"].append(column)
+                else:
+                    kind = self._predicate_kind(tokens, i, next_i, scope, columns_by_table, tables)
+                    if clause == "on" or kind == "join":
+                        usage[table]["join"].append(column)
+                    elif kind:
+                        usage[table][kind].append(column)
+                i = next_i
+                continue
+            i += 1
+        return {t: {k: list(dict.fromkeys(v)) for k, v in parts.items()} for t, parts in usage.items() if any(parts.values())}
+
+    def _column_at(self, tokens, i, scope, columns_by_table, tables):
+        """Resolve [qualifier.]column at tokens[i] to (table, column), or (None, i)."""
+        token = tokens[i]
+        if token.type not in (WORD, IDENT) or (i > 0 and tokens[i - 1].type == PUNCT and tokens[i - 1].value == "."):
+            return None, i
+        if i + 1 < len(tokens) and tokens[i + 1].type == PUNCT and tokens[i + 1].value == "(":
+            return None, i  # function call
+        if i + 2 < len(tokens) and tokens[i + 1].type == PUNCT and tokens[i + 1].value == "." and tokens[i + 2].type in (WORD, IDENT):
+            qualifier, column, next_i = token.value.lower(), tokens[i + 2].value.lower(), i + 3
+            if next_i + 1 < len(tokens) and tokens[next_i].type == PUNCT and tokens[next_i].value == ".":
+                # schema.table.column
+                qualifier, column, next_i = column, tokens[next_i + 1].value.lower(), next_i + 2
+            table = scope.get(qualifier)
+            if table and column in columns_by_table[table]:
+                return (table, column), next_i
+            return None, i
+        column = token.value.lower()
+        owners = [t for t in tables if column in columns_by_table[t]]
+        if len(owners) == 1:
+            return (owners[0], column), i + 1
+        return None, i
+
+    def _predicate_kind(self, tokens, start, end, scope, columns_by_table, tables):
+        """Classify the comparison around a column reference as equality, range or join."""
+        after = tokens[end] if end < len(tokens) else None
+        before = tokens[start - 1] if start > 0 else None
+        operator = None
+        other_side = None
+        if after is not None and ((after.type == PUNCT and after.value in EQUALITY_OPERATORS | RANGE_OPERATORS) or after.is_keyword("IN", "IS", "BETWEEN", "LIKE")):
+            operator = after.value.upper()
+            other_side = end + 1
+        elif before is not None and before.type == PUNCT and before.value in EQUALITY_OPERATORS | RANGE_OPERATORS:
+            operator = before.value
+            # a.x = b.y seen from the right-hand column: look for a column ending just before the operator
+            for left in (start - 2, start - 4, start - 6):
+                if left >= 0 and operator in EQUALITY_OPERATORS:
+                    reference, left_end = self._column_at(tokens, left, scope, columns_by_table, tables)
+                    if reference and left_end == start - 1:
+                        return "join"
+        if operator is None:
+            return None
+        if other_side is not None and other_side < len(tokens) and operator in EQUALITY_OPERATORS:
+            reference, _ = self._column_at(tokens, other_side, scope, columns_by_table, tables)
+            if reference:
+                return "join"
+        if operator in EQUALITY_OPERATORS or operator in ("IN", "IS"):
+            return "equality"
+        if operator == "LIKE":
+            # only a literal prefix pattern can use an index
+            pattern = tokens[other_side] if other_side is not None and other_side < len(tokens) else None
+            return "range" if pattern is not None and not pattern.value.startswith("%") else None
+        return "range"
+
+    def _candidate(self, parts, table_usage):
+        def frequency(column):
+            counts = table_usage.get(column, {})
+            return -(counts.get("where", 0) + counts.get("join", 0)), column
+        leading = tuple(sorted(set(parts["equality"]) | set(parts["join"]), key=frequency))[:MAX_INDEX_COLUMNS]
+        if parts["range"]:
+            trailing = (parts["range"][0],)
+        else:
+            trailing = tuple(c for c in parts["order"] if c not in leading)
+        trailing = tuple(c for c in trailing if c not in leading)[:MAX_INDEX_COLUMNS - len(leading)]
+        if not leading and not trailing:
+            return None
+        return leading, trailing
+
+    def _fold_prefixes(self, candidates):
+        """Fold candidates that are a leading prefix of a longer candidate on the same table into it."""
+        ordered = sorted(candidates.items(), key=lambda item: -len(item[0][1][0] + item[0][1][1]))
+        folded = {}
+        for (table, candidate), entry in ordered:
+            columns = candidate[0] + candidate[1]
+            for (kept_table, kept), kept_entry in folded.items():
+                if kept_table == table and (kept[0] + kept[1])[:len(columns)] == columns:
+                    kept_entry["frequency"] += entry["frequency"]
+                    kept_entry["queries"].extend(q for q in entry["queries"] if q not in kept_entry["queries"])
+                    break
+            else:
+                folded[(table, candidate)] = {"frequency": entry["frequency"], "queries": list(entry["queries"])}
+        return folded
+
+    def _covering_index(self, existing, leading, trailing):
+        for name, columns in existing.items():
+            columns = [c.lower() for c in columns]
+            if len(columns) < len(leading) + len(trailing):
+                continue
+            if set(columns[:len(leading)]) == set(leading) and tuple(columns[len(leading):len(leading) + len(trailing)]) == trailing:
+                return name
+        return None
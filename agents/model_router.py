@@ -0,0 +1,154 @@
+from collections import deque
+import re
+import threading
+
+from utils.sql_classifier import classify_all
+
+# Request wording that usually means a JOIN, an aggregate or a nested query
+_JOIN_RE = re.compile(r"\b(join|joined|combine|combined|together with|along with|across|matching|for each|per)\b")
+_AGGREGATE_RE = re.compile(r"\b(sum|total|average|avg|count|how many|number of|max|maximum|min|minimum|group|grouped|top|rank|most|least|highest|lowest)\b")
+_NESTED_RE = re.compile(r"\b(having|distinct|union|except|than the average|that have|who have|which have|not in|without any|never)\b")
+# Statement types a usable translation may start with
+_SQL_TYPES = {"SELECT", "SHOW", "DESCRIBE", "EXPLAIN", "INSERT", "REPLACE", "UPDATE", "DELETE", "ALTER", "TRUNCATE", "RENAME_TABLE", "TABLE", "VALUES"}
+LATENCY_WINDOW = 200  # recent calls kept per model for the latency percentiles
+
+# Per-model call statistics, shared by every router in the process so thresholds can be tuned from real traffic
+_STATS = {}
+_LOCK = threading.Lock()
+
+
+def mentioned_tables(request, tables):
+    """Tables of the schema context that the request names ("order items" matches order_items, "orders" matches order)."""
+    text = request.lower()
+    found = []
+    for table in tables:
+        words = table.lower().replace("_", " ")
+        if re.search(rf"\b(?:{re.escape(table.lower())}|{re.escape(words)})s?\b", text):
+            found.append(table)
+    return found
+
+
+def score_complexity(request, tables):
+    """Rough complexity of a natural-language request: tables named, join/aggregate/nesting wording, length."""
+    text = request.lower()
+    named = mentioned_tables(request, tables)
+    signals = []
+    score = 0
+    if len(named) > 1:
+        score += 2 * (len(named) - 1)
+        signals.append(f"{len(named)} tables")
+    for label, pattern, weight in (("join", _JOIN_RE, 2), ("aggregate", _AGGREGATE_RE, 1), ("nested", _NESTED_RE, 2)):
+        if pattern.search(text):
+            score += weight
+            signals.append(label)
+    words = len(text.split())
+    if words > 25:
+        score += 1 if words <= 50 else 2
+        signals.append(f"{words} words")
+    return {"score": score, "signals": signals, "tables": named, "schema_tables": list(tables)}
+
+
+def check_sql(sql_query, known_tables):
+    """Reason a translation is unusable, or None if it looks like SQL over existing tables."""
+    if sql_query.startswith("CLARIFY:"):
+        return None  # a clarification is a legitimate answer, not a failed translation
+    statements = classify_all(sql_query)
+    if not statements:
+        return "empty response"
+    known = {t.lower() for t in known_tables}
+    created = set()
+    for statement in statements:
+        kind = statement.statement_type
+        if kind.startswith("CREATE_"):
+            created.update(t.split(".")[-1].strip("`").lower() for t in statement.tables)
+            continue
+        if kind not in _SQL_TYPES and not kind.startswith("DROP_"):
+            return f"not a SQL statement ({kind})"
+        for table in statement.tables:
+            name = table.split(".")[-1].strip("`").lower()
+            if known and name not in known and name not in created:
+                return f"unknown table {name}"
+    return None
+
+
+class ModelRouter:
+    """Picks the Groq model for a translation by request complexity.
+
+    Requests scoring at most `fast_max_complexity` go to the fast model; the rest go to
+    the large one. When a latency budget is set and the large model's recent median is
+    over it, requests one point above the threshold also go fast. A fast-model answer
+    that fails check_sql() is retried once on the large model.
+    """
+    def __init__(self, fast_model, large_model, fast_max_complexity=1, latency_budget_ms=None, enabled=True):
+        self.fast_model = fast_model
+        self.large_model = large_model
+        self.fast_max_complexity = fast_max_complexity
+        self.latency_budget_ms = latency_budget_ms
+        self.enabled = enabled and bool(fast_model) and fast_model != large_model
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(
+            config.get("llm_fast_model"),
+            config.get("llm_large_model", "llama-3.3-70b-versatile"),
+            config.get("llm_fast_max_complexity", 1),
+            config.get("llm_latency_budget_ms"),
+            config.get("llm_routing_enabled", True)
+        )
+
+    def choose(self, complexity):
+        if not self.enabled or complexity is None:
+            return self.large_model
+        limit = self.fast_max_complexity
+        if self.latency_budget_ms and (self.median_ms(self.large_model) or 0) > self.latency_budget_ms:
+            limit += 1
+        return self.fast_model if complexity["score"] <= limit else self.large_model
+
+    def escalation_for(self, model):
+        """Model to retry on after `model` failed, or None if it already was the large one."""
+        return self.large_model if model != self.large_model else None
+
+    def record(self, model, elapsed_ms, usage=None, complexity=None, failed=False):
+        with _LOCK:
+            stats = _STATS.setdefault(model, {
+                "calls": 0, "failures": 0, "prompt_tokens": 0, "cached_tokens": 0, "completion_tokens": 0,
+                "total_ms": 0.0, "latencies": deque(maxlen=LATENCY_WINDOW), "by_score": {}
+            })
+            stats["calls"] += 1
+            stats["failures"] += 1 if failed else 0
+            stats["total_ms"] += elapsed_ms
+            stats["latencies"].append(elapsed_ms)
+            if usage is not None:
+                stats["prompt_tokens"] += getattr(usage, "prompt_tokens", 0) or 0
+                stats["completion_tokens"] += getattr(usage, "completion_tokens", 0) or 0
+                # Prompt tokens served from the provider's prefix cache, when it reports them
+                stats["cached_tokens"] += getattr(getattr(usage, "prompt_tokens_details", None), "cached_tokens", 0) or 0
+            if complexity is not None:
+                bucket = stats["by_score"].setdefault(complexity["score"], {"calls": 0, "failures": 0})
+                bucket["calls"] += 1
+                bucket["failures"] += 1 if failed else 0
+
+    def median_ms(self, model):
+        with _LOCK:
+            latencies = sorted(_STATS.get(model, {}).get("latencies", []))
+        return latencies[len(latencies) // 2] if latencies else None
+
+    @staticmethod
+    def stats():
+        """Per-model counters: calls, failed answers (escalated when on the fast model), tokens, latency (mean/p50/p95) and calls/failures by score."""
+        report = {}
+        with _LOCK:
+            for model, stats in _STATS.items():
+                latencies = sorted(stats["latencies"])
+                report[model] = {
+                    "calls": stats["calls"],
+                    "failures": stats["failures"],
+                    "prompt_tokens": stats["prompt_tokens"],
+                    "cached_tokens": stats["cached_tokens"],
+                    "completion_tokens": stats["completion_tokens"],
+                    "avg_ms": round(stats["total_ms"] / stats["calls"], 1),
+                    "p50_ms": round(latencies[len(latencies) // 2], 1),
+                    "p95_ms": round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))], 1),
+                    "by_score": {score: dict(bucket) for score, bucket in sorted(stats["by_score"].items())}
+                }
+        return report
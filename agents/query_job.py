@@ -0,0 +1,128 @@
+import threading
+import time
+
+from database.db_connection import DBConnection
+from utils.cost_guard import add_max_execution_time
+from utils.logger import Logger
+from utils.sql_classifier import classify
+
+# MySQL error codes for a statement stopped by KILL QUERY and by MAX_EXECUTION_TIME
+ER_QUERY_INTERRUPTED = 1317
+ER_QUERY_TIMEOUT = 3024
+
+
+class QueryJob:
+    """One query running on a background thread with its own connection.
+
+    The MySQL connection id is recorded as soon as the connection opens, so cancel()
+    can stop the statement on the server with KILL QUERY from a second connection.
+    Rows of read-only statements are fetched in chunks and counted into
+    `rows_fetched` so the UI can poll progress while the query runs.
+    """
+    def __init__(self, executor, sql_query, schema_name, confirmed=False, max_execution_ms=None, chunk_rows=1000):
+        self.executor = executor
+        self.router = executor.router
+        self.server_params = None  # params of the server the job's connection went to, for KILL QUERY
+        self.sql_query = sql_query
+        self.schema_name = schema_name
+        self.confirmed = confirmed
+        self.max_execution_ms = max_execution_ms
+        self.chunk_rows = chunk_rows
+        self.status = "queued"  # queued -> running -> done | error | cancelled | timeout
+        self.connection_id = None
+        self.executed_query = sql_query
+        self.estimate = None
+        self.result = None
+        self.error = None
+        self.rows_fetched = 0
+        self.started_at = None
+        self.finished_at = None
+        self.cancel_requested = False
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.logger = Logger()
+
+    def start(self):
+        self.started_at = time.time()
+        self.status = "running"
+        self.thread.start()
+        return self
+
+    @property
+    def running(self):
+        return self.status in ("queued", "running")
+
+    @property
+    def elapsed_ms(self):
+        if self.started_at is None:
+            return 0
+        return int(((self.finished_at or time.time()) - self.started_at) * 1000)
+
+    def wait(self, timeout=None):
+        self.thread.join(timeout)
+        return not self.running
+
+    def cancel(self):
+        """Ask the server to stop the running statement; returns False if there was nothing to kill."""
+        if not self.running:
+            return False
+        self.cancel_requested = True
+        if self.connection_id is None:
+            return True  # not connected yet; _run checks the flag before executing
+        db = DBConnection(**self.server_params)
+        try:
+            db.execute_query(f"KILL QUERY {int(self.connection_id)}")
+            self.logger.debug(f"Sent KILL QUERY {self.connection_id}")
+        finally:
+            db.close()
+        return True
+
+    def _run(self):
+        db = None
+        try:
+            db = self.router.connect_for(self.sql_query)
+            self.server_params = db.params
+            self.connection_id = db.connection.connection_id
+            sql_query, self.estimate = self.executor.review(db, self.sql_query, self.confirmed)
+            statement = classify(sql_query)
+            if self.max_execution_ms and statement.statement_type == "SELECT":
+                sql_query = add_max_execution_time(sql_query, self.max_execution_ms)
+            self.executed_query = sql_query
+            if self.cancel_requested:
+                raise InterruptedError("Query cancelled before it started")
+            if statement.is_read_only:
+                self.result, stopped_early = self._fetch(db, sql_query)
+            else:
+                # A write that completes is committed even if KILL QUERY came too late: it is "done",
+                # so the controller still versions it and it can be reverted
+                self.result = db.execute_query(sql_query)
+                stopped_early = False
+                self.router.record_write()
+            self.status = "cancelled" if stopped_early else "done"
+        except Exception as e:
+            self.error = e
+            errno = getattr(e, "errno", None)
+            if self.cancel_requested or errno == ER_QUERY_INTERRUPTED or isinstance(e, InterruptedError):
+                self.status = "cancelled"
+            elif errno == ER_QUERY_TIMEOUT:
+                self.status = "timeout"
+            else:
+                self.status = "error"
+            self.logger.debug(f"Query job on connection {self.connection_id} ended with {self.status}: {str(e)}")
+        finally:
+            self.finished_at = time.time()
+            if db is not None:
+                try:
+                    db.close()
+                except Exception:
+                    pass
+
+    def _fetch(self, db, sql_query):
+        stream = db.stream_query(sql_query, chunk_rows=self.chunk_rows)
+        rows = []
+        for chunk in stream["chunks"]:
+            rows.extend(chunk)
+            self.rows_fetched = len(rows)
+            if self.cancel_requested:
+                # closing the connection in _run discards the unread rows
+                return db._serialize_result({"columns": stream["columns"], "rows": rows}), True
+        return db._serialize_result({"columns": stream["columns"], "rows": rows}), False
@@ -1,23 +1,103 @@
-from langchain.prompts import PromptTemplate
 from config.config import Config
-from database.db_connection import DBConnection
-import streamlit as st
+from agents.model_router import ModelRouter, score_complexity, check_sql, mentioned_tables
+from database.connection_router import ConnectionRouter
+from database.stats_catalog import StatsCatalog
+import json
+import re
 import time
-from groq import GroqError
 from utils.logger import Logger
+from utils.prompt_template import PromptTemplate
+from utils.sql_template import TemplateCache
+from utils.column_matcher import column_index_for
+
+# Session key of the last exchange that ended in CLARIFY:, continued by clarify()
+CONVERSATION_KEY = "llm_conversation"
+CLARIFICATION_TEMPLATE = (
+    "Clarification: {clarification}\n"
+    "Using the same database context, return ONLY the corrected plain SQL query string, "
+    "or 'CLARIFY: <question>' if it is still ambiguous."
+)
 
 class QueryParserAgent:
-    def __init__(self):
+    def __init__(self, db_params, config, session=None, translation_index=None, router=None):
+        # session is any mapping (st.session_state in the UI, a plain dict when headless)
+        self.db_params = db_params
+        self.config = config
+        self.session = session if session is not None else {}
+        # SimilarityIndex over past translations (HistoryManager.translation_index); optional
+        self.translation_index = translation_index
+        # Parameterized read-only translations, keyed by request shape (filled by HistoryManager)
+        self.template_cache = TemplateCache.from_config(db_params, config)
+        # Schema/INFORMATION_SCHEMA reads may be served by a read replica
+        self.router = router or ConnectionRouter(db_params)
+        # Fast vs. large Groq model per request
+        self.model_router = ModelRouter.from_config(config)
+        # Column statistics (types, ranges, frequent values) for the tables a request names
+        self.stats_catalog = StatsCatalog.from_config(db_params, config)
         self.logger = Logger()
 
     def parse_query(self, user_input, schema_name):
+        self.session.pop(CONVERSATION_KEY, None)  # a new request starts a new conversation
         return self._generate_query(user_input, schema_name, invert=False)
 
     def generate_inverse_query(self, original_query, schema_name):
         return self._generate_query(original_query, schema_name, invert=True)
 
     def _generate_query(self, query_input, schema_name, invert=False):
-        db = DBConnection(**st.session_state.db_params)
+        try:
+            if not invert:
+                reused = self.lookup_translation(query_input, schema_name)
+                if reused:
+                    return reused
+            formatted_prompt, complexity = self.build_prompt(query_input, schema_name, invert)
+        except Exception as e:
+            self.logger.error(f"Query parsing error: {str(e)}")
+            return f"CLARIFY: Unable to parse query due to {str(e)}. Please provide more details."
+        messages = [{"role": "user", "content": formatted_prompt}]
+        sql_query, model, failure = self._converse(messages, complexity, invert)
+        if not invert and failure is None and sql_query.startswith("CLARIFY:"):
+            # Keep the exchange so the user's answer can be sent as a short follow-up message
+            self.session[CONVERSATION_KEY] = {
+                "user_input": query_input,
+                "schema_name": schema_name,
+                "messages": messages + [{"role": "assistant", "content": sql_query}],
+                "model": model,
+                "complexity": complexity,
+                "rounds": 0
+            }
+        return sql_query
+
+    def clarify(self, clarification, schema_name, original=None):
+        """Answer the last CLARIFY: with a follow-up message in the same conversation.
+
+        The first prompt (schema context included) is resent unchanged, so no schema reads
+        are repeated and the provider can serve the shared prefix from its prompt cache.
+        Without a stored conversation the answer is appended to `original` and translated
+        afresh, never on its own. Returns (the request with the clarification appended,
+        SQL or another CLARIFY).
+        """
+        conversation = self.session.get(CONVERSATION_KEY)
+        if not conversation:
+            user_input = f"{original} - {clarification}" if original else clarification
+            return user_input, self.parse_query(user_input, schema_name)
+        user_input = f"{conversation['user_input']} - {clarification}"
+        if conversation["schema_name"] != schema_name or conversation["rounds"] >= self.config.get("clarify_max_rounds", 3):
+            return user_input, self.parse_query(user_input, schema_name)
+
+        messages = conversation["messages"] + [{"role": "user", "content": CLARIFICATION_TEMPLATE.format(clarification=clarification)}]
+        sql_query, model, failure = self._converse(messages, conversation["complexity"], model=conversation["model"])
+        if failure is None and sql_query.startswith("CLARIFY:"):
+            self.session[CONVERSATION_KEY] = dict(
+                conversation, user_input=user_input, model=model, rounds=conversation["rounds"] + 1,
+                messages=messages + [{"role": "assistant", "content": sql_query}]
+            )
+        else:
+            self.session.pop(CONVERSATION_KEY, None)
+        return user_input, sql_query
+
+    def build_prompt(self, query_input, schema_name, invert=False):
+        """Returns (formatted prompt, complexity); complexity is None for inverse queries, which always use the large model."""
+        db = self.router.connect(read_only=True)
         try:
             schemas = db.get_schemas()
             tables = db.get_tables(schema_name) if schema_name in schemas else []
@@ -27,134 +107,277 @@ class QueryParserAgent:
                 "tables": tables,
                 "columns": {table: db.get_columns(schema_name, table) for table in tables}
             }
+            if getattr(db, "dialect", None):
+                context["sql_dialect"] = db.dialect  # LocalEngine: uploaded CSVs queried in-process
+            if not invert:
+                stats = self._column_stats(db, query_input, schema_name, tables)
+                if stats:
+                    context["column_stats"] = stats
+        finally:
+            db.close()
 
-            completed_prompt = self._complete_prompt(query_input, context) if not invert else query_input
-            prompt_template = """
-            Given this {mode} query: '{query}' and the database context: {context},
-            {task}.
-            - Use lowercase for table and column names.
-            - Include the schema name '{schema_name}' in the query where appropriate.
-            - Support complex queries including JOINs, subqueries, GROUP BY, HAVING, and ORDER BY.
-            - If the query implies a table creation and it doesn't exist (for normal mode), include a CREATE TABLE statement with inferred column types (INT for numbers, DATE for YYYY-MM-DD, VARCHAR(255) for text).
-            - For INSERT/UPDATE, parse key-value pairs (e.g., 'id is 12', 'name to John') and conditions (e.g., 'where id = 12').
-            - If column names don't exactly match but are similar (e.g., 'store id' vs 'store_id'), use the existing column name.
-            - If multiple similar column names exist (e.g., 'productid' and 'product_id'), return 'CLARIFY: Multiple similar columns found: [list]. Which one did you mean?'.
-            - For CSV data upload (e.g., 'upload csv into table_name'), parse the CSV content provided in the query and generate:
-              - A CREATE TABLE statement if the table doesn't exist, inferring column types from the CSV data.
-              - An INSERT INTO statement with the CSV data as VALUES, e.g., INSERT INTO table_name (col1, col2) VALUES (val1, val2), (val3, val4).
-              - Do NOT use COPY or LOAD DATA INFILE; use INSERT INTO for MySQL compatibility.
-            - Return ONLY the plain SQL query string with no extra text, comments, or formatting like ```sql or backticks.
+        completed_prompt = self._complete_prompt(query_input, context) if not invert else query_input
+        examples = self._few_shot_examples(query_input, schema_name) if not invert else ""
+        prompt_template = """
+        Given this {mode} query: '{query}' and the database context: {context},
+        {task}.{examples}
+        - Use lowercase for table and column names.
+        - Include the schema name '{schema_name}' in the query where appropriate.
+        - Support complex queries including JOINs, subqueries, GROUP BY, HAVING, and ORDER BY.
+        - If the query implies a table creation and it doesn't exist (for normal mode), include a CREATE TABLE statement with inferred column types (INT for numbers, DATE for YYYY-MM-DD, VARCHAR(255) for text).
+        - For INSERT/UPDATE, parse key-value pairs (e.g., 'id is 12', 'name to John') and conditions (e.g., 'where id = 12').
+        - If column names don't exactly match but are similar (e.g., 'store id' vs 'store_id'), use the existing column name.
+        - If multiple similar column names exist (e.g., 'productid' and 'product_id'), return 'CLARIFY: Multiple similar columns found: [list]. Which one did you mean?'.
+        - When column_stats are given, write literals (dates, status codes, categories) in the format and case the stored values use.
+        - When sql_dialect is given, write a read-only SELECT in that engine's SQL dialect instead of MySQL.
+        - Return ONLY the plain SQL query string with no extra text, comments, or formatting like ```sql or backticks.
+        """
+        
+        if invert:
+            mode = "original SQL"
+            task = """
+            generate the inverse MySQL query to undo the operation.
+            - For CREATE TABLE, generate DROP TABLE.
+            - For INSERT, generate DELETE with the same conditions (if conditions are known).
+            - For UPDATE, generate an UPDATE that reverses the SET clause (requires prior values).
+            - For DROP TABLE, generate CREATE TABLE (requires schema information).
+            - For DELETE, generate INSERT with the deleted rows (requires row data).
+            - For ALTER TABLE RENAME COLUMN, generate ALTER TABLE to rename back.
+            - If the inverse operation is not feasible (e.g., due to missing prior state), return 'CLARIFY: Cannot generate inverse query due to missing state information.'
             """
-            
-            if invert:
-                mode = "original SQL"
-                task = """
-                generate the inverse MySQL query to undo the operation.
-                - For CREATE TABLE, generate DROP TABLE.
-                - For INSERT, generate DELETE with the same conditions (if conditions are known).
-                - For UPDATE, generate an UPDATE that reverses the SET clause (requires prior values).
-                - For DROP TABLE, generate CREATE TABLE (requires schema information).
-                - For DELETE, generate INSERT with the deleted rows (requires row data).
-                - For ALTER TABLE RENAME COLUMN, generate ALTER TABLE to rename back.
-                - If the inverse operation is not feasible (e.g., due to missing prior state), return 'CLARIFY: Cannot generate inverse query due to missing state information.'
-                """
-            else:
-                mode = "user"
-                task = "generate a valid MySQL query"
-
-            prompt = PromptTemplate(
-                input_variables=["query", "context", "schema_name", "mode", "task"],
-                template=prompt_template
-            )
+        else:
+            mode = "user"
+            task = "generate a valid MySQL query"
 
-            formatted_prompt = prompt.format(
-                query=completed_prompt,
-                context=str(context),
-                schema_name=schema_name,
-                mode=mode,
-                task=task
-            )
+        prompt = PromptTemplate(
+            input_variables=["query", "context", "schema_name", "mode", "task", "examples"],
+            template=prompt_template
+        )
 
-            self.logger.debug("Sending request to GROQ API...")
-            start_time = time.time()
-            try:
-                response = st.session_state.config.get_groq_client().chat.completions.create(
-                    model="llama-3.3-70b-versatile",
-                    messages=[{"role": "user", "content": formatted_prompt}],
-                    timeout=30
-                )
-                elapsed_time = time.time() - start_time
-                self.logger.debug(f"GROQ API response received in {elapsed_time:.2f} seconds")
-            except GroqError as e:
-                self.logger.error(f"GROQ API error: {str(e)}")
-                return f"CLARIFY: GROQ API error: {str(e)}"
-            except Exception as e:
-                self.logger.error(f"GROQ API timeout or error: {str(e)}")
-                return f"CLARIFY: GROQ API timeout or error: {str(e)}"
-
-            sql_query = response.choices[0].message.content.strip()
-            
-            sql_query = sql_query.replace("```sql", "").replace("```", "").replace("\n", " ").strip()
-            
-            if not invert:
-                self.logger.debug(f"Raw SQL Query: {sql_query}")
-            
-            return sql_query
+        formatted_prompt = prompt.format(
+            query=completed_prompt,
+            context=str(context),
+            schema_name=schema_name,
+            mode=mode,
+            task=task,
+            examples=examples
+        )
+        complexity = score_complexity(query_input, context["tables"]) if not invert else None
+        return formatted_prompt, complexity
+
+    def _column_stats(self, db, query_input, schema_name, tables):
+        try:
+            return self.stats_catalog.describe(db, schema_name, mentioned_tables(query_input, tables))
         except Exception as e:
-            self.logger.error(f"Query parsing error: {str(e)}")
-            return f"CLARIFY: Unable to parse query due to {str(e)}. Please provide more details."
+            db.reset_cursor()
+            self.logger.error(f"Column statistics unavailable: {str(e)}")
+            return []
+
+    def lookup_translation(self, user_input, schema_name):
+        """Return a stored SQL translation when the same request was already answered, else None.
+
+        Only read-only translations qualify, the request must match word for word with the
+        same literals (numbers, quoted strings), and the referenced tables must be unchanged
+        since the translation was saved. Similar but not identical requests ("null" vs.
+        "not null") are never reused; they only serve as few-shot examples. A request that
+        differs from an earlier one only in its literals gets the earlier SQL with the new
+        values bound in (see TemplateCache).
+        """
+        if self.translation_index is None:
+            return None
+        entry = self.translation_index.get(user_input, schema_name)
+        if entry is None or entry["fingerprint"] is None:
+            return self._lookup_template(user_input, schema_name)
+        db = self.router.connect(read_only=True)
+        try:
+            tables = [t.split(".")[-1] for t in entry["tables"]]
+            if db.get_table_fingerprint(schema_name, tables) != entry["fingerprint"]:
+                return None
         finally:
             db.close()
+        self.logger.debug(f"Reusing translation from version {entry['version_id']}")
+        return entry["sql_query"]
+
+    def _lookup_template(self, user_input, schema_name):
+        found = self.template_cache.lookup(user_input, schema_name)
+        if found is None:
+            return None
+        template, params = found
+        db = self.router.connect(read_only=True)
+        try:
+            if db.get_table_fingerprint(schema_name, template["tables"]) != template["fingerprint"]:
+                self.template_cache.invalidate(schema_name, template["tables"])
+                return None
+            sql_query = db.bind(template["sql"], params)
+        finally:
+            db.close()
+        self.logger.debug(f"Reusing parameterized translation with values {params}")
+        return sql_query
+
+    def map_csv_columns(self, header, sample, table_name, columns):
+        """Map CSV headers onto the columns of an existing table.
+
+        Headers are matched locally with the fuzzy ColumnIndex; only when some are
+        ambiguous or unmatched is the LLM shown the header, `sample` rows and the
+        table's columns. Returns (target column per header, unresolved headers).
+        """
+        column_index = column_index_for(columns)
+        min_score = self.config.get("column_match_min_score")
+        margin = self.config.get("column_match_ambiguity_margin")
+        mapping = []
+        for name in header:
+            column, _, _ = column_index.match(name, min_score, margin)
+            mapping.append(column)
+        unresolved = [name for name, column in zip(header, mapping) if column is None]
+        if unresolved:
+            mapping = self._llm_column_mapping(header, sample, table_name, columns, mapping)
+        # Two headers landing on one column would silently drop data
+        taken = [column for column in mapping if column]
+        unresolved = [name for name, column in zip(header, mapping) if column is None or taken.count(column) > 1]
+        return mapping, unresolved
+
+    def _llm_column_mapping(self, header, sample, table_name, columns, mapping):
+        prompt = (
+            f"A CSV file with header {json.dumps(header)} and first rows {json.dumps(sample)} "
+            f"is being loaded into table '{table_name}' with columns {json.dumps(list(columns))}.\n"
+            "Return ONLY a JSON object mapping every CSV header to the table column it belongs in, "
+            "or to null when no column fits."
+        )
+        answer = self.call_llm(prompt)
+        try:
+            suggested = json.loads(answer[answer.index("{"):answer.rindex("}") + 1])
+        except ValueError:
+            self.logger.error(f"Unusable CSV column mapping from the LLM: {answer}")
+            return mapping
+        known = {column.lower(): column for column in columns}
+        return [column or known.get(str(suggested.get(name) or "").lower()) for name, column in zip(header, mapping)]
+
+    def _few_shot_examples(self, user_input, schema_name):
+        if self.translation_index is None:
+            return ""
+        neighbours = self.translation_index.search(
+            user_input, schema_name,
+            k=self.config.get("translation_examples"),
+            min_score=self.config.get("translation_example_min_score")
+        )
+        if not neighbours:
+            return ""
+        lines = ["", "        Previously accepted translations of similar requests in this schema:"]
+        for _, entry in neighbours:
+            lines.append(f"        - Request: '{entry['user_query']}' -> SQL: {entry['sql_query']}")
+        return "\n".join(lines)
+
+    def call_llm(self, formatted_prompt, invert=False, complexity=None):
+        return self._converse([{"role": "user", "content": formatted_prompt}], complexity, invert)[0]
+
+    def _converse(self, messages, complexity=None, invert=False, model=None):
+        """Send `messages` to the routed model (or `model`); returns (sql or CLARIFY message, model that answered, failure or None)."""
+        model = model or self.model_router.choose(complexity)
+        sql_query, failure = self._request_sql(model, messages, complexity)
+        fallback = self.model_router.escalation_for(model) if failure else None
+        if fallback:
+            self.logger.debug(f"{model} answer rejected ({failure}); escalating to {fallback}")
+            model = fallback
+            sql_query, failure = self._request_sql(model, messages, complexity)
+
+        if not invert:
+            self.logger.debug(f"Raw SQL Query: {sql_query}")
+
+        return sql_query, model, failure
+
+    def _request_sql(self, model, messages, complexity=None):
+        """One Groq call; returns (sql or CLARIFY message, failure reason or None)."""
+        from groq import GroqError  # deferred: groq is only needed once a prompt actually goes out
+        score = complexity["score"] if complexity else "-"
+        self.logger.debug(f"Sending request to GROQ API ({model}, complexity {score}, {len(messages)} messages)...")
+        start_time = time.time()
+        try:
+            response = self.config.get_groq_client().chat.completions.create(
+                model=model,
+                messages=messages,
+                timeout=30
+            )
+            elapsed_time = time.time() - start_time
+            self.logger.debug(f"GROQ API response received in {elapsed_time:.2f} seconds")
+        except GroqError as e:
+            self.logger.error(f"GROQ API error: {str(e)}")
+            self.model_router.record(model, (time.time() - start_time) * 1000, complexity=complexity, failed=True)
+            return f"CLARIFY: GROQ API error: {str(e)}", str(e)
+        except Exception as e:
+            self.logger.error(f"GROQ API timeout or error: {str(e)}")
+            self.model_router.record(model, (time.time() - start_time) * 1000, complexity=complexity, failed=True)
+            return f"CLARIFY: GROQ API timeout or error: {str(e)}", str(e)
+
+        sql_query = response.choices[0].message.content.strip()
+        
+        sql_query = sql_query.replace("```sql", "").replace("```", "").replace("\n", " ").strip()
+
+        failure = check_sql(sql_query, complexity["schema_tables"]) if complexity else None
+        self.model_router.record(model, elapsed_time * 1000, getattr(response, "usage", None), complexity, failed=failure is not None)
+        return sql_query, failure
 
     def _complete_prompt(self, user_input, context):
         lower_input = user_input.lower()
         
-        if ("upload csv" in lower_input or "from csv" in lower_input or "load data" in lower_input) and "file_content" in st.session_state:
-            return f"{user_input} with content: {st.session_state['file_content']}"
-        elif "upload csv" in lower_input or "from csv" in lower_input or "load data" in lower_input:
-            return "CLARIFY: Please upload a CSV file first."
-
         table_name = None
-        for keyword in ["table", "into", "from", "update"]:
-            if keyword in lower_input:
-                parts = lower_input.split(keyword)
-                if len(parts) > 1 and parts[-1].strip():
-                    table_name = parts[-1].strip().split()[0]
-                    break
+        # last "table/into/from/update <name>" wins; whole words only so "updated" or "fromage" don't count
+        mentions = re.findall(r"\b(?:table|into|from|update)\s+([\w.]+)", lower_input)
+        if mentions:
+            table_name = mentions[-1].split(".")[-1]
         
         if not table_name:
             return user_input
         
-        if "create" in lower_input and table_name not in context["tables"]:
+        if re.search(r"\bcreate\b", lower_input) and table_name not in context["tables"]:
             return f"{user_input} with columns inferred from context if needed"
 
         if table_name in context["tables"]:
             columns = context["columns"][table_name]
-            data_part = lower_input.split("where")[0] if "where" in lower_input else lower_input
-            where_part = "where " + lower_input.split("where")[-1] if "where" in lower_input else ""
+            column_index = column_index_for(columns)
+            where_split = re.split(r"\bwhere\b", lower_input, maxsplit=1)
+            where_part = "where " + where_split[-1].strip() if len(where_split) > 1 else ""
+            # only the text after the table name carries column assignments
+            table_split = re.split(rf"\b{re.escape(table_name)}\b", where_split[0], maxsplit=1)
+            before_table = table_split[0]
+            data_part = table_split[-1]
             corrected_data = []
             for part in data_part.split(","):
                 part = part.strip()
                 if not part:
                     continue
-                if "is" in part or "=" in part or "to" in part:
-                    split_char = "is" if "is" in part else "to" if "to" in part else "="
-                    col_value_parts = part.split(split_char)
-                    if len(col_value_parts) < 2:
-                        continue
-                    col_part = col_value_parts[0].strip()
-                    value = col_value_parts[-1].strip()
-                    col_name = col_part.replace(" ", "_").lower()
-                    similar_cols = [c for c in columns if col_name in c or c in col_name]
-                    if len(similar_cols) == 1:
-                        corrected_data.append(f"{similar_cols[0]} {split_char} {value}")
-                    elif len(similar_cols) > 1:
-                        return f"CLARIFY: Multiple similar columns found in {table_name}: {similar_cols}. Which one did you mean for '{col_part}'?"
-                    else:
-                        corrected_data.append(part)
+                assignment = re.search(r"\s*(?:\b(is|to)\b|(=))\s*", part)
+                if not assignment:
+                    corrected_data.append(part)
+                    continue
+                split_char = assignment.group(1) or assignment.group(2)
+                col_part = part[:assignment.start()].strip()
+                value = part[assignment.end():].strip()
+                if not col_part or not value:
+                    continue
+                prefix, column, alternatives = self._match_column(col_part, column_index)
+                if alternatives:
+                    return f"CLARIFY: Multiple similar columns found in {table_name}: {alternatives}. Which one did you mean for '{col_part}'?"
+                if column:
+                    corrected_data.append(f"{prefix} {column} {split_char} {value}".strip())
                 else:
                     corrected_data.append(part)
-            corrected_input = f"{lower_input.split(table_name)[0]}{table_name} {', '.join(corrected_data)} {where_part}".strip()
+            corrected_input = f"{before_table}{table_name} {', '.join(corrected_data)} {where_part}".strip()
             return f"{corrected_input} in schema {context['current_schema']} table {table_name} with columns {columns}"
         
-        return user_input
\ No newline at end of file
+        return user_input
+
+    def _match_column(self, col_part, column_index):
+        """Match the trailing words of `col_part` to a column ("set store id" -> "store_id").
+
+        Returns (leading words, column, ambiguous alternatives); column is None when no suffix matches confidently.
+        """
+        words = col_part.split()
+        min_score = self.config.get("column_match_min_score")
+        margin = self.config.get("column_match_ambiguity_margin")
+        best = (None, 0.0, [], 0)
+        for size in range(min(3, len(words)), 0, -1):
+            column, score, alternatives = column_index.match(" ".join(words[-size:]), min_score, margin)
+            if (column or alternatives) and score > best[1]:
+                best = (column, score, alternatives, size)
+        column, _, alternatives, size = best
+        return " ".join(words[:len(words) - size]), column, alternatives
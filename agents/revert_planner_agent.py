@@ -0,0 +1,226 @@
+from database.connection_router import ConnectionRouter
+from database.history_manager import STATE_CAPTURE_LIMIT
+from utils.logger import Logger
+from utils.sql_classifier import classify
+
+# Statement types that change data or schema; everything else is skipped when collecting a chain
+WRITE_TYPES = {"INSERT", "UPDATE", "DELETE", "DROP_TABLE", "CREATE_TABLE", "CREATE_INDEX", "DROP_INDEX", "ALTER", "TRUNCATE", "RENAME_TABLE"}
+DELETE_CHUNK = 500
+# Statements whose every named table is written (dropped or renamed), not just the first
+MULTI_TARGET_TYPES = {"DROP_TABLE", "RENAME_TABLE"}
+
+
+def _table_key(name):
+    return name.split(".")[-1].strip("`").lower()
+
+
+class RevertPlannerAgent:
+    """Plans "revert to before version N" across every later version that touched the same tables.
+
+    Inverses are composed newest first. Between schema changes (rename column, drop/create
+    table) row-level steps are collapsed per (table, key) so each row is restored once to
+    its state before the chain: an UPDATE followed by a DELETE becomes a single re-insert,
+    and a row that was inserted and later deleted needs no statement at all.
+    """
+    def __init__(self, db_params, history, router=None):
+        self.db_params = db_params
+        self.history = history
+        self.router = router or ConnectionRouter(db_params)
+        self.logger = Logger()
+
+    def plan(self, version_id):
+        """Build the revert plan without executing it (dry run)."""
+        versions = self.history.get_versions_since(version_id)
+        if not versions or versions[0]["version_id"] != version_id:
+            return {"status": "error", "message": f"Version {version_id} not found"}
+        schema_name = versions[0]["schema_name"]
+        chain = self._collect_chain(versions)
+        if not chain:
+            return {"status": "error", "message": f"Version {version_id} did not change any table"}
+
+        db = self.router.connect()
+        try:
+            columns = {}
+            for table in {t for entry in chain for t in entry["tables"]}:
+                columns[table] = db.get_columns(schema_name, table)
+        finally:
+            db.close()
+
+        steps, warnings, unsupported, dropped = self._compose(chain, schema_name, columns)
+        statements = sum(len(step["params"]) or 1 for step in steps)
+        plan = {
+            "status": "success",
+            "target_version": version_id,
+            "schema_name": schema_name,
+            "versions": [entry["version_id"] for entry in reversed(chain)],
+            "steps": steps,
+            "statements": statements,
+            "dropped_steps": dropped,
+            "atomic": not any(step["kind"] == "ddl" for step in steps),
+            "warnings": warnings,
+            "unsupported": unsupported
+        }
+        if unsupported:
+            plan["status"] = "error"
+            plan["message"] = "Cannot plan revert: " + "; ".join(f"version {u['version_id']}: {u['reason']}" for u in unsupported)
+        return plan
+
+    def revert(self, version_id, dry_run=False):
+        plan = self.plan(version_id)
+        if plan["status"] != "success" or dry_run:
+            return plan
+        db = self.router.connect()
+        try:
+            db.run_in_transaction([(step["sql"], step["params"]) for step in plan["steps"]])
+            self.router.record_write()
+        except Exception as e:
+            self.logger.error(f"Error running revert plan for version {version_id}: {str(e)}")
+            return {"status": "error", "message": f"Error reverting to before version {version_id}: {str(e)}", "plan": plan}
+        finally:
+            db.close()
+        self.logger.debug(f"Reverted versions {plan['versions']} with {plan['statements']} statements")
+        return {
+            "status": "success",
+            "message": f"Reverted {len(plan['versions'])} version(s) back to before version {version_id} "
+                       f"({plan['statements']} statements, {plan['dropped_steps']} redundant steps skipped)",
+            "sql_query": self.history.get_query_by_version(version_id),
+            "inverse_query": "; ".join(step["sql"] for step in plan["steps"]),
+            "plan": plan
+        }
+
+    def _collect_chain(self, versions):
+        """The target version plus every later version that writes one of the tables it wrote (transitively)."""
+        chain = []
+        tables = set()
+        for position, entry in enumerate(versions):
+            try:
+                statement = classify(entry["sql_query"] or "")
+            except ValueError:
+                continue
+            if statement.statement_type not in WRITE_TYPES:
+                continue
+            # Only tables the version wrote: tables it merely read (subqueries, INSERT ... SELECT
+            # sources) neither join the chain nor become a write target
+            target = entry["table_name"] or statement.target_table
+            written = {_table_key(t) for t in statement.tables} if statement.statement_type in MULTI_TARGET_TYPES else set()
+            if target:
+                written.add(_table_key(target))
+            if position == 0:
+                tables |= written
+            elif not written & tables:
+                continue
+            else:
+                tables |= written
+            # The write target comes first: _compose and _ddl_inverse act on entry["tables"][0]
+            ordered = ([_table_key(target)] if target else []) + sorted(written - {_table_key(target)} if target else written)
+            chain.append(dict(entry, statement=statement, tables=ordered))
+        return chain
+
+    def _compose(self, chain, schema_name, columns):
+        steps = []
+        warnings = []
+        unsupported = []
+        segment = {}  # table -> {key: {"before": row or None, "exists_now": bool}}
+        segment_versions = {}
+        dropped = 0
+
+        for entry in reversed(chain):  # newest first
+            statement = entry["statement"]
+            table = entry["tables"][0] if entry["tables"] else None
+            state = entry["state_data"]
+            events = self._row_events(entry, statement, state, warnings)
+            if events is not None:
+                net = segment.setdefault(table, {})
+                segment_versions.setdefault(table, set()).add(entry["version_id"])
+                for key, op, before in events:
+                    if key in net:
+                        dropped += 1  # a newer version already decided whether this row exists now
+                    else:
+                        net[key] = {"exists_now": op != "delete"}
+                    net[key]["before"] = before  # older versions overwrite: the oldest pre-image wins
+                continue
+
+            ddl = self._ddl_inverse(entry, statement, state, schema_name, columns, warnings)
+            if ddl is None:
+                unsupported.append({"version_id": entry["version_id"], "reason": f"no captured state to undo {statement.statement_type}"})
+                continue
+            # Schema change: rows changed after it must be restored before undoing it
+            steps.extend(self._flush(segment, segment_versions, schema_name, columns, unsupported))
+            segment, segment_versions = {}, {}
+            steps.extend(ddl)
+
+        steps.extend(self._flush(segment, segment_versions, schema_name, columns, unsupported))
+        return steps, warnings, unsupported, dropped
+
+    def _row_events(self, entry, statement, state, warnings):
+        """[(key, op, pre-image)] for a row-level version, or None if it is not one."""
+        op = statement.statement_type
+        if op in ("UPDATE", "DELETE") and isinstance(state, list):
+            if len(state) >= STATE_CAPTURE_LIMIT:
+                warnings.append(f"Version {entry['version_id']}: only the first {STATE_CAPTURE_LIMIT} affected rows were captured")
+            return [(row[0], op.lower(), row) for row in state]
+        if op == "INSERT" and isinstance(state, dict) and "keys" in state:
+            return [(key, "insert", None) for key in state["keys"]]
+        return None
+
+    def _ddl_inverse(self, entry, statement, state, schema_name, columns, warnings):
+        """Inverse steps for a schema change, updating `columns` to the pre-change layout; None if unknown."""
+        table = entry["tables"][0] if entry["tables"] else None
+        qualified = f"{schema_name}.{table}"
+        if isinstance(state, dict) and state.get("inverse") is not None:
+            # Computed by HistoryManager.capture_state from SHOW CREATE TABLE before the change ran
+            columns[table] = list(state.get("columns_before", columns.get(table, [])))
+            if not state.get("complete", True):
+                warnings.append(f"Version {entry['version_id']}: only part of the data it destroyed was captured")
+            return [self._step(s["kind"], table, s["sql"], [tuple(p) for p in s["params"]], [entry["version_id"]]) for s in state["inverse"]]
+        if statement.statement_type == "ALTER" and isinstance(state, dict) and "old_column" in state:
+            columns[table] = [state["old_column"] if c.lower() == state["new_column"].lower() else c for c in columns.get(table, [])]
+            sql = f"ALTER TABLE {qualified} RENAME COLUMN {state['new_column']} TO {state['old_column']}"
+            return [self._step("ddl", table, sql, [], [entry["version_id"]])]
+        if statement.statement_type == "DROP_TABLE" and isinstance(state, dict) and "columns" in state:
+            columns[table] = list(state["columns"])
+            definition = ", ".join(f"{col} {typ}" for col, typ in zip(state["columns"], state["column_types"]))
+            steps = [self._step("ddl", table, f"CREATE TABLE {qualified} ({definition})", [], [entry["version_id"]])]
+            if state["data"]:
+                placeholders = ", ".join(["%s"] * len(state["columns"]))
+                sql = f"INSERT INTO {qualified} ({', '.join(state['columns'])}) VALUES ({placeholders})"
+                steps.append(self._step("insert", table, sql, [tuple(row) for row in state["data"]], [entry["version_id"]]))
+            return steps
+        if statement.statement_type == "CREATE_TABLE" and len(entry["tables"]) == 1:
+            columns[table] = []
+            return [self._step("ddl", table, f"DROP TABLE IF EXISTS {qualified}", [], [entry["version_id"]])]
+        return None
+
+    def _flush(self, segment, segment_versions, schema_name, columns, unsupported):
+        steps = []
+        for table, net in segment.items():
+            versions = sorted(segment_versions[table])
+            table_columns = columns.get(table, [])
+            qualified = f"{schema_name}.{table}"
+            deletes = [key for key, row in net.items() if row["before"] is None and row["exists_now"]]
+            updates = [row["before"] for row in net.values() if row["before"] is not None and row["exists_now"]]
+            inserts = [row["before"] for row in net.values() if row["before"] is not None and not row["exists_now"]]
+            if (updates or inserts or deletes) and not table_columns:
+                unsupported.append({"version_id": versions[-1], "reason": f"table {table} has no columns to restore into"})
+                continue
+            if any(len(row) != len(table_columns) for row in updates + inserts):
+                unsupported.append({"version_id": versions[-1], "reason": f"column count mismatch for {table}"})
+                continue
+            key_column = table_columns[0] if table_columns else None
+            for start in range(0, len(deletes), DELETE_CHUNK):
+                chunk = deletes[start:start + DELETE_CHUNK]
+                sql = f"DELETE FROM {qualified} WHERE {key_column} IN ({', '.join(['%s'] * len(chunk))})"
+                steps.append(self._step("delete", table, sql, [tuple(chunk)], versions))
+            if updates:
+                set_clause = ", ".join(f"{col} = %s" for col in table_columns)
+                sql = f"UPDATE {qualified} SET {set_clause} WHERE {key_column} = %s"
+                steps.append(self._step("update", table, sql, [tuple(row) + (row[0],) for row in updates], versions))
+            if inserts:
+                placeholders = ", ".join(["%s"] * len(table_columns))
+                sql = f"INSERT INTO {qualified} ({', '.join(table_columns)}) VALUES ({placeholders})"
+                steps.append(self._step("insert", table, sql, [tuple(row) for row in inserts], versions))
+        return steps
+
+    def _step(self, kind, table, sql, params, versions):
+        rows = sum(len(p) for p in params) if kind == "delete" else len(params)
+        return {"kind": kind, "table": table, "sql": sql, "params": params, "rows": rows, "versions": versions}
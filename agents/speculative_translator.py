@@ -0,0 +1,126 @@
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import weakref
+from agents.translation_scheduler import CHARS_PER_TOKEN, COMPLETION_TOKEN_ESTIMATE
+from utils.logger import Logger
+
+class SpeculativeTranslator:
+    """Translates the draft in the query box before it is submitted.
+
+    update() is called with every new draft; once a draft has been left alone for the
+    debounce interval it is translated on a background thread (schema context included),
+    and any older draft is cancelled. take() hands the finished or in-flight translation
+    to the submit path when the submitted text is the last draft. Tokens spent on drafts
+    that are never submitted count against token_budget; past it nothing new is started.
+    The worker threads are created with the first draft, so sessions that never turn the
+    toggle on hold none.
+    """
+    def __init__(self, parser, debounce_ms=800, token_budget=20000):
+        self.parser = parser
+        self.debounce_s = debounce_ms / 1000
+        self.token_budget = token_budget
+        self.pool = None  # created by the first _start()
+        self._finalizer = None
+        self.current = None  # {"key", "timer", "future", "tokens", "cancelled"} for the latest draft
+        self.submitted = None  # key of the last take(); the box still holds that text on later reruns
+        self.lock = threading.Lock()
+        self.wasted_tokens = 0
+        self.hits = 0
+        self.logger = Logger()
+
+    @classmethod
+    def from_config(cls, parser, config):
+        return cls(parser, config.get("speculative_debounce_ms", 800), config.get("speculative_token_budget", 20000))
+
+    def update(self, user_input, schema_name):
+        """Schedule a translation of the current draft, replacing any earlier one."""
+        key = (" ".join(user_input.split()), schema_name)
+        with self.lock:
+            if key == self.submitted or (self.current is not None and self.current["key"] == key):
+                return
+            if self.current is not None:
+                self._discard(self.current)
+                self.current = None
+            if self.wasted_tokens >= self.token_budget:
+                self.logger.debug("Speculative translation budget used up; waiting for submit")
+                return
+            draft = {"key": key, "future": None, "tokens": 0, "cancelled": threading.Event()}
+            draft["timer"] = threading.Timer(self.debounce_s, self._start, (draft,))
+            draft["timer"].daemon = True
+            self.current = draft
+            draft["timer"].start()
+
+    def take(self, user_input, schema_name):
+        """SQL for the submitted request when the last draft was that request, else None.
+
+        Waits for a translation that is still running. A draft whose debounce had not
+        fired yet is dropped, and so is a CLARIFY answer, so the normal path asks again
+        and keeps the clarification conversation.
+        """
+        key = (" ".join(user_input.split()), schema_name)
+        with self.lock:
+            draft, self.current = self.current, None
+            self.submitted = key
+            if draft is None:
+                return None
+            if draft["key"] != key or draft["future"] is None:
+                self._discard(draft)
+                return None
+        try:
+            sql_query = draft["future"].result()
+        except Exception as e:
+            self.logger.error(f"Speculative translation failed: {str(e)}")
+            sql_query = None
+        if not sql_query or sql_query.startswith("CLARIFY:"):
+            with self.lock:
+                self.wasted_tokens += draft["tokens"]
+            return None
+        self.hits += 1
+        self.logger.debug(f"Using speculative translation of: {user_input}")
+        return sql_query
+
+    def shutdown(self):
+        """Drop the current draft and stop the worker threads; safe to call more than once."""
+        with self.lock:
+            if self.current is not None:
+                self._discard(self.current)
+                self.current = None
+            finalizer, self.pool, self._finalizer = self._finalizer, None, None
+        if finalizer is not None:
+            finalizer()
+
+    def _discard(self, draft):
+        # Caller holds the lock. A call already sent to Groq cannot be recalled; its reply is ignored.
+        draft["cancelled"].set()
+        draft["timer"].cancel()
+        if draft["future"] is not None:
+            draft["future"].cancel()
+        self.wasted_tokens += draft["tokens"]
+
+    def _start(self, draft):
+        with self.lock:
+            if self.current is draft and not draft["cancelled"].is_set():
+                if self.pool is None:
+                    self.pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="speculate")
+                    # Streamlit has no session-end hook: the threads also stop when the
+                    # translator is garbage-collected with its session's controller
+                    self._finalizer = weakref.finalize(self, self.pool.shutdown, wait=False)
+                draft["future"] = self.pool.submit(self._translate, draft)
+
+    def _translate(self, draft):
+        user_input, schema_name = draft["key"]
+        try:
+            reused = self.parser.lookup_translation(user_input, schema_name)
+            if reused:
+                return reused
+            formatted_prompt, complexity = self.parser.build_prompt(user_input, schema_name)
+        except Exception as e:
+            self.logger.error(f"Speculative prompt build failed: {str(e)}")
+            return None
+        tokens = len(formatted_prompt) // CHARS_PER_TOKEN + COMPLETION_TOKEN_ESTIMATE
+        with self.lock:
+            # Last point where a stale draft costs nothing
+            if draft["cancelled"].is_set() or self.wasted_tokens + tokens > self.token_budget:
+                return None
+            draft["tokens"] = tokens
+        return self.parser.call_llm(formatted_prompt, complexity=complexity)
@@ -1,13 +1,94 @@
-from database.db_connection import DBConnection
-import streamlit as st
+from database.connection_router import ConnectionRouter
+from utils.cost_guard import CostGuard, QueryBlockedError, ConfirmationRequiredError
+from utils.sql_classifier import classify_all, is_read_only
+from database.history_manager import STATE_CAPTURE_LIMIT
+from utils.result_exporter import export_path, export_stream
+from agents.query_job import QueryJob
 
 class SQLExecutorAgent:
-    def execute(self, sql_query, schema_name):
-        db = DBConnection(**st.session_state.db_params)
+    def __init__(self, db_params, config=None, router=None):
+        self.db_params = db_params
+        self.config = config
+        self.router = router or ConnectionRouter(db_params)
+        self.cost_guard = CostGuard.from_config(config) if config is not None else None
+
+    def execute(self, sql_query, schema_name, confirmed=False):
+        result, _ = self.execute_with_estimate(sql_query, schema_name, confirmed)
+        return result
+
+    def execute_with_estimate(self, sql_query, schema_name, confirmed=False):
+        """Run the cost guard, then the (possibly rewritten) query. Returns (result, estimate)."""
+        db = self.router.connect_for(sql_query)
         try:
+            sql_query, estimate = self.review(db, sql_query, confirmed)
             result = db.execute_query(sql_query)
+            if not is_read_only(sql_query):
+                self.router.record_write()
             if result is not None:
-                return result
-            return "Query executed successfully"
+                return result, estimate
+            return "Query executed successfully", estimate
+        finally:
+            db.close()
+
+    def review(self, db, sql_query, confirmed=False):
+        """Apply the cost guard on `db`: returns (sql to run, estimate) or raises if blocked/unconfirmed."""
+        estimate = self.cost_guard.review(db, sql_query) if self.cost_guard else None
+        if estimate:
+            if "block" in estimate["actions"]:
+                raise QueryBlockedError(estimate)
+            if "confirm" in estimate["actions"] and not confirmed:
+                raise ConfirmationRequiredError(estimate)
+            sql_query = estimate["sql_query"]
+        return sql_query, estimate
+
+    def submit(self, sql_query, schema_name, confirmed=False, max_execution_ms=None):
+        """Start the query on a background QueryJob and return it immediately."""
+        if max_execution_ms is None and self.config is not None:
+            max_execution_ms = self.config.get("query_max_execution_ms")
+        return QueryJob(self, sql_query, schema_name, confirmed, max_execution_ms).start()
+
+    def dry_run(self, sql_query, schema_name):
+        """Preview a single UPDATE/DELETE: affected rows and before/after rows, then roll back.
+
+        The before rows are the same pre-image HistoryManager.capture_state would take, so a
+        confirmed run can reuse them. Returns None when the statement cannot be previewed
+        safely (other statement types, or tables whose engine ignores ROLLBACK).
+        """
+        statements = classify_all(sql_query)
+        if len(statements) != 1 or statements[0].statement_type not in ("UPDATE", "DELETE") or not statements[0].target_table:
+            return None
+        statement = statements[0]
+        db = self.router.connect()
+        try:
+            tables = [t.split(".")[-1] for t in statement.tables]
+            table_schema = statement.target_table.split(".")[0] if "." in statement.target_table else schema_name
+            engines = db.get_table_engines(table_schema, tables)
+            if any((engines.get(t.lower()) or "").upper() != "INNODB" for t in tables):
+                return None  # e.g. MyISAM: the "rolled back" change would persist
+            return db.dry_run(statement.sql, statement.target_table, statement.where_clause or "", STATE_CAPTURE_LIMIT)
+        finally:
+            db.close()
+
+    def estimate(self, sql_query, schema_name):
+        """Cost estimate without executing; None when the guard is off or the query cannot be explained."""
+        if not self.cost_guard:
+            return None
+        db = self.router.connect_for(sql_query)
+        try:
+            return self.cost_guard.review(db, sql_query)
+        finally:
+            db.close()
+
+    def export(self, sql_query, schema_name, fmt="csv", path=None):
+        """Stream the full result of a SELECT to a CSV/Parquet file; returns the export stats."""
+        statements = classify_all(sql_query)
+        if len(statements) != 1 or statements[0].statement_type != "SELECT" or not statements[0].is_read_only:
+            raise ValueError("Only a single SELECT query can be exported")
+        chunk_rows = self.config.get("export_chunk_rows", 5000) if self.config else 5000
+        export_dir = self.config.get("export_dir") if self.config else None
+        path = path or export_path(fmt, export_dir)
+        db = self.router.connect(read_only=True)
+        try:
+            return export_stream(db.stream_query(statements[0].sql, chunk_rows=chunk_rows), fmt, path)
         finally:
-            db.close()
\ No newline at end of file
+            db.close()
@@ -0,0 +1,111 @@
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import time
+from utils.logger import Logger
+from utils.rate_limiter import TokenBucket
+
+# Rough prompt sizing for the TPM bucket: ~4 characters per token plus room for the reply
+CHARS_PER_TOKEN = 4
+COMPLETION_TOKEN_ESTIMATE = 256
+
+class TranslationScheduler:
+    """Runs NL-to-SQL translations on a thread pool under Groq's RPM/TPM quotas.
+
+    Identical (request, schema) pairs that are already queued or running share
+    one translation instead of spending a second LLM call.
+    """
+    def __init__(self, parser, max_concurrency=4, requests_per_minute=30, tokens_per_minute=12000):
+        self.parser = parser
+        self.pool = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="translate")
+        self.request_bucket = TokenBucket.per_minute(requests_per_minute)
+        self.token_bucket = TokenBucket.per_minute(tokens_per_minute)
+        self.in_flight = {}
+        self.lock = threading.Lock()
+        self.merged_requests = 0
+        self.logger = Logger()
+
+    @classmethod
+    def from_config(cls, parser, config):
+        return cls(
+            parser,
+            max_concurrency=config.get("llm_max_concurrency"),
+            requests_per_minute=config.get("llm_requests_per_minute"),
+            tokens_per_minute=config.get("llm_tokens_per_minute")
+        )
+
+    def submit(self, user_input, schema_name):
+        """Queue a translation and return a Future resolving to a timing dict (see _translate)."""
+        key = (user_input.strip(), schema_name)
+        with self.lock:
+            future = self.in_flight.get(key)
+            if future is not None:
+                self.merged_requests += 1
+                self.logger.debug(f"Merged duplicate translation request: {user_input}")
+                return future
+            future = self.pool.submit(self._translate, user_input, schema_name, time.perf_counter())
+            self.in_flight[key] = future
+        future.add_done_callback(lambda f, key=key: self._release(key, f))
+        return future
+
+    def translate_all(self, requests):
+        """Translate (user_input, schema_name) pairs concurrently; results come back in input order."""
+        futures = []
+        seen = set()
+        for user_input, schema_name in requests:
+            future = self.submit(user_input, schema_name)
+            futures.append((future, id(future) in seen))
+            seen.add(id(future))
+        results = []
+        for future, merged in futures:
+            result = dict(future.result())
+            result["merged"] = merged
+            results.append(result)
+        return results
+
+    def shutdown(self):
+        self.pool.shutdown(wait=True)
+
+    def _release(self, key, future):
+        with self.lock:
+            if self.in_flight.get(key) is future:
+                del self.in_flight[key]
+
+    def _translate(self, user_input, schema_name, submitted_at):
+        started_at = time.perf_counter()
+        queue_wait = started_at - submitted_at
+        try:
+            reused = self.parser.lookup_translation(user_input, schema_name)
+            if reused:
+                return {
+                    "sql_query": reused,
+                    "queue_wait_ms": round(queue_wait * 1000, 2),
+                    "prompt_ms": round((time.perf_counter() - started_at) * 1000, 2),
+                    "llm_ms": 0.0,
+                    "reused": True
+                }
+            formatted_prompt, complexity = self.parser.build_prompt(user_input, schema_name)
+        except Exception as e:
+            self.logger.error(f"Query parsing error: {str(e)}")
+            return {
+                "sql_query": f"CLARIFY: Unable to parse query due to {str(e)}. Please provide more details.",
+                "queue_wait_ms": round(queue_wait * 1000, 2),
+                "prompt_ms": round((time.perf_counter() - started_at) * 1000, 2),
+                "llm_ms": 0.0,
+                "reused": False
+            }
+        prompt_ms = (time.perf_counter() - started_at) * 1000
+
+        # Time spent blocked on the rate limits counts as queueing, not LLM time
+        estimated_tokens = len(formatted_prompt) // CHARS_PER_TOKEN + COMPLETION_TOKEN_ESTIMATE
+        queue_wait += self.request_bucket.acquire(1)
+        queue_wait += self.token_bucket.acquire(estimated_tokens)
+
+        llm_start = time.perf_counter()
+        sql_query = self.parser.call_llm(formatted_prompt, complexity=complexity)
+        return {
+            "sql_query": sql_query,
+            "queue_wait_ms": round(queue_wait * 1000, 2),
+            "prompt_ms": round(prompt_ms, 2),
+            "llm_ms": round((time.perf_counter() - llm_start) * 1000, 2),
+            "reused": False
+        }
@@ -0,0 +1,150 @@
+"""Headless batch runner for the AlmostSQL agent pipeline.
+
+Reads natural-language requests from a JSONL file (one object per line with a
+"query" key and optional "id" and "schema" keys), runs each one through
+parse -> execute -> history without Streamlit and writes one JSON result per
+line, including per-request latency.
+
+With --concurrency > 1 all requests are translated up front by the
+TranslationScheduler (bounded by the configured RPM/TPM quotas) and then
+executed one by one in file order.
+
+    python batch.py requests.jsonl --host localhost --user root --database mydb --output results.jsonl
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+from agents.controller_agent import ControllerAgent
+from agents.model_router import ModelRouter
+from agents.translation_scheduler import TranslationScheduler
+from config.config import Config
+from database.connection_router import parse_replicas
+
+
+def read_requests(path):
+    requests = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line_no, line in enumerate(f, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                request = json.loads(line)
+            except json.JSONDecodeError as e:
+                raise ValueError(f"Invalid JSON on line {line_no}: {e}")
+            if not isinstance(request, dict) or not request.get("query"):
+                raise ValueError(f"Line {line_no} must be an object with a 'query' key")
+            request.setdefault("id", line_no)
+            requests.append(request)
+    return requests
+
+
+def run_request(controller, request, schema_name, confirm_destructive=False, translation=None):
+    start_time = time.perf_counter()
+    sql_query = translation["sql_query"] if translation else None
+    result = controller.process_query(request["query"], schema_name, sql_query=sql_query)
+    if result["status"] == "confirmation_needed" and confirm_destructive:
+        result = controller.execute_confirmed(request["query"], result["sql_query"], schema_name)
+    latency_ms = (time.perf_counter() - start_time) * 1000
+
+    record = {
+        "id": request["id"],
+        "query": request["query"],
+        "schema": schema_name,
+        "status": result["status"],
+        "sql_query": result.get("sql_query"),
+        "latency_ms": round(latency_ms, 2)
+    }
+    if translation:
+        # Translation ran ahead in the scheduler, so report its phases separately
+        record["translation"] = {
+            "queue_wait_ms": translation["queue_wait_ms"],
+            "prompt_ms": translation["prompt_ms"],
+            "llm_ms": translation["llm_ms"],
+            "merged": translation["merged"],
+            "reused": translation["reused"]
+        }
+    if "message" in result:
+        record["message"] = result["message"]
+    if "version_id" in result:
+        record["version_id"] = result["version_id"]
+    if isinstance(result.get("result"), dict):
+        record["result"] = result["result"]
+    return record
+
+
+def build_arg_parser():
+    parser = argparse.ArgumentParser(description="Run natural-language requests through AlmostSQL without the UI.")
+    parser.add_argument("requests", help="JSONL file of requests ({\"id\", \"query\", \"schema\"})")
+    parser.add_argument("--output", "-o", help="JSONL file for results (default: stdout)")
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=3306)
+    parser.add_argument("--user", default="root")
+    parser.add_argument("--password", default=os.environ.get("MYSQL_PASSWORD", ""))
+    parser.add_argument("--database", required=True, help="Database holding the query history")
+    parser.add_argument("--schema", help="Default schema for requests (default: --database)")
+    parser.add_argument("--groq-api-key", default=os.environ.get("GROQ_API_KEY", ""))
+    parser.add_argument("--concurrency", type=int, default=1,
+                        help="Translate up to N requests concurrently before executing them in order")
+    parser.add_argument("--rpm", type=int, help="LLM requests-per-minute quota for concurrent translation")
+    parser.add_argument("--tpm", type=int, help="LLM tokens-per-minute quota for concurrent translation")
+    parser.add_argument("--replica", action="append", default=[], metavar="HOST[:PORT]",
+                        help="Read replica for read-only statements (repeatable)")
+    parser.add_argument("--confirm-destructive", action="store_true",
+                        help="Execute UPDATE/DELETE/ALTER statements instead of reporting confirmation_needed")
+    return parser
+
+
+def main(argv=None):
+    args = build_arg_parser().parse_args(argv)
+    db_params = {
+        "host": args.host,
+        "port": args.port,
+        "user": args.user,
+        "password": args.password,
+        "database": args.database
+    }
+    settings = {"llm_max_concurrency": args.concurrency, "read_replicas": parse_replicas("\n".join(args.replica))}
+    if args.rpm:
+        settings["llm_requests_per_minute"] = args.rpm
+    if args.tpm:
+        settings["llm_tokens_per_minute"] = args.tpm
+    config = Config(args.groq_api_key, settings)
+    requests = read_requests(args.requests)
+    controller = ControllerAgent(db_params, config)
+    default_schema = args.schema or args.database
+    schemas = [request.get("schema") or default_schema for request in requests]
+
+    translations = [None] * len(requests)
+    if args.concurrency > 1:
+        scheduler = TranslationScheduler.from_config(controller.parser, config)
+        try:
+            translations = scheduler.translate_all(
+                [(request["query"], schema_name) for request, schema_name in zip(requests, schemas)]
+            )
+        finally:
+            scheduler.shutdown()
+
+    out = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+    failures = 0
+    try:
+        for request, schema_name, translation in zip(requests, schemas, translations):
+            record = run_request(controller, request, schema_name, args.confirm_destructive, translation)
+            if record["status"] == "error":
+                failures += 1
+            out.write(json.dumps(record, default=str) + "\n")
+            out.flush()
+    finally:
+        if out is not sys.stdout:
+            out.close()
+        controller.history.db.close()
+    # Per-model latency/token counters, for tuning llm_fast_max_complexity
+    print(json.dumps({"model_stats": ModelRouter.stats()}), file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,136 @@
+"""Cold-start benchmark for the Streamlit app.
+
+Measures, each in a fresh interpreter so nothing is already cached:
+  - import time of main.py, with its slowest direct imports (python -X importtime)
+  - time to first render of the connection form, via streamlit's AppTest runner
+
+With --host/--database the second render (after connecting) is timed as well;
+that one builds the ControllerAgent and runs the history-table checks.
+
+    python bench_startup.py --runs 5 --import-budget-ms 1500 --render-budget-ms 4000
+
+Exits with status 1 when a median exceeds its budget.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+RENDER_SCRIPT = """
+import json, sys, time
+from streamlit.testing.v1 import AppTest
+options = json.loads(sys.argv[1])
+start = time.perf_counter()
+app = AppTest.from_file("main.py", default_timeout=options["timeout"])
+app.run()
+timings = {"first_render_ms": (time.perf_counter() - start) * 1000, "exception": [str(e.value) for e in app.exception]}
+if options.get("db_params"):
+    app.session_state["connection_setup"] = True
+    app.session_state["db_params"] = options["db_params"]
+    app.session_state["groq_api_key"] = options["groq_api_key"]
+    start = time.perf_counter()
+    app.run()
+    timings["connected_render_ms"] = (time.perf_counter() - start) * 1000
+    timings["exception"] += [str(e.value) for e in app.exception]
+print(json.dumps(timings))
+"""
+
+
+def measure_import(top=10):
+    """Import main.py in a fresh interpreter; returns (total_ms, slowest direct imports as [(module, cumulative_ms)])."""
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        cwd=ROOT, capture_output=True, text=True
+    )
+    if completed.returncode != 0:
+        raise RuntimeError(f"Importing main.py failed:\n{completed.stderr[-2000:]}")
+    direct = []
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        if not cumulative.strip().isdigit():
+            continue  # header line
+        # Children are printed before their parent, indented two spaces per level
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        if depth == 0:
+            if name.strip() == "main":
+                return int(cumulative) / 1000, sorted(direct, key=lambda m: -m[1])[:top]
+            direct = []
+        elif depth == 1:
+            direct.append((name.strip(), int(cumulative) / 1000))
+    raise RuntimeError("main.py does not appear in the -X importtime output")
+
+
+def measure_render(options):
+    completed = subprocess.run(
+        [sys.executable, "-c", RENDER_SCRIPT, json.dumps(options)],
+        cwd=ROOT, capture_output=True, text=True
+    )
+    if completed.returncode != 0:
+        raise RuntimeError(f"Rendering main.py failed:\n{completed.stderr[-2000:]}")
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Measure AlmostSQL import time and time to first render.")
+    parser.add_argument("--runs", type=int, default=3, help="Fresh-process runs per measurement (median is reported)")
+    parser.add_argument("--top", type=int, default=10, help="Number of slowest imports to list")
+    parser.add_argument("--import-budget-ms", type=float, help="Fail if median import time exceeds this")
+    parser.add_argument("--render-budget-ms", type=float, help="Fail if median first render exceeds this")
+    parser.add_argument("--timeout", type=float, default=30, help="AppTest script timeout in seconds")
+    parser.add_argument("--host", help="Also time the connected render against this MySQL host")
+    parser.add_argument("--port", type=int, default=3306)
+    parser.add_argument("--user", default="root")
+    parser.add_argument("--password", default=os.environ.get("MYSQL_PASSWORD", ""))
+    parser.add_argument("--database")
+    parser.add_argument("--groq-api-key", default=os.environ.get("GROQ_API_KEY", ""))
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    options = {"timeout": args.timeout, "groq_api_key": args.groq_api_key}
+    if args.host and args.database:
+        options["db_params"] = {"host": args.host, "port": args.port, "user": args.user,
+                                "password": args.password, "database": args.database}
+
+    import_runs, render_runs, connected_runs = [], [], []
+    slowest = []
+    for _ in range(args.runs):
+        total, slowest = measure_import(args.top)
+        import_runs.append(total)
+        timings = measure_render(options)
+        if timings["exception"]:
+            print(f"App raised during render: {timings['exception']}", file=sys.stderr)
+            return 1
+        render_runs.append(timings["first_render_ms"])
+        if "connected_render_ms" in timings:
+            connected_runs.append(timings["connected_render_ms"])
+
+    import_ms = statistics.median(import_runs)
+    render_ms = statistics.median(render_runs)
+    print(f"import main.py:        {import_ms:8.1f} ms (median of {args.runs})")
+    print(f"first render:          {render_ms:8.1f} ms")
+    if connected_runs:
+        print(f"first connected render:{statistics.median(connected_runs):8.1f} ms")
+    print("slowest imports made by main.py (last run):")
+    for name, ms in slowest:
+        print(f"  {name:<40} {ms:8.1f} ms")
+
+    over_budget = False
+    if args.import_budget_ms is not None and import_ms > args.import_budget_ms:
+        print(f"Import time {import_ms:.1f} ms exceeds budget of {args.import_budget_ms:.1f} ms", file=sys.stderr)
+        over_budget = True
+    if args.render_budget_ms is not None and render_ms > args.render_budget_ms:
+        print(f"First render {render_ms:.1f} ms exceeds budget of {args.render_budget_ms:.1f} ms", file=sys.stderr)
+        over_budget = True
+    return 1 if over_budget else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,10 +1,86 @@
+DEFAULT_SETTINGS = {
+    # Translation scheduler (defaults match Groq's free-tier quota for llama-3.3-70b-versatile)
+    "llm_max_concurrency": 4,
+    "llm_requests_per_minute": 30,
+    "llm_tokens_per_minute": 12000,
+    # Model routing: requests scoring <= llm_fast_max_complexity go to the fast model, the rest
+    # (and fast answers that fail validation) to the large one
+    "llm_routing_enabled": True,
+    "llm_fast_model": "llama-3.1-8b-instant",
+    "llm_large_model": "llama-3.3-70b-versatile",
+    "llm_fast_max_complexity": 1,
+    "llm_latency_budget_ms": None,  # large model's median over this -> one more point goes fast
+    # EXPLAIN-based cost guard (thresholds are estimated rows examined)
+    "cost_guard_enabled": True,
+    "cost_guard_limit_rows": 10000,
+    "cost_guard_auto_limit": 1000,
+    "cost_guard_timeout_rows": 100000,
+    "cost_guard_max_execution_ms": 30000,
+    "cost_guard_confirm_rows": 1000000,
+    "cost_guard_block_rows": 50000000,
+    # Similarity retrieval over query_history
+    "translation_examples": 3,
+    "translation_example_min_score": 0.35,
+    # Reuse a read-only translation for requests that differ only in numbers/quoted values
+    "template_cache_enabled": True,
+    # Translate the query box draft before submit (UI toggle default, idle time, tokens wasted per session)
+    "speculative_translation_enabled": False,
+    "speculative_debounce_ms": 800,
+    "speculative_token_budget": 20000,
+    # Follow-up messages answering a CLARIFY before the request is translated afresh
+    "clarify_max_rounds": 3,
+    # Column statistics added to the prompt for the tables a request names
+    "stats_enabled": True,
+    "stats_sample_rows": 1000,
+    "stats_top_k": 5,
+    "stats_max_tables": 4,
+    "stats_max_age_seconds": 600,
+    # Fuzzy column matching in QueryParserAgent._complete_prompt
+    "column_match_min_score": 0.6,
+    "column_match_ambiguity_margin": 0.05,
+    # Dry-run preview of UPDATE/DELETE before confirmation (rolled back; skipped above this EXPLAIN estimate)
+    "dry_run_max_rows": 100000,
+    "dry_run_capture_ttl_seconds": 60,  # confirming within this reuses the preview's pre-image
+    # Background execution: MAX_EXECUTION_TIME hint for SELECTs started from the UI (0 = none)
+    "query_max_execution_ms": 120000,
+    # Read replicas: [{"host", "port"[, "user", "password"]}]; read-only statements are routed to them
+    "read_replicas": [],
+    "replica_strategy": "round_robin",  # or "least_loaded"
+    "replica_sticky_seconds": 5,  # reads stay on the primary this long after a write
+    "replica_retry_seconds": 30,
+    # Parallel CSV ingest: files of csv_parallel_min_bytes or more are split into byte-range chunks,
+    # parsed by csv_parallel_workers processes and inserted over csv_parallel_connections connections
+    "csv_parallel_min_bytes": 16 * 1024 * 1024,
+    "csv_chunk_bytes": 8 * 1024 * 1024,
+    "csv_parallel_workers": 4,
+    "csv_parallel_connections": 4,
+    "csv_batch_rows": 1000,
+    # Local engine: query uploaded CSVs in-process (DuckDB if installed, else SQLite) via the "local_csv" schema
+    "local_engine_enabled": True,
+    "local_prefer_duckdb": True,
+    "local_max_rows": 1000,
+    "local_mmap_bytes": 1 << 30,
+    # Sidebar table browser: names per page, and max age of cached columns/keys per table
+    "schema_browser_page_size": 50,
+    "schema_browser_ttl_seconds": 600,
+    # Result export (None = temp directory, offered as a download in the UI)
+    "export_chunk_rows": 5000,
+    "export_dir": None,
+}
+
 class Config:
-    def __init__(self, groq_api_key):
+    def __init__(self, groq_api_key, settings=None):
         self.groq_api_key = groq_api_key
+        self.settings = dict(DEFAULT_SETTINGS)
+        if settings:
+            self.settings.update(settings)
 
     def get_groq_api_key(self):
         return self.groq_api_key
 
+    def get(self, key, default=None):
+        return self.settings.get(key, default)
+
     def get_groq_client(self):
         from groq import Groq
-        return Groq(api_key=self.groq_api_key)
\ No newline at end of file
+        return Groq(api_key=self.groq_api_key)
@@ -0,0 +1,108 @@
+import itertools
+import threading
+import time
+
+from database.db_connection import DBConnection
+from utils.logger import Logger
+from utils.sql_classifier import classify_all
+
+# Open connections per (host, port), shared by every router in the process for least-loaded picks
+_IN_FLIGHT = {}
+_DOWN_UNTIL = {}
+_LOCK = threading.Lock()
+
+
+def parse_replicas(text, default_port=3306):
+    """'host[:port]' entries, one per line or comma-separated, as partial connection params."""
+    replicas = []
+    for item in text.replace(",", "\n").splitlines():
+        item = item.strip()
+        if not item:
+            continue
+        host, _, port = item.partition(":")
+        replicas.append({"host": host.strip(), "port": int(port) if port.strip() else default_port})
+    return replicas
+
+
+class ConnectionRouter:
+    """Hands out DBConnections: the primary for writes, a replica for reads.
+
+    Replicas are picked round-robin or by fewest open connections. After this router
+    records a write, reads stay on the primary for `sticky_seconds` so a session sees
+    its own changes despite replication lag. A replica that fails to connect is skipped
+    for `retry_seconds`, and reads fall back to the primary when no replica is available.
+    """
+    def __init__(self, db_params, replicas=None, strategy="round_robin", sticky_seconds=5, retry_seconds=30):
+        self.primary = dict(db_params)
+        # Replica entries override host/port (and optionally user/password) of the primary params
+        self.replicas = [dict(self.primary, **replica) for replica in (replicas or [])]
+        self.strategy = strategy
+        self.sticky_seconds = sticky_seconds
+        self.retry_seconds = retry_seconds
+        self.last_write = 0.0
+        self.cycle = itertools.count()
+        self.logger = Logger()
+
+    @classmethod
+    def from_config(cls, db_params, config):
+        return cls(
+            db_params,
+            config.get("read_replicas"),
+            config.get("replica_strategy", "round_robin"),
+            config.get("replica_sticky_seconds", 5),
+            config.get("replica_retry_seconds", 30)
+        )
+
+    def connect(self, read_only=False):
+        """Connection for a read-only or a writing workload."""
+        if read_only and self.replicas and not self.sticky:
+            for params in self._replica_order():
+                key = self._key(params)
+                try:
+                    return self._open(params, key)
+                except Exception as e:
+                    with _LOCK:
+                        _DOWN_UNTIL[key] = time.time() + self.retry_seconds
+                    self.logger.error(f"Replica {key[0]}:{key[1]} unavailable, skipping for {self.retry_seconds}s: {str(e)}")
+        return self._open(self.primary, self._key(self.primary))
+
+    def connect_for(self, sql_query):
+        """Route by the statement itself: read-only SQL may go to a replica, anything else to the primary."""
+        try:
+            statements = classify_all(sql_query)
+        except ValueError:
+            statements = []
+        read_only = bool(statements) and all(s.is_read_only for s in statements)
+        return self.connect(read_only=read_only)
+
+    def record_write(self):
+        self.last_write = time.time()
+
+    @property
+    def sticky(self):
+        return time.time() - self.last_write < self.sticky_seconds
+
+    def _replica_order(self):
+        now = time.time()
+        with _LOCK:
+            available = [r for r in self.replicas if _DOWN_UNTIL.get(self._key(r), 0) <= now]
+            if self.strategy == "least_loaded":
+                return sorted(available, key=lambda r: _IN_FLIGHT.get(self._key(r), 0))
+        if not available:
+            return []
+        start = next(self.cycle) % len(available)
+        return available[start:] + available[:start]
+
+    def _open(self, params, key):
+        db = DBConnection(**params)
+        with _LOCK:
+            _IN_FLIGHT[key] = _IN_FLIGHT.get(key, 0) + 1
+        db.on_close = lambda: self._release(key)
+        return db
+
+    def _release(self, key):
+        with _LOCK:
+            _IN_FLIGHT[key] = max(_IN_FLIGHT.get(key, 1) - 1, 0)
+
+    def _key(self, params):
+        return (params.get("host"), params.get("port", 3306))
@@ -1,10 +1,22 @@
-import mysql.connector
-import streamlit as st
+from collections import OrderedDict
 from datetime import date, datetime
 from decimal import Decimal
+import hashlib
+import re
+from utils.sql_classifier import classify
+
+PREPARED_CACHE_SIZE = 32
+_DDL_RE = re.compile(r"^\s*(ALTER|DROP|CREATE|RENAME|TRUNCATE)\b", re.IGNORECASE)
 
 class DBConnection:
     def __init__(self, **db_params):
+        import mysql.connector  # deferred so importing the app does not load the driver
+        self.params = db_params  # server this connection went to (ConnectionRouter may pick a replica)
+        self.on_close = None
+        # SQL text -> (prepared cursor, the exact SQL object it was prepared with, referenced tables)
+        self.prepared = OrderedDict()
+        self.prepared_stats = {"hits": 0, "misses": 0, "evictions": 0, "invalidations": 0}
+        self.last_insert_id = None
         self.connection = mysql.connector.connect(**db_params)
         self.connection.autocommit = True
         self.cursor = self.connection.cursor()
@@ -57,11 +69,193 @@ class DBConnection:
             else:  # No result set (e.g., INSERT, UPDATE, DELETE)
                 self.connection.commit()
                 result = {"columns": ["AffectedRows"], "rows": [[self.cursor.rowcount]]}
+                self.last_insert_id = self.cursor.lastrowid
+                self._after_write(query)
             return self._serialize_result(result)
         except Exception as e:
             self.reset_cursor()  # Reset cursor on error to prevent lingering results
             raise e
 
+    def execute_prepared(self, query, params=()):
+        """Like execute_query, but through a server-side prepared statement cached on this connection.
+
+        Statements are keyed by SQL text in an LRU of PREPARED_CACHE_SIZE entries, so
+        repeated calls skip both the server-side parse and client-side substitution.
+        """
+        entry = self._prepared_entry(query)
+        cursor, sql, _ = entry
+        try:
+            # The connector only reuses the statement when handed the same string object it prepared
+            cursor.execute(sql, tuple(params))
+            if cursor.description:
+                result = {"columns": [col[0] for col in cursor.description], "rows": cursor.fetchall()}
+            else:
+                self.connection.commit()
+                result = {"columns": ["AffectedRows"], "rows": [[cursor.rowcount]]}
+                self.last_insert_id = cursor.lastrowid
+            return self._serialize_result(result)
+        except Exception:
+            # A failed statement may have left the cursor mid-result; prepare it afresh next time
+            self.prepared.pop(query, None)
+            self._close_prepared(entry)
+            raise
+
+    def _prepared_entry(self, query):
+        entry = self.prepared.get(query)
+        if entry is None:
+            self.prepared_stats["misses"] += 1
+            try:
+                tables = {t.split(".")[-1].lower() for t in classify(query).tables}
+            except ValueError:
+                tables = set()
+            entry = (self.connection.cursor(prepared=True), query, tables)
+            self.prepared[query] = entry
+            if len(self.prepared) > PREPARED_CACHE_SIZE:
+                _, evicted = self.prepared.popitem(last=False)
+                self._close_prepared(evicted)
+                self.prepared_stats["evictions"] += 1
+        else:
+            self.prepared_stats["hits"] += 1
+            self.prepared.move_to_end(query)
+        return entry
+
+    def invalidate_prepared(self, tables=None):
+        """Drop cached statements that reference any of `tables` (all of them when tables is None)."""
+        tables = None if tables is None else {t.split(".")[-1].lower() for t in tables}
+        for query, entry in list(self.prepared.items()):
+            if tables is None or entry[2] & tables:
+                del self.prepared[query]
+                self._close_prepared(entry)
+                self.prepared_stats["invalidations"] += 1
+
+    def prepared_cache_info(self):
+        return dict(self.prepared_stats, size=len(self.prepared), capacity=PREPARED_CACHE_SIZE)
+
+    def _after_write(self, query):
+        # Cached statements keep their result metadata from prepare time; after DDL on one of
+        # their tables (e.g. a dropped or renamed column) they must be prepared again
+        if _DDL_RE.match(query):
+            try:
+                tables = classify(query).tables
+            except ValueError:
+                tables = []
+            self.invalidate_prepared(tables or None)
+
+    def _close_prepared(self, entry):
+        try:
+            entry[0].close()  # sends COM_STMT_CLOSE for the server-side statement
+        except Exception:
+            pass
+
+    def stream_query(self, query, params=None, chunk_rows=5000):
+        """Run a query on the unbuffered cursor and return its rows lazily.
+
+        Returns {"columns", "types", "chunks"} where chunks yields lists of at most
+        `chunk_rows` rows fetched with fetchmany, so only one chunk is held in memory.
+        The connection is busy until the chunks are exhausted; close() it to abandon a stream.
+        """
+        from mysql.connector.constants import FieldFlag, FieldType
+        self.reset_cursor()
+        cursor = self.cursor
+        if params:
+            cursor.execute(query, params)
+        else:
+            cursor.execute(query)
+        if not cursor.description:
+            raise ValueError("Query did not return a result set")
+        columns = [col[0] for col in cursor.description]
+        types = []
+        for col in cursor.description:
+            type_name = FieldType.get_info(col[1])
+            if col[7] & FieldFlag.UNSIGNED:
+                type_name = f"UNSIGNED {type_name}"
+            types.append(type_name)
+
+        def chunks():
+            while True:
+                rows = cursor.fetchmany(chunk_rows)
+                if not rows:
+                    break
+                yield rows
+        return {"columns": columns, "types": types, "chunks": chunks()}
+
+    def run_in_transaction(self, statements):
+        """Execute [(sql, params_list)] in one transaction, each with executemany; rolls back on error.
+
+        MySQL commits implicitly before and after DDL, so only statements between DDL are atomic.
+        """
+        self.reset_cursor()
+        self.connection.start_transaction()
+        try:
+            for sql, params_list in statements:
+                if len(params_list) > 1 and not sql.lstrip().upper().startswith("INSERT"):
+                    # Row-by-row UPDATE/DELETE templates: one server-side prepare, then binary executes
+                    cursor, prepared_sql, _ = self._prepared_entry(sql)
+                    cursor.executemany(prepared_sql, params_list)
+                elif params_list:
+                    # The driver rewrites INSERT executemany into one multi-row INSERT
+                    self.cursor.executemany(sql, params_list)
+                else:
+                    self.cursor.execute(sql)
+                self._after_write(sql)
+            self.connection.commit()
+        except Exception:
+            self.connection.rollback()
+            self.reset_cursor()
+            self.invalidate_prepared()
+            raise
+
+    def dry_run(self, query, table, where_clause="", limit=100):
+        """Run a DML statement inside a transaction that is always rolled back.
+
+        Reads up to `limit` rows of `table` matching `where_clause` (the pre-image), executes
+        `query`, re-reads those rows by their first column and rolls back, all on this
+        connection. Returns {"affected_rows", "before", "after"}; before/after are {"columns", "rows"}.
+        """
+        if _DDL_RE.match(query):
+            raise ValueError("DDL commits implicitly and cannot be previewed")
+        self.reset_cursor()
+        self.connection.start_transaction()
+        try:
+            self.cursor.execute(f"SELECT * FROM {table} {where_clause} LIMIT {int(limit)}")
+            columns = [col[0] for col in self.cursor.description]
+            before = self.cursor.fetchall()
+            self.cursor.execute(query)
+            affected_rows = self.cursor.rowcount
+            after = []
+            keys = [row[0] for row in before]
+            if keys:
+                self.cursor.execute(f"SELECT * FROM {table} WHERE {columns[0]} IN ({', '.join(['%s'] * len(keys))})", keys)
+                after = self.cursor.fetchall()
+        finally:
+            self.connection.rollback()
+            self.reset_cursor()
+        return self._serialize_result({
+            "affected_rows": affected_rows,
+            "before": {"columns": columns, "rows": before},
+            "after": {"columns": columns, "rows": after}
+        })
+
+    def bind(self, query, params):
+        """`query` with %s placeholders filled in exactly as cursor.execute(query, params) would:
+        the driver's own conversion and escaping, under this session's sql_mode."""
+        converter = self.connection.converter
+        values = []
+        for value in params:
+            converted = converter.escape(converter.to_mysql(value), self.connection.sql_mode)
+            if not isinstance(value, Decimal):
+                converted = converter.quote(converted)
+            values.append(converted.decode("utf-8") if isinstance(converted, (bytes, bytearray)) else str(converted))
+        return query % tuple(values)
+
+    def get_table_engines(self, schema_name, tables):
+        placeholders = ", ".join(["%s"] * len(tables))
+        self.cursor.execute(f"""
+            SELECT TABLE_NAME, ENGINE FROM INFORMATION_SCHEMA.TABLES
+            WHERE TABLE_SCHEMA = %s AND TABLE_NAME IN ({placeholders})
+        """, [schema_name] + list(tables))
+        return {name.lower(): engine for name, engine in self.cursor.fetchall()}
+
     def get_schemas(self):
         self.cursor.execute("SHOW DATABASES")
         return [row[0] for row in self.cursor.fetchall()]
@@ -70,6 +264,10 @@ class DBConnection:
         self.cursor.execute(f"SHOW TABLES FROM {schema_name}")
         return [row[0] for row in self.cursor.fetchall()]
 
+    def get_create_table(self, schema_name, table_name):
+        self.cursor.execute(f"SHOW CREATE TABLE `{schema_name}`.`{table_name}`")
+        return self.cursor.fetchall()[0][1]
+
     def get_columns(self, schema_name, table_name):
         self.cursor.execute(f"SELECT COLUMN_NAME FROM INFORMATION_SCHEMA.COLUMNS WHERE TABLE_SCHEMA = %s AND TABLE_NAME = %s", (schema_name, table_name))
         return [row[0] for row in self.cursor.fetchall()]
@@ -116,6 +314,63 @@ class DBConnection:
         except Exception as e:
             raise Exception(f"Error fetching column keys: {e}")
 
+    def get_indexes(self, schema_name, table_name):
+        """Map of index name -> column names in index order."""
+        self.cursor.execute("""
+            SELECT INDEX_NAME, COLUMN_NAME
+            FROM INFORMATION_SCHEMA.STATISTICS
+            WHERE TABLE_SCHEMA = %s AND TABLE_NAME = %s
+            ORDER BY INDEX_NAME, SEQ_IN_INDEX
+        """, (schema_name, table_name))
+        indexes = {}
+        for index_name, column_name in self.cursor.fetchall():
+            indexes.setdefault(index_name, []).append(column_name)
+        return indexes
+
+    def get_table_rows(self, schema_name, table_name):
+        """Row estimate from INFORMATION_SCHEMA (InnoDB statistics, not an exact count)."""
+        self.cursor.execute("""
+            SELECT TABLE_ROWS FROM INFORMATION_SCHEMA.TABLES
+            WHERE TABLE_SCHEMA = %s AND TABLE_NAME = %s
+        """, (schema_name, table_name))
+        rows = self.cursor.fetchall()
+        return int(rows[0][0] or 0) if rows else 0
+
+    def get_table_fingerprint(self, schema_name, tables):
+        """Hash of the column names/types of `tables`; changes whenever one of them is altered, dropped or recreated."""
+        tables = sorted({table.lower() for table in tables})
+        if not tables:
+            return None
+        placeholders = ", ".join(["%s"] * len(tables))
+        self.cursor.execute(f"""
+            SELECT TABLE_NAME, COLUMN_NAME, COLUMN_TYPE
+            FROM INFORMATION_SCHEMA.COLUMNS
+            WHERE TABLE_SCHEMA = %s AND LOWER(TABLE_NAME) IN ({placeholders})
+            ORDER BY TABLE_NAME, ORDINAL_POSITION
+        """, [schema_name] + tables)
+        rows = self.cursor.fetchall()
+        if len({row[0].lower() for row in rows}) != len(tables):
+            return None  # a referenced table no longer exists
+        digest = hashlib.sha1(repr([tuple(str(v).lower() for v in row) for row in rows]).encode("utf-8"))
+        return digest.hexdigest()
+
+    def get_schema_version(self, schema_name):
+        """Cheap marker that changes when a table of the schema is created, dropped, renamed or rebuilt."""
+        self.cursor.execute("""
+            SELECT COUNT(*), MAX(CREATE_TIME), SUM(CRC32(TABLE_NAME))
+            FROM INFORMATION_SCHEMA.TABLES
+            WHERE TABLE_SCHEMA = %s
+        """, (schema_name,))
+        return repr(tuple(str(v) for v in self.cursor.fetchone()))
+
     def close(self):
-        self.cursor.close()
-        self.connection.close()
\ No newline at end of file
+        for entry in self.prepared.values():
+            self._close_prepared(entry)
+        self.prepared.clear()
+        try:
+            self.cursor.close()
+        except Exception:
+            pass  # an abandoned stream_query leaves unread rows; closing the connection discards them
+        self.connection.close()
+        if self.on_close:
+            self.on_close()
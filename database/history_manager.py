@@ -1,16 +1,58 @@
 from database.db_connection import DBConnection
-import streamlit as st
 import json
-import re
+from utils.sql_classifier import classify, classify_all
+from utils.ddl_inverse import parse_create_table, qualified_create, qualify, quote, step, restore_rows_step, alter_inverse, primary_key_columns
+from utils.similarity_index import SimilarityIndex
+from utils.sql_template import TemplateCache
+from utils.logger import Logger
 from datetime import date, datetime
+import threading
+
+# (host, port, database) of history tables already created/migrated by this process
+_MIGRATED = set()
+_MIGRATION_LOCK = threading.Lock()
+# (host, port, database) -> SimilarityIndex over that database's query_history, shared by every session
+_TRANSLATION_INDEXES = {}
+_INDEX_LOCK = threading.Lock()
+# Rows kept to restore data destroyed by TRUNCATE or DROP COLUMN; the inverse is marked incomplete beyond it
+INVERSE_ROW_LIMIT = 10000
+# Pre-image rows kept for UPDATE/DELETE
+STATE_CAPTURE_LIMIT = 100
+
+def shared_translation_index(db_params):
+    """The process-wide index of past translations for this database, filled from query_history on first use."""
+    key = (db_params.get("host"), db_params.get("port"), db_params.get("database"))
+    with _INDEX_LOCK:
+        index = _TRANSLATION_INDEXES.get(key)
+        if index is None:
+            index = SimilarityIndex(loader=lambda: _history_translations(dict(db_params)))
+            _TRANSLATION_INDEXES[key] = index
+    return index
+
+
+def _history_translations(db_params, limit=5000):
+    # Rows loaded from earlier sessions have no schema fingerprint, so they are only used as few-shot examples
+    db = None
+    try:
+        db = DBConnection(**db_params)
+        query = "SELECT version_id, user_query, sql_query, schema_name FROM query_history ORDER BY version_id DESC LIMIT %s"
+        result = db.execute_query(query, (limit,))
+        return [(user_query, sql_query, schema_name, version_id) for version_id, user_query, sql_query, schema_name in reversed(result["rows"] if result else [])]
+    except Exception as e:
+        Logger().error(f"Could not load past translations: {str(e)}")
+        return []
+    finally:
+        if db is not None:
+            db.close()
+
 
 class HistoryManager:
-    def __init__(self):
-        self.db = DBConnection(**st.session_state.db_params)
+    def __init__(self, db_params):
+        self.db = DBConnection(**db_params)
         self.schema_updated = False
-        self.create_history_table()
-        self.create_state_history_table()
-        self.update_state_history_schema()
+        self.ensure_tables(db_params)
+        self.translation_index = shared_translation_index(db_params)
+        self.template_cache = TemplateCache(db_params)  # shared store; parsers bind new literals into it
 
     def _serialize_state_data(self, data):
         """Recursively convert non-JSON-serializable objects to strings."""
@@ -22,6 +64,18 @@ class HistoryManager:
             return {key: self._serialize_state_data(value) for key, value in data.items()}
         return data
 
+    def ensure_tables(self, db_params):
+        # Every Streamlit session builds a HistoryManager; only the first one per database runs the DDL checks
+        key = (db_params.get("host"), db_params.get("port"), db_params.get("database"))
+        with _MIGRATION_LOCK:
+            if key in _MIGRATED:
+                self.schema_updated = True
+                return
+            self.create_history_table()
+            self.create_state_history_table()
+            self.update_state_history_schema()
+            _MIGRATED.add(key)
+
     def create_history_table(self):
         query = """
         CREATE TABLE IF NOT EXISTS query_history (
@@ -66,15 +120,33 @@ class HistoryManager:
             self.db.execute_query(alter_query)
         self.schema_updated = True
 
+    def index_translation(self, version_id, user_query, sql_query, schema_name):
+        tables = []
+        fingerprint = None
+        statements = classify_all(sql_query)
+        if statements and all(s.is_read_only for s in statements):
+            # Only read-only translations may later be reused verbatim; remember the schema they were checked against
+            for statement in statements:
+                tables.extend(t for t in statement.tables if t not in tables)
+            local_tables = [t.split(".")[-1] for t in tables if "." not in t or t.split(".")[0].lower() == (schema_name or "").lower()]
+            if tables and len(local_tables) == len(tables):
+                try:
+                    fingerprint = self.db.get_table_fingerprint(schema_name, local_tables)
+                except Exception:
+                    self.db.reset_cursor()
+        self.translation_index.add(user_query, sql_query, schema_name, version_id, tables, fingerprint)
+        self.template_cache.learn(user_query, sql_query, schema_name, tables, fingerprint)
+
     def save_query(self, user_query, sql_query, schema_name, operation_type=None, table_name=None, state_data=None):
         query = "INSERT INTO query_history (user_query, sql_query, schema_name) VALUES (%s, %s, %s)"
-        self.db.execute_query(query, (user_query, sql_query, schema_name))
-        version_id = self.db.cursor.lastrowid
+        self.db.execute_prepared(query, (user_query, sql_query, schema_name))
+        version_id = self.db.last_insert_id
+        self.index_translation(version_id, user_query, sql_query, schema_name)
 
         if operation_type and table_name and state_data is not None:
             query = "INSERT INTO query_state_history (version_id, operation_type, table_name, state_data) VALUES (%s, %s, %s, %s)"
             serialized_data = self._serialize_state_data(state_data)
-            self.db.execute_query(query, (version_id, operation_type, table_name, json.dumps(serialized_data)))
+            self.db.execute_prepared(query, (version_id, operation_type, table_name, json.dumps(serialized_data)))
 
         return version_id
     
@@ -98,37 +170,181 @@ class HistoryManager:
         return []
     def get_query_by_version(self, version_id):
         query = "SELECT sql_query FROM query_history WHERE version_id = %s"
-        result = self.db.execute_query(query, (version_id,))
+        result = self.db.execute_prepared(query, (version_id,))
         return result["rows"][0][0] if result and result["rows"] else None
 
     def get_state_data(self, version_id):
         query = "SELECT operation_type, table_name, state_data FROM query_state_history WHERE version_id = %s"
-        result = self.db.execute_query(query, (version_id,))
+        result = self.db.execute_prepared(query, (version_id,))
         if result and result["rows"]:
             operation_type, table_name, state_data_json = result["rows"][0]
             state_data = json.loads(state_data_json)
             return operation_type, table_name, self._serialize_state_data(state_data)  # Serialize again
         return None, None, None
 
+    def get_versions_since(self, version_id):
+        """Version `version_id` and every later version in the same schema, oldest first, with their captured state."""
+        query = """
+        SELECT h.version_id, h.sql_query, h.schema_name, s.operation_type, s.table_name, s.state_data
+        FROM query_history h
+        LEFT JOIN query_state_history s ON s.version_id = h.version_id
+        WHERE h.version_id >= %s
+        AND h.schema_name = (SELECT schema_name FROM query_history WHERE version_id = %s)
+        ORDER BY h.version_id
+        """
+        result = self.db.execute_prepared(query, (version_id, version_id))
+        versions = []
+        for vid, sql_query, schema_name, operation_type, table_name, state_json in (result["rows"] if result else []):
+            versions.append({
+                "version_id": vid,
+                "sql_query": sql_query,
+                "schema_name": schema_name,
+                "operation_type": operation_type,
+                "table_name": table_name,
+                "state_data": json.loads(state_json) if state_json else None
+            })
+        return versions
+
     def clear_history(self):
         query = "DELETE FROM query_history"
         self.db.execute_query(query)
         self.db.execute_query("ALTER TABLE query_history AUTO_INCREMENT = 1")
+        self.translation_index.clear()
+
+    def _inserted_keys(self, statement, schema_name):
+        # Key values (first table column) of a literal INSERT ... VALUES, so a revert deletes only those rows
+        rows = statement.details.get("rows")
+        if not rows:
+            return {}
+        target = statement.target_table
+        table_schema = target.split(".")[0] if "." in target else schema_name
+        try:
+            columns = self.db.get_columns(table_schema, target.split(".")[-1])
+        except Exception:
+            self.db.reset_cursor()
+            return {}
+        if not columns:
+            return {}
+        listed = [c.lower() for c in statement.details.get("columns", [])]
+        if listed:
+            if columns[0].lower() not in listed:
+                return {}  # e.g. AUTO_INCREMENT key filled in by the server
+            position = listed.index(columns[0].lower())
+        else:
+            position = 0
+        if any(len(row) <= position for row in rows):
+            return {}
+        return {"key_column": columns[0], "keys": [row[position] for row in rows]}
+
+    def _layout(self, table):
+        table_schema, name = table.split(".", 1)
+        return parse_create_table(self.db.get_create_table(table_schema, name))
+
+    def _rows(self, query):
+        result = self.db.execute_query(f"{query} LIMIT {INVERSE_ROW_LIMIT + 1}")
+        rows = result["rows"] if result else []
+        return rows[:INVERSE_ROW_LIMIT], len(rows) <= INVERSE_ROW_LIMIT
+
+    def _ddl_state(self, statement, schema_name, strict=False):
+        """Undo plan for a schema change, computed from SHOW CREATE TABLE before it runs.
+
+        Returns {"inverse": [steps], "columns_before": [...], "complete": bool}; "complete" is
+        False when more rows were destroyed than INVERSE_ROW_LIMIT. Changes without a known
+        inverse get {"inverse": None, "reason": ...} and are left to the LLM fallback on revert,
+        unless `strict`, in which case the error propagates.
+        """
+        kind = statement.statement_type
+        table = qualify(statement.target_table, schema_name)
+        table_schema, name = table.split(".", 1)
+        complete = True
+        try:
+            columns_before = self.db.get_columns(table_schema, name)
+            if kind == "CREATE_TABLE":
+                existing = [t.lower() for t in self.db.get_tables(table_schema)]
+                # CREATE TABLE IF NOT EXISTS on an existing table changes nothing
+                inverse = [] if name.lower() in existing else [step(f"DROP TABLE IF EXISTS {quote(table)}")]
+            elif kind == "CREATE_INDEX":
+                if not statement.details.get("index"):
+                    raise ValueError("index name not found")
+                inverse = [step(f"DROP INDEX {quote(statement.details['index'])} ON {quote(table)}")]
+            elif kind == "DROP_INDEX":
+                line = self._index_line(table, statement.details.get("index"))
+                inverse = [step(f"ALTER TABLE {quote(table)} ADD {line}")]
+            elif kind == "DROP_TABLE":
+                inverse = []
+                for dropped in statement.tables:
+                    dropped = qualify(dropped, schema_name)
+                    dropped_schema, dropped_name = dropped.split(".", 1)
+                    inverse.append(step(qualified_create(self.db.get_create_table(dropped_schema, dropped_name), dropped)))
+                    rows, rows_complete = self._rows(f"SELECT * FROM {quote(dropped)}")
+                    complete = complete and rows_complete
+                    if rows:
+                        inverse.append(restore_rows_step(dropped, self.db.get_columns(dropped_schema, dropped_name), rows))
+            elif kind == "TRUNCATE":
+                rows, complete = self._rows(f"SELECT * FROM {quote(table)}")
+                inverse = [restore_rows_step(table, columns_before, rows)] if rows else []
+            elif kind == "RENAME_TABLE":
+                renames = [(qualify(old, schema_name), qualify(new, schema_name)) for old, new in statement.details.get("renames", [])]
+                if not renames:
+                    raise ValueError("no renames found")
+                inverse = [step("RENAME TABLE " + ", ".join(f"{quote(new)} TO {quote(old)}" for old, new in reversed(renames)))]
+            elif kind == "ALTER":
+                actions = statement.details.get("actions", [])
+                layout = self._layout(table)
+                dropped_values = {}
+                # Dropped values are matched back to rows by primary key; any other column may repeat
+                key_columns = primary_key_columns(layout)
+                for action in actions:
+                    if action["action"] != "DROP_COLUMN":
+                        continue
+                    if key_columns and action["column"].lower() not in {k.lower() for k in key_columns}:
+                        keys = ", ".join(quote(k) for k in key_columns)
+                        rows, column_complete = self._rows(f"SELECT {keys}, {quote(action['column'])} FROM {quote(table)}")
+                        dropped_values[action["column"]] = rows
+                        complete = complete and column_complete
+                    else:
+                        complete = False
+                        reason = "it is part of the primary key" if key_columns else f"{table} has no primary key"
+                        Logger().warning(f"Values of dropped column {action['column']} are not kept for revert: {reason}")
+                inverse = alter_inverse(table, actions, layout, dropped_values)
+            else:
+                raise ValueError(f"no inverse for {kind}")
+        except Exception as e:
+            self.db.reset_cursor()
+            if strict:
+                raise
+            return {"inverse": None, "reason": str(e)}
+        return {"inverse": inverse, "columns_before": columns_before, "complete": complete}
+
+    def _index_line(self, table, index_name):
+        if not index_name:
+            raise ValueError("index name not found")
+        for name, line in self._layout(table)["indexes"].items():
+            if name.lower() == index_name.lower():
+                return line
+        raise ValueError(f"index {index_name} not found on {table}")
+
+    def _resolve_alias(self, statement, name):
+        # DELETE o FROM orders o JOIN ...: the target is written as its alias
+        for ref in statement.details.get("table_refs", []):
+            if ref["alias"] and ref["alias"].lower() == name.lower():
+                return ref["table"]
+        return name
 
     def capture_state(self, sql_query, schema_name):
-        sql_query_lower = sql_query.lower().strip()
+        statement = classify(sql_query)
         db = self.db
         operation_type = None
         table_name = None
         state_data = None
 
-        if sql_query_lower.startswith("update"):
+        if statement.statement_type == "UPDATE":
             operation_type = "UPDATE"
-            match = re.match(r"update\s+(\w+\.\w+|\w+)\s+set\s+.*?\s*(where\s+.*)?$", sql_query_lower, re.IGNORECASE)
-            if match:
-                table_name = match.group(1)
-                where_clause = match.group(2) if match.group(2) else ""
-                select_query = f"SELECT * FROM {table_name} {where_clause} LIMIT 100"
+            target = statement.details.get("single_target")
+            if target:
+                table_name = target["table"]
+                # Same table expression and WHERE as the statement, so aliases in the WHERE still resolve
+                select_query = f"SELECT {target['qualifier']}.* FROM {target['expression']} {statement.where_clause or ''} LIMIT {STATE_CAPTURE_LIMIT}"
                 try:
                     result = db.execute_query(select_query)
                     state_data = result["rows"] if result else []
@@ -138,22 +354,25 @@ class HistoryManager:
                     return None, None, None, f"Failed to capture state for UPDATE: {str(e)}"
                 finally:
                     db.reset_cursor()  # Ensure cursor is clean
+            elif statement.target_table:
+                table_name = self._resolve_alias(statement, statement.target_table)
+                Logger().warning(f"No pre-image captured for multi-table UPDATE on {table_name}; its revert will be generated by the LLM")
                     
-        elif sql_query_lower.startswith("insert"):
+        elif statement.statement_type == "INSERT":
             operation_type = "INSERT"
-            match = re.match(r"insert\s+into\s+(\w+\.\w+|\w+)\s+", sql_query_lower, re.IGNORECASE)
-            if match:
-                table_name = match.group(1)
+            if statement.target_table:
+                table_name = statement.target_table
                 state_data = {"inserted": True}
+                state_data.update(self._inserted_keys(statement, schema_name))
                 state_data = self._serialize_state_data(state_data)  # Serialize state_data
             
-        elif sql_query_lower.startswith("delete"):
+        elif statement.statement_type == "DELETE":
             operation_type = "DELETE"
-            match = re.match(r"delete\s+from\s+(\w+\.\w+|\w+)\s*(where\s+.*)?$", sql_query_lower, re.IGNORECASE)
-            if match:
-                table_name = match.group(1)
-                where_clause = match.group(2) if match.group(2) else ""
-                select_query = f"SELECT * FROM {table_name} {where_clause} LIMIT 100"
+            target = statement.details.get("single_target")
+            if target:
+                table_name = target["table"]
+                # Same table expression and WHERE as the statement, so aliases in the WHERE still resolve
+                select_query = f"SELECT {target['qualifier']}.* FROM {target['expression']} {statement.where_clause or ''} LIMIT {STATE_CAPTURE_LIMIT}"
                 try:
                     result = db.execute_query(select_query)
                     state_data = result["rows"] if result else []
@@ -163,25 +382,22 @@ class HistoryManager:
                     return None, None, None, f"Failed to capture state for DELETE: {str(e)}"
                 finally:
                     db.reset_cursor()  # Ensure cursor is clean
+            elif statement.target_table:
+                table_name = self._resolve_alias(statement, statement.target_table)
+                Logger().warning(f"No pre-image captured for multi-table DELETE on {table_name}; its revert will be generated by the LLM")
             
-        elif sql_query_lower.startswith("drop table"):
+        elif statement.statement_type == "DROP_TABLE":
             operation_type = "DROP_TABLE"
-            match = re.match(r"drop\s+table\s+(\w+\.\w+|\w+)", sql_query_lower, re.IGNORECASE)
-            if match:
-                table_name = match.group(1)
+            if statement.target_table:
+                table_name = statement.target_table
                 try:
                     columns = db.get_columns(schema_name, table_name.split(".")[-1])
-                    select_query = f"SELECT * FROM {table_name}"
-                    result = db.execute_query(select_query)
-                    # Fetch column types using execute_query
                     col_query = f"SHOW COLUMNS FROM {table_name}"
                     col_result = db.execute_query(col_query)
                     column_types = [row[1] for row in col_result["rows"]]
-                    state_data = {
-                        "columns": columns,
-                        "data": result["rows"] if result else [],
-                        "column_types": column_types
-                    }
+                    # Rows live in the inverse's INSERT step rather than in a separate "data" copy
+                    state_data = {"columns": columns, "column_types": column_types}
+                    state_data.update(self._ddl_state(statement, schema_name, strict=True))
                     state_data = self._serialize_state_data(state_data)  # Serialize state_data
                 except Exception as e:
                     db.reset_cursor()  # Reset cursor on error
@@ -189,25 +405,33 @@ class HistoryManager:
                 finally:
                     db.reset_cursor()  # Ensure cursor is clean
             
-        elif sql_query_lower.startswith("alter table"):
+        elif statement.statement_type == "ALTER":
             operation_type = "ALTER"
-            match = re.match(r"alter\s+table\s+(\w+\.\w+|\w+)\s+rename\s+column\s+(\w+)\s+to\s+(\w+)", sql_query_lower, re.IGNORECASE)
-            if match:
-                table_name = match.group(1)
-                old_col = match.group(2)
-                new_col = match.group(3)
+            actions = statement.details.get("actions", [])
+            if not statement.target_table:
+                return operation_type, None, None, None  # Allow ALTER to proceed
+            table_name = statement.target_table
+            state_data = {}
+            if len(actions) == 1 and actions[0]["action"] == "RENAME_COLUMN":
+                old_col = actions[0]["old_column"]
+                new_col = actions[0]["new_column"]
                 try:
                     columns = db.get_columns(schema_name, table_name.split(".")[-1])
                     if not columns:
                         return None, None, None, f"Failed to capture state for ALTER: No columns found in {table_name}"
                     state_data = {"old_column": old_col, "new_column": new_col, "columns": columns}
-                    state_data = self._serialize_state_data(state_data)  # Serialize state_data
                 except Exception as e:
                     db.reset_cursor()  # Reset cursor on error
                     return None, None, None, f"Failed to capture state for ALTER: {str(e)}"
                 finally:
                     db.reset_cursor()  # Ensure cursor is clean
-            else:
-                return operation_type, None, None, None  # Allow ALTER to proceed
+            state_data.update(self._ddl_state(statement, schema_name))
+            state_data = self._serialize_state_data(state_data)
+
+        elif statement.statement_type in ("CREATE_TABLE", "CREATE_INDEX", "DROP_INDEX", "TRUNCATE", "RENAME_TABLE"):
+            operation_type = statement.statement_type
+            table_name = statement.target_table
+            if table_name:
+                state_data = self._serialize_state_data(self._ddl_state(statement, schema_name))
 
-        return operation_type, table_name, state_data, None
\ No newline at end of file
+        return operation_type, table_name, state_data, None
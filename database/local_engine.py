@@ -0,0 +1,185 @@
+import csv
+import importlib.util
+import os
+import re
+import sqlite3
+import tempfile
+import weakref
+from datetime import date, datetime, time
+from decimal import Decimal
+
+from utils.csv_partitioner import read_sample
+from utils.csv_upload import UPLOAD_DIR, column_name
+
+# Schema name under which uploaded CSVs are queried; picked in the sidebar like a MySQL schema
+LOCAL_SCHEMA = "local_csv"
+_NUMBER_RE = re.compile(r"^\s*[-+]?(\d+\.?\d*|\.\d+)([eE][-+]?\d+)?\s*$")
+
+
+def duckdb_available():
+    return importlib.util.find_spec("duckdb") is not None
+
+
+class LocalEngine:
+    """In-process SQL over uploaded CSV files, without loading them into MySQL.
+
+    DuckDB (when installed) queries each file in place through a view. Otherwise the
+    rows are imported once into a temp-file SQLite database attached as LOCAL_SCHEMA and
+    read through mmap. Exposes the subset of DBConnection the parser and executor use,
+    and results come back in the same {"columns", "rows"} shape.
+    """
+    def __init__(self, max_rows=1000, mmap_bytes=1 << 30, prefer_duckdb=True):
+        self.max_rows = max_rows
+        self.tables = {}  # name -> {"path", "file_id", "columns"}
+        self.sqlite_path = None
+        if prefer_duckdb and duckdb_available():
+            import duckdb  # optional dependency
+            self.dialect = "DuckDB"
+            self.connection = duckdb.connect(":memory:")
+            self.connection.execute(f"CREATE SCHEMA {LOCAL_SCHEMA}")
+            self.connection.execute(f"SET schema = '{LOCAL_SCHEMA}'")
+            # Queries are LLM-written: file functions (read_csv_auto, read_text, ...) may reach
+            # the spooled uploads and nothing else, and a query cannot undo that
+            upload_dir = os.path.join(UPLOAD_DIR, "").replace("'", "''")
+            self.connection.execute(f"SET allowed_directories = ['{upload_dir}']")
+            self.connection.execute("SET enable_external_access = false")
+            self.connection.execute("SET lock_configuration = true")
+        else:
+            self.dialect = "SQLite"
+            handle, self.sqlite_path = tempfile.mkstemp(prefix="almostsql_local_", suffix=".db")
+            os.close(handle)
+            self.connection = sqlite3.connect(":memory:", check_same_thread=False)
+            self.connection.execute(f"ATTACH DATABASE ? AS {LOCAL_SCHEMA}", (self.sqlite_path,))
+            self.connection.execute(f"PRAGMA {LOCAL_SCHEMA}.mmap_size = {int(mmap_bytes)}")
+            self.connection.execute(f"PRAGMA {LOCAL_SCHEMA}.journal_mode = OFF")
+            self.connection.execute(f"PRAGMA {LOCAL_SCHEMA}.synchronous = OFF")
+        # Streamlit has no session-end hook: the temp database also goes when the engine is
+        # garbage-collected with its session, or at interpreter exit
+        self._finalizer = weakref.finalize(self, _release, self.connection, self.sqlite_path)
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(config.get("local_max_rows", 1000), config.get("local_mmap_bytes", 1 << 30), config.get("local_prefer_duckdb", True))
+
+    def register(self, path, name, file_id=None):
+        """Make the CSV at `path` queryable as LOCAL_SCHEMA.`name`; re-registering the same file is a no-op."""
+        entry = self.tables.get(name)
+        if entry and entry["path"] == path and entry["file_id"] == file_id:
+            return name
+        header, sample = read_sample(path, rows=100)
+        columns = [column_name(h) for h in header]
+        if self.dialect == "DuckDB":
+            escaped = path.replace("'", "''")
+            # Same column names the MySQL loader would create: "Unit Price" -> unit_price
+            select_list = ", ".join(f"{_ident(h)} AS {_ident(col)}" for h, col in zip(header, columns))
+            self.connection.execute(f"CREATE OR REPLACE VIEW {LOCAL_SCHEMA}.{_ident(name)} AS SELECT {select_list} FROM read_csv_auto('{escaped}', header = true)")
+        else:
+            self._import_sqlite(path, name, columns, sample)
+        self.tables[name] = {"path": path, "file_id": file_id, "columns": columns}
+        return name
+
+    def _import_sqlite(self, path, name, columns, sample):
+        # NUMERIC affinity for columns whose sampled values are all numbers, so comparisons are numeric
+        types = []
+        for i in range(len(columns)):
+            values = [row[i] for row in sample if i < len(row) and row[i] != ""]
+            types.append("NUMERIC" if values and all(_NUMBER_RE.match(v) for v in values) else "TEXT")
+        self.connection.execute(f'DROP TABLE IF EXISTS {LOCAL_SCHEMA}.{_ident(name)}')
+        self.connection.execute(f'CREATE TABLE {LOCAL_SCHEMA}.{_ident(name)} ({", ".join(f"{_ident(c)} {t}" for c, t in zip(columns, types))})')
+        insert = f'INSERT INTO {LOCAL_SCHEMA}.{_ident(name)} VALUES ({", ".join(["?"] * len(columns))})'
+        with open(path, "r", encoding="utf-8", newline="") as f:
+            reader = csv.reader(f)
+            next(reader, None)
+            batch = []
+            for row in reader:
+                if not row:
+                    continue
+                batch.append([value if value != "" else None for value in (row + [""] * len(columns))[:len(columns)]])
+                if len(batch) >= 5000:
+                    self.connection.executemany(insert, batch)
+                    batch = []
+            if batch:
+                self.connection.executemany(insert, batch)
+        self.connection.commit()
+
+    def unregister(self, name):
+        if self.tables.pop(name, None) is not None:
+            kind = "VIEW" if self.dialect == "DuckDB" else "TABLE"
+            self.connection.execute(f'DROP {kind} IF EXISTS {LOCAL_SCHEMA}.{_ident(name)}')
+
+    # DBConnection-compatible reads used by QueryParserAgent.build_prompt
+    def get_schemas(self):
+        return [LOCAL_SCHEMA]
+
+    def get_tables(self, schema_name):
+        return list(self.tables) if schema_name == LOCAL_SCHEMA else []
+
+    def get_columns(self, schema_name, table_name):
+        entry = self.tables.get(table_name)
+        return list(entry["columns"]) if entry and schema_name == LOCAL_SCHEMA else []
+
+    def get_column_keys(self, schema_name, table_name):
+        return {}  # CSV files have no keys
+
+    def get_table_fingerprint(self, schema_name, tables):
+        return None  # translations against local files are never reused
+
+    def get_schema_version(self, schema_name):
+        return repr(sorted((name, entry["file_id"]) for name, entry in self.tables.items()))
+
+    def execute_query(self, query, params=None):
+        """Run a query and return at most `max_rows` rows as {"columns", "rows"}."""
+        cursor = self.connection.cursor()
+        try:
+            cursor.execute(query, params or [])
+            if not cursor.description:
+                return {"columns": ["AffectedRows"], "rows": [[cursor.rowcount]]}
+            columns = [col[0] for col in cursor.description]
+            rows = cursor.fetchmany(self.max_rows)
+            return {"columns": columns, "rows": [[_plain(value) for value in row] for row in rows]}
+        finally:
+            cursor.close()
+
+    def reset_cursor(self):
+        pass
+
+    def close(self):
+        pass  # handles are shared for the session; shutdown() releases the engine
+
+    def shutdown(self):
+        """Close the engine and delete its temp database; safe to call more than once."""
+        self._finalizer()
+
+
+def _release(connection, sqlite_path):
+    connection.close()
+    if sqlite_path and os.path.exists(sqlite_path):
+        os.remove(sqlite_path)
+
+
+def _ident(name):
+    return '"' + name.replace('"', '""') + '"'
+
+
+def _plain(value):
+    # Same JSON-friendly values DBConnection._serialize_result produces
+    if isinstance(value, (date, datetime, time)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    return value
+
+
+class LocalRouter:
+    """ConnectionRouter stand-in that hands every caller the session's LocalEngine."""
+    def __init__(self, engine):
+        self.engine = engine
+
+    def connect(self, read_only=False):
+        return self.engine
+
+    def connect_for(self, sql_query):
+        return self.engine
+
+    def record_write(self):
+        pass
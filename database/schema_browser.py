@@ -0,0 +1,76 @@
+import threading
+import time
+
+# (host, port, schema) -> {"version", "tables"}; (host, port, schema, table) -> {"version", "fetched_at", "columns", "keys"}
+_LISTINGS = {}
+_DETAILS = {}
+_LOCK = threading.Lock()
+
+
+class SchemaBrowser:
+    """Table names and per-table details for the sidebar, read only as far as the user looks.
+
+    list_tables() returns one filtered page of names; describe() reads the columns and keys
+    of a single table when it is expanded. Both are cached process-wide until the schema
+    version (DBConnection.get_schema_version) changes, the controller invalidates them after
+    DDL, or a detail entry is older than `ttl_seconds` (an in-place ALTER done elsewhere
+    does not change the version).
+    """
+    def __init__(self, db_params, page_size=50, ttl_seconds=600):
+        self.key_prefix = (db_params.get("host"), db_params.get("port", 3306))
+        self.page_size = page_size
+        self.ttl_seconds = ttl_seconds
+
+    @classmethod
+    def from_config(cls, db_params, config):
+        return cls(db_params, config.get("schema_browser_page_size", 50), config.get("schema_browser_ttl_seconds", 600))
+
+    def list_tables(self, db, schema_name, search="", page=0, version=None):
+        """{"version", "tables" (this page), "total" (matching names), "pages"} for names containing `search`.
+
+        Pass the `version` of an earlier call in the same run to turn pages without re-reading it.
+        """
+        if version is None:
+            version = db.get_schema_version(schema_name)
+        key = self.key_prefix + (schema_name,)
+        with _LOCK:
+            listing = _LISTINGS.get(key)
+        if listing is None or listing["version"] != version:
+            listing = {"version": version, "tables": sorted(db.get_tables(schema_name))}
+            with _LOCK:
+                _LISTINGS[key] = listing
+        needle = search.strip().lower()
+        tables = [t for t in listing["tables"] if needle in t.lower()] if needle else listing["tables"]
+        pages = max(1, -(-len(tables) // self.page_size))
+        page = min(max(page, 0), pages - 1)
+        return {
+            "version": version,
+            "tables": tables[page * self.page_size:(page + 1) * self.page_size],
+            "total": len(tables),
+            "pages": pages
+        }
+
+    def describe(self, db, schema_name, table_name, version):
+        """{"columns", "keys"} of one table; `version` is the one list_tables returned in this run."""
+        key = self.key_prefix + (schema_name, table_name)
+        with _LOCK:
+            entry = _DETAILS.get(key)
+        if entry is None or entry["version"] != version or time.time() - entry["fetched_at"] > self.ttl_seconds:
+            entry = {
+                "version": version,
+                "fetched_at": time.time(),
+                "columns": db.get_columns(schema_name, table_name),
+                "keys": db.get_column_keys(schema_name, table_name)
+            }
+            with _LOCK:
+                _DETAILS[key] = entry
+        return entry
+
+    def invalidate(self, schema_name, tables=None):
+        """Forget the name list of the schema and the details of `tables` (all of its tables when None)."""
+        names = None if tables is None else {t.split(".")[-1].strip("`").lower() for t in tables}
+        with _LOCK:
+            _LISTINGS.pop(self.key_prefix + (schema_name,), None)
+            for key in list(_DETAILS):
+                if key[:3] == self.key_prefix + (schema_name,) and (names is None or key[3].lower() in names):
+                    del _DETAILS[key]
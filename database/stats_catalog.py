@@ -0,0 +1,178 @@
+import base64
+from collections import Counter
+import json
+import threading
+import time
+
+from utils.logger import Logger
+
+# (host, port, schema, table) -> {"signature", "built_at", "rows", "columns", "text"}, shared by every session
+_CATALOG = {}
+_LOCK = threading.Lock()
+_TEXT_TYPES = {"char", "varchar", "enum", "set"}
+_RANGE_TYPES = {"tinyint", "smallint", "mediumint", "int", "bigint", "decimal", "float", "double", "date", "datetime", "timestamp", "time", "year"}
+MAX_VALUE_CHARS = 24
+
+
+def _histogram_value(value):
+    # String values in INFORMATION_SCHEMA.COLUMN_STATISTICS look like "base64:type254:cGFpZA=="
+    if isinstance(value, str) and value.startswith("base64:"):
+        return base64.b64decode(value.split(":", 2)[2]).decode("utf-8", errors="replace")
+    return value
+
+
+def _short(value):
+    text = value.decode("utf-8", errors="replace") if isinstance(value, (bytes, bytearray)) else str(value)
+    return text if len(text) <= MAX_VALUE_CHARS else text[:MAX_VALUE_CHARS - 3] + "..."
+
+
+class StatsCatalog:
+    """Per-table column statistics for the translation prompt: type, null fraction, min/max, top values.
+
+    Statistics come from ANALYZE TABLE ... UPDATE HISTOGRAM results when the server has
+    them, otherwise from a bounded sample of `sample_rows` rows. Each table is rebuilt
+    only when its columns or UPDATE_TIME change, when it is invalidated after a write,
+    or when it is older than `max_age_seconds`.
+    """
+    def __init__(self, db_params, sample_rows=1000, top_k=5, max_tables=4, max_age_seconds=600, enabled=True):
+        self.key_prefix = (db_params.get("host"), db_params.get("port", 3306))
+        self.sample_rows = sample_rows
+        self.top_k = top_k
+        self.max_tables = max_tables
+        self.max_age_seconds = max_age_seconds
+        self.enabled = enabled
+        self.logger = Logger()
+
+    @classmethod
+    def from_config(cls, db_params, config):
+        return cls(
+            db_params,
+            config.get("stats_sample_rows", 1000),
+            config.get("stats_top_k", 5),
+            config.get("stats_max_tables", 4),
+            config.get("stats_max_age_seconds", 600),
+            config.get("stats_enabled", True)
+        )
+
+    def describe(self, db, schema_name, tables):
+        """Compact one-line summaries for up to `max_tables` of `tables`, refreshing stale entries through `db`."""
+        if not self.enabled or not tables:
+            return []
+        tables = list(tables)[:self.max_tables]
+        signatures = self._signatures(db, schema_name, tables)
+        lines = []
+        for table in tables:
+            if table not in signatures:
+                continue
+            key = self.key_prefix + (schema_name.lower(), table.lower())
+            with _LOCK:
+                entry = _CATALOG.get(key)
+            if entry is None or entry["signature"] != signatures[table] or time.time() - entry["built_at"] > self.max_age_seconds:
+                try:
+                    entry = self._build(db, schema_name, table, signatures[table])
+                except Exception as e:
+                    db.reset_cursor()
+                    self.logger.error(f"Could not collect statistics for {schema_name}.{table}: {str(e)}")
+                    continue
+                with _LOCK:
+                    _CATALOG[key] = entry
+            lines.append(entry["text"])
+        return lines
+
+    def invalidate(self, schema_name, tables=None):
+        """Forget statistics for `tables` (every table of the schema when None) so the next prompt rebuilds them."""
+        names = None if tables is None else {t.split(".")[-1].strip("`").lower() for t in tables}
+        with _LOCK:
+            for key in list(_CATALOG):
+                if key[:3] == self.key_prefix + (schema_name.lower(),) and (names is None or key[3] in names):
+                    del _CATALOG[key]
+
+    def _signatures(self, db, schema_name, tables):
+        # Column layout plus UPDATE_TIME: changes on DDL and (for most engines) on writes
+        placeholders = ", ".join(["%s"] * len(tables))
+        db.cursor.execute(f"""
+            SELECT c.TABLE_NAME, t.UPDATE_TIME, c.COLUMN_NAME, c.COLUMN_TYPE, c.DATA_TYPE
+            FROM INFORMATION_SCHEMA.COLUMNS c
+            JOIN INFORMATION_SCHEMA.TABLES t ON t.TABLE_SCHEMA = c.TABLE_SCHEMA AND t.TABLE_NAME = c.TABLE_NAME
+            WHERE c.TABLE_SCHEMA = %s AND c.TABLE_NAME IN ({placeholders})
+            ORDER BY c.TABLE_NAME, c.ORDINAL_POSITION
+        """, [schema_name] + tables)
+        signatures = {}
+        for table, update_time, column, column_type, data_type in db.cursor.fetchall():
+            signature = signatures.setdefault(table, {"update_time": str(update_time), "columns": []})
+            signature["columns"].append((column, column_type, data_type))
+        return signatures
+
+    def _build(self, db, schema_name, table, signature):
+        columns = signature["columns"]
+        histograms = self._histograms(db, schema_name, table)
+        # TEXT/BLOB/JSON columns are not sampled: their values do not help with literal formats
+        sampled = [name for name, _, data_type in columns if data_type in _TEXT_TYPES | _RANGE_TYPES and name not in histograms]
+        select_list = ", ".join(f"`{name}`" for name in sampled) or "1"
+        db.cursor.execute(f"SELECT {select_list} FROM `{schema_name}`.`{table}` LIMIT {int(self.sample_rows)}")
+        sample = db.cursor.fetchall()
+        rows = len(sample) if len(sample) < self.sample_rows else db.get_table_rows(schema_name, table)
+
+        stats = {}
+        for name, column_type, data_type in columns:
+            if name in histograms:
+                stats[name] = dict(histograms[name], type=column_type, source="histogram")
+                continue
+            if name not in sampled:
+                stats[name] = {"type": column_type}
+                continue
+            values = [row[sampled.index(name)] for row in sample]
+            present = [v for v in values if v is not None]
+            column = {"type": column_type, "source": "sample", "null_fraction": 1 - len(present) / len(values) if values else 0.0}
+            if present and data_type in _RANGE_TYPES:
+                column["min"], column["max"] = min(present), max(present)
+            if present and data_type in _TEXT_TYPES:
+                counts = Counter(present).most_common(self.top_k + 1)
+                # Only worth listing when a handful of values cover the column (status codes, categories)
+                if len(counts) <= self.top_k or sum(c for _, c in counts[:self.top_k]) >= 0.8 * len(present):
+                    column["top"] = [value for value, _ in counts[:self.top_k]]
+            stats[name] = column
+        return {"signature": signature, "built_at": time.time(), "rows": rows, "columns": stats,
+                "text": self._compact(table, rows, len(sample) >= self.sample_rows, stats)}
+
+    def _histograms(self, db, schema_name, table):
+        try:
+            db.cursor.execute("""
+                SELECT COLUMN_NAME, HISTOGRAM FROM INFORMATION_SCHEMA.COLUMN_STATISTICS
+                WHERE SCHEMA_NAME = %s AND TABLE_NAME = %s
+            """, (schema_name, table))
+            rows = db.cursor.fetchall()
+        except Exception:
+            db.reset_cursor()  # MySQL < 8.0 or MariaDB: no histogram table
+            return {}
+        histograms = {}
+        for column, histogram in rows:
+            histogram = json.loads(histogram) if isinstance(histogram, (str, bytes)) else histogram
+            buckets = histogram.get("buckets") or []
+            if not buckets:
+                continue
+            column_stats = {"null_fraction": histogram.get("null-values", 0.0),
+                            "min": _histogram_value(buckets[0][0]), "max": _histogram_value(buckets[-1][-3 if len(buckets[-1]) > 2 else 0])}
+            if histogram.get("histogram-type") == "singleton":
+                frequencies = []
+                previous = 0.0
+                for value, cumulative in buckets:
+                    frequencies.append((cumulative - previous, _histogram_value(value)))
+                    previous = cumulative
+                column_stats["top"] = [value for _, value in sorted(frequencies, key=lambda f: -f[0])[:self.top_k]]
+            histograms[column] = column_stats
+        return histograms
+
+    def _compact(self, table, rows, estimated, stats):
+        parts = []
+        for name, column in stats.items():
+            text = f"{name} {column['type']}"
+            if "top" in column:
+                text += " in {" + ", ".join(repr(_short(v)) for v in column["top"]) + "}"
+            elif "min" in column:
+                text += f" [{_short(column['min'])}..{_short(column['max'])}]"
+            if column.get("null_fraction"):
+                text += f" nulls {column['null_fraction']:.0%}"
+            parts.append(text)
+        count = f"~{rows:,}" if estimated else f"{rows:,}"
+        return f"{table} ({count} rows): " + "; ".join(parts)
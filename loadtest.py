@@ -0,0 +1,332 @@
+"""Concurrent multi-session load generator for the ControllerAgent.
+
+Simulates N Streamlit sessions as threads, each with its own ControllerAgent (and so
+its own HistoryManager connection), against a local MySQL. Each session replays a
+weighted mix of actions for --duration seconds:
+
+  select    process_query on a SELECT of the session's rows
+  insert    process_query on an INSERT with an explicit id from the session's own block
+            (saved to history with its key, so reverting it deletes just that row)
+  confirm   process_query on an UPDATE -> confirmation_needed (with dry run) -> execute_confirmed
+  revert    revert_to_version of one of the session's earlier versions
+  history   HistoryManager.get_history, as the Query History expander does
+
+The LLM is replaced per session by a scripted fake that returns the intended SQL
+after --llm-latency-ms, so the numbers measure the app and the database, not Groq.
+Prompt building, schema reads, history writes and state capture all run for real.
+
+For every concurrency level in --sessions it prints one JSON line with throughput,
+latency percentiles per action, Threads_connected (sampled) and InnoDB row lock
+waits, plus a summary table on stderr:
+
+    python loadtest.py --host localhost --user root --database mydb --sessions 1,4,16 --duration 30
+
+The test table lives in --schema (default almostsql_loadtest) and is recreated on
+each run; history rows written by the run stay in --database's query_history.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import threading
+import time
+
+from agents.controller_agent import ControllerAgent
+from config.config import Config
+from database.db_connection import DBConnection
+
+ACTIONS = ("select", "insert", "confirm", "revert", "history")
+STATUS_VARIABLES = ("Threads_connected", "Innodb_row_lock_waits", "Innodb_row_lock_time", "Innodb_row_lock_current_waits")
+SEED_ROWS = 20
+ID_BLOCK = 1000000  # ids per session for its INSERTs; seed rows stay below the first block
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))] if ordered else None
+
+
+def parse_mix(text):
+    """'select=50,insert=20' -> {"select": 50, "insert": 20}; unknown actions are rejected."""
+    mix = {}
+    for item in text.split(","):
+        name, _, weight = item.partition("=")
+        name = name.strip()
+        if name not in ACTIONS:
+            raise argparse.ArgumentTypeError(f"unknown action '{name}' (expected one of {', '.join(ACTIONS)})")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+class ScriptedLLM:
+    """Stands in for QueryParserAgent._request_sql: answers with the SQL queued for the next request."""
+    def __init__(self, latency_ms):
+        self.latency_ms = latency_ms
+        self.answer = None
+        self.calls = 0
+
+    def request_sql(self, model, messages, complexity=None):
+        self.calls += 1
+        time.sleep(self.latency_ms / 1000)
+        return self.answer, None
+
+
+class LoadSession:
+    def __init__(self, session_id, id_base, db_params, config, schema_name, args):
+        self.session_id = session_id
+        self.next_id = id_base
+        self.schema_name = schema_name
+        self.args = args
+        self.random = random.Random(args.seed + session_id)
+        self.llm = ScriptedLLM(args.llm_latency_ms)
+        self.controller = ControllerAgent(db_params, config, session={})
+        self.controller.parser._request_sql = self.llm.request_sql
+        self.versions = []
+        self.latencies = {action: [] for action in ACTIONS}
+        self.errors = {action: 0 for action in ACTIONS}
+        self.last_error = None
+
+    def run(self, deadline, mix):
+        actions = list(mix)
+        weights = [mix[action] for action in actions]
+        while time.perf_counter() < deadline:
+            action = self.random.choices(actions, weights)[0]
+            start = time.perf_counter()
+            try:
+                ok = getattr(self, f"do_{action}")()
+            except Exception as e:
+                ok = False
+                self.last_error = f"{action}: {e}"
+            if ok is None:
+                continue  # nothing to do (e.g. revert before any version exists)
+            self.latencies[action].append((time.perf_counter() - start) * 1000)
+            if not ok:
+                self.errors[action] += 1
+
+    def _target(self):
+        # A share of the writes hit the rows every session shares, to provoke lock waits
+        return 0 if self.random.random() < self.args.shared_fraction else self.session_id
+
+    def _query(self, request, sql):
+        self.llm.answer = sql
+        result = self.controller.process_query(request, self.schema_name)
+        if result["status"] == "error":
+            self.last_error = result.get("message")
+        return result
+
+    def do_select(self):
+        target = self.session_id
+        result = self._query(f"show the items of session {target}",
+                             f"SELECT id, name, qty FROM {self.schema_name}.lt_items WHERE session_id = {target}")
+        return result["status"] == "success"
+
+    def do_insert(self):
+        target = self._target()
+        qty = self.random.randint(1, 100)
+        # The id is listed so history captures it as the key; an AUTO_INCREMENT id would leave
+        # the version without keys, and reverting it would delete every row of the table
+        row_id, self.next_id = self.next_id, self.next_id + 1
+        result = self._query(f"add item {row_id} with quantity {qty} for session {target}",
+                             f"INSERT INTO {self.schema_name}.lt_items (id, session_id, name, qty) VALUES ({row_id}, {target}, 'item', {qty})")
+        if result.get("version_id"):
+            self.versions.append(result["version_id"])
+        return result["status"] == "success"
+
+    def do_confirm(self):
+        target = self._target()
+        qty = self.random.randint(1, 100)
+        request = f"set the quantity to {qty} for session {target}"
+        result = self._query(request, f"UPDATE {self.schema_name}.lt_items SET qty = {qty} WHERE session_id = {target}")
+        if result["status"] == "confirmation_needed":
+            result = self.controller.execute_confirmed(request, result["sql_query"], self.schema_name)
+            if result["status"] == "error":
+                self.last_error = result.get("message")
+        if result.get("version_id"):
+            self.versions.append(result["version_id"])
+        return result["status"] == "success"
+
+    def do_revert(self):
+        if not self.versions:
+            return None
+        result = self.controller.revert_to_version(self.versions.pop())
+        if result["status"] == "error":
+            self.last_error = result.get("message")
+        return result["status"] == "success"
+
+    def do_history(self):
+        self.controller.history.get_history()
+        return True
+
+    def close(self):
+        self.controller.shutdown()
+        self.controller.history.db.close()
+
+
+class StatusMonitor:
+    """Samples SHOW GLOBAL STATUS on its own connection every `interval` seconds."""
+    def __init__(self, db_params, interval):
+        self.db = DBConnection(**db_params)
+        self.interval = interval
+        self.samples = []
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+
+    def sample(self):
+        placeholders = ", ".join(["%s"] * len(STATUS_VARIABLES))
+        self.db.cursor.execute(f"SHOW GLOBAL STATUS WHERE Variable_name IN ({placeholders})", STATUS_VARIABLES)
+        return {name: int(value) for name, value in self.db.cursor.fetchall()}
+
+    def _run(self):
+        while not self.stop_event.wait(self.interval):
+            self.samples.append(self.sample())
+
+    def start(self):
+        self.first = self.sample()
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.stop_event.set()
+        self.thread.join()
+        self.last = self.sample()
+        self.db.close()
+        samples = self.samples or [self.last]
+        connected = [s.get("Threads_connected", 0) for s in samples]
+        return {
+            "threads_connected": {"avg": round(sum(connected) / len(connected), 1), "max": max(connected)},
+            "row_lock_waits": self.last.get("Innodb_row_lock_waits", 0) - self.first.get("Innodb_row_lock_waits", 0),
+            "row_lock_time_ms": self.last.get("Innodb_row_lock_time", 0) - self.first.get("Innodb_row_lock_time", 0),
+            "max_current_lock_waits": max(s.get("Innodb_row_lock_current_waits", 0) for s in samples)
+        }
+
+
+def prepare_schema(db_params, schema_name, max_sessions):
+    db = DBConnection(**db_params)
+    try:
+        db.execute_query(f"CREATE SCHEMA IF NOT EXISTS {schema_name}")
+        db.execute_query(f"DROP TABLE IF EXISTS {schema_name}.lt_items")
+        db.execute_query(f"""
+            CREATE TABLE {schema_name}.lt_items (
+                id INT AUTO_INCREMENT PRIMARY KEY,
+                session_id INT NOT NULL,
+                name VARCHAR(64),
+                qty INT,
+                KEY idx_session (session_id)
+            ) ENGINE=InnoDB
+        """)
+        # Session 0 holds the shared rows; sessions 1..N their own
+        rows = [(session_id, f"seed{i}", i) for session_id in range(max_sessions + 1) for i in range(SEED_ROWS)]
+        db.run_in_transaction([(f"INSERT INTO {schema_name}.lt_items (session_id, name, qty) VALUES (%s, %s, %s)", rows)])
+    finally:
+        db.close()
+
+
+def run_level(count, db_params, config, schema_name, args, mix, first_block=1):
+    """One concurrency level; session i inserts ids from block first_block + i (blocks never repeat across levels)."""
+    sessions = [LoadSession(i + 1, (first_block + i) * ID_BLOCK, db_params, config, schema_name, args) for i in range(count)]
+    monitor = StatusMonitor(db_params, args.sample_interval).start()
+    deadline = time.perf_counter() + args.duration
+    start = time.perf_counter()
+    threads = [threading.Thread(target=session.run, args=(deadline, mix)) for session in sessions]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    database = monitor.stop()
+    for session in sessions:
+        session.close()
+
+    latency = {}
+    total = errors = 0
+    for action in ACTIONS:
+        values = [v for session in sessions for v in session.latencies[action]]
+        failed = sum(session.errors[action] for session in sessions)
+        total += len(values)
+        errors += failed
+        if values:
+            latency[action] = {
+                "count": len(values),
+                "errors": failed,
+                "p50_ms": round(percentile(values, 0.50), 1),
+                "p95_ms": round(percentile(values, 0.95), 1),
+                "p99_ms": round(percentile(values, 0.99), 1)
+            }
+    return {
+        "sessions": count,
+        "duration_s": round(elapsed, 2),
+        "actions": total,
+        "errors": errors,
+        "throughput_per_s": round(total / elapsed, 2) if elapsed else 0.0,
+        "latency_ms": latency,
+        "llm_calls": sum(session.llm.calls for session in sessions),
+        "database": database,
+        "last_errors": sorted({session.last_error for session in sessions if session.last_error})[:5]
+    }
+
+
+def print_summary(levels):
+    print(f"{'sessions':>8} {'actions/s':>10} {'errors':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'conns max':>9} {'lock waits':>10}", file=sys.stderr)
+    for level in levels:
+        actions = level["latency_ms"].values()
+        p50, p95, p99 = (max((action[key] for action in actions), default=0.0) for key in ("p50_ms", "p95_ms", "p99_ms"))
+        print(f"{level['sessions']:>8} {level['throughput_per_s']:>10} {level['errors']:>7} {p50:>8} {p95:>8} {p99:>8} "
+              f"{level['database']['threads_connected']['max']:>9} {level['database']['row_lock_waits']:>10}", file=sys.stderr)
+    print("(latency columns: slowest action at each percentile)", file=sys.stderr)
+
+
+def build_arg_parser():
+    parser = argparse.ArgumentParser(description="Simulate concurrent AlmostSQL sessions against MySQL with a scripted LLM.")
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=3306)
+    parser.add_argument("--user", default="root")
+    parser.add_argument("--password", default=os.environ.get("MYSQL_PASSWORD", ""))
+    parser.add_argument("--database", required=True, help="Database holding the query history")
+    parser.add_argument("--schema", default="almostsql_loadtest", help="Schema for the test table (recreated)")
+    parser.add_argument("--sessions", default="1,4,16", help="Comma-separated concurrency levels to run in turn")
+    parser.add_argument("--duration", type=float, default=30, help="Seconds per concurrency level")
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix("select=50,insert=20,confirm=15,revert=5,history=10"),
+                        help="Action weights, e.g. select=50,insert=20,confirm=15,revert=5,history=10")
+    parser.add_argument("--llm-latency-ms", type=float, default=0, help="Simulated LLM latency per translation")
+    parser.add_argument("--shared-fraction", type=float, default=0.1,
+                        help="Share of writes that target rows every session shares (provokes lock waits)")
+    parser.add_argument("--sample-interval", type=float, default=0.5, help="Seconds between SHOW GLOBAL STATUS samples")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", "-o", help="JSONL file for per-level results (default: stdout)")
+    return parser
+
+
+def main(argv=None):
+    args = build_arg_parser().parse_args(argv)
+    db_params = {
+        "host": args.host,
+        "port": args.port,
+        "user": args.user,
+        "password": args.password,
+        "database": args.database
+    }
+    levels = [int(n) for n in args.sessions.split(",") if n.strip()]
+    # No cost-guard confirmations on the small test table, so "confirm" only comes from UPDATE itself
+    config = Config("", {"cost_guard_confirm_rows": 10 ** 12, "cost_guard_block_rows": 10 ** 12})
+    prepare_schema(db_params, args.schema, max(levels))
+
+    out = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+    results = []
+    first_block = 1
+    try:
+        for count in levels:
+            result = run_level(count, db_params, config, args.schema, args, args.mix, first_block)
+            first_block += count
+            results.append(result)
+            out.write(json.dumps(result) + "\n")
+            out.flush()
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    print_summary(results)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,23 +1,29 @@
 import streamlit as st
-from agents.controller_agent import ControllerAgent
 from database.db_connection import DBConnection
+from database.connection_router import parse_replicas
+from database.local_engine import LOCAL_SCHEMA
 from config.config import Config
-import mysql.connector
+from utils.cost_guard import format_estimate
+from utils.result_exporter import available_formats
+from utils.sql_classifier import classify
+from utils.csv_upload import CSV_UPLOAD_KEY, spool_upload, discard_upload
+import os
 import re
 from datetime import date, datetime
 from decimal import Decimal
 
-def get_available_schemas(db_params):
-    db = DBConnection(**db_params)
+def get_available_schemas(router):
+    db = router.connect(read_only=True)
     try:
         return db.get_schemas()
     finally:
         db.close()
 
-def create_schema(schema_name, db_params):
-    db = DBConnection(**db_params)
+def create_schema(schema_name, router):
+    db = router.connect()
     try:
         db.execute_query(f"CREATE SCHEMA IF NOT EXISTS {schema_name}")
+        router.record_write()
     finally:
         db.close()
 
@@ -104,6 +110,43 @@ def format_html_table(table_data):
     html += row_limit_message
     return html
 
+SCHEMA_TABLE_CSS = """
+<style>
+.schema-table {
+    font-family: 'Courier New', Courier, monospace;
+    font-size: 14px;
+    margin: 0 0 10px 0;
+}
+.schema-table ul {
+    list-style-type: none;
+    padding-left: 20px;
+    margin: 0;
+}
+.schema-table li {
+    margin: 5px 0;
+}
+.schema-table .key-indicator {
+    color: #e74c3c;
+    font-size: 12px;
+    margin-left: 5px;
+}
+</style>
+"""
+
+def format_table_details(details):
+    html = "<div class='schema-table'><ul>"
+    for col in details["columns"]:
+        key_label = ""
+        key_types = details["keys"].get(col, [])
+        if "PRIMARY KEY" in key_types:
+            key_label += " (PK)"
+        if "FOREIGN KEY" in key_types:
+            key_label += " (FK)"
+        if "INDEX" in key_types and not ("PRIMARY KEY" in key_types or "FOREIGN KEY" in key_types):
+            key_label += " (INDEX)"
+        html += f"<li>{col}<span class='key-indicator'>{key_label}</span></li>"
+    return html + "</ul></div>"
+
 def setup_connection_details():
     st.title("Setup Connection Details")
     st.write("Please provide the following details to connect to the database and LLM service.")
@@ -118,12 +161,16 @@ def setup_connection_details():
         st.session_state.db_password = ""
     if "db_name" not in st.session_state:
         st.session_state.db_name = ""
+    if "db_replicas" not in st.session_state:
+        st.session_state.db_replicas = ""
 
     groq_api_key = st.text_input("GROQ API Key", value=st.session_state.groq_api_key, type="password")
     db_host = st.text_input("Database Host", value=st.session_state.db_host)
     db_user = st.text_input("Database User", value=st.session_state.db_user)
     db_password = st.text_input("Database Password", value=st.session_state.db_password, type="password")
     db_name = st.text_input("Database Name", value=st.session_state.db_name, placeholder="Enter your preferred schema name")
+    db_replicas = st.text_area("Read Replicas (optional)", value=st.session_state.db_replicas, placeholder="host[:port], one per line",
+                               help="Read-only queries and schema metadata are spread over these; writes always go to the host above.")
 
     if st.button("Save and Proceed"):
         if not db_name:
@@ -139,6 +186,7 @@ def setup_connection_details():
         st.session_state.db_user = db_user
         st.session_state.db_password = db_password
         st.session_state.db_name = db_name
+        st.session_state.db_replicas = db_replicas
         
         try:
             # Connect without database to check/create the schema
@@ -147,6 +195,7 @@ def setup_connection_details():
                 "user": db_user,
                 "password": db_password
             }
+            import mysql.connector
             conn = mysql.connector.connect(**temp_params)
             cursor = conn.cursor()
             cursor.execute(f"CREATE DATABASE IF NOT EXISTS {db_name}")
@@ -165,12 +214,68 @@ def setup_connection_details():
             db.close()
             st.session_state.connection_setup = True
             st.session_state.db_params = db_params
-            st.session_state.config = Config(groq_api_key)
+            st.session_state.config = Config(groq_api_key, {"read_replicas": parse_replicas(db_replicas)})
             st.success(f"Connection established and schema '{db_name}' created if it didn't exist!")
             st.rerun()
         except Exception as e:
             st.error(f"Failed to connect or create schema: {str(e)}")
 
+@st.fragment(run_every=1)
+def query_progress():
+    # Polls the background QueryJob once a second; only this fragment reruns until the query ends
+    progress = st.session_state.controller.poll_query()
+    if progress is None or progress["status"] != "running":
+        if progress is not None:
+            st.session_state.results = [ensure_json_serializable(progress)]
+        else:
+            st.session_state.results = []
+        st.rerun()
+    st.markdown(f'<div class="sql-query"><pre>{progress["sql_query"]}</pre></div>', unsafe_allow_html=True)
+    st.info(f"Running for {progress['elapsed_ms'] / 1000:.1f} s, {progress['rows_fetched']:,} rows fetched"
+            + (" (cancelling...)" if progress["cancel_requested"] else ""))
+    if st.button("Cancel Query", disabled=progress["cancel_requested"]):
+        st.session_state.controller.cancel_query()
+
+def show_revert_plan(plan):
+    if plan["status"] == "error":
+        st.error(plan["message"])
+        return
+    st.markdown(f"**Revert plan to before version {plan['target_version']}**: undoes versions {', '.join(map(str, plan['versions']))} "
+                f"with {plan['statements']} statements ({plan['dropped_steps']} redundant steps skipped)")
+    for step in plan["steps"]:
+        st.code(f"-- {step['kind']} {step['rows']} row(s), versions {step['versions']}\n{step['sql']}", language="sql")
+    if not plan["atomic"]:
+        st.warning("The plan contains schema changes. MySQL commits around DDL, so it cannot be rolled back as a whole.")
+    for warning in plan["warnings"]:
+        st.warning(warning)
+    if st.button("Run Revert Plan", key=f"run_plan_{plan['target_version']}"):
+        with st.spinner("Reverting..."):
+            revert_result = st.session_state.controller.revert_chain(plan["target_version"])
+            revert_result.pop("plan", None)
+            st.session_state.results = [ensure_json_serializable(revert_result)]
+            st.session_state.revert_plan = None
+            st.rerun()
+
+def export_result_controls(sql_query, schema_name):
+    # Streams the full result (not just the rows shown above) to a file on the server
+    col1, col2 = st.columns([1, 3])
+    fmt = col1.selectbox("Export format", available_formats(), key="export_format")
+    if col2.button("Export full result"):
+        with st.spinner("Exporting..."):
+            st.session_state.last_export = st.session_state.controller.export_result(sql_query, schema_name, fmt)
+    export = st.session_state.get("last_export")
+    if not export:
+        return
+    if export["status"] == "error":
+        st.error(export["message"])
+        return
+    st.caption(f"Exported {export['rows']:,} rows ({export['bytes']:,} bytes) in {export['seconds']} s, {export['rows_per_second']:,} rows/s")
+    if st.session_state.config.get("export_dir"):
+        st.caption(f"Written to {export['path']}")
+    elif os.path.exists(export["path"]):
+        with open(export["path"], "rb") as f:
+            st.download_button("Download export", f, file_name=os.path.basename(export["path"]))
+
 def main():
     if not st.session_state.get("connection_setup", False):
         setup_connection_details()
@@ -178,7 +283,7 @@ def main():
 
     db_params = st.session_state.db_params
     if "config" not in st.session_state:
-        st.session_state.config = Config(st.session_state.groq_api_key)
+        st.session_state.config = Config(st.session_state.groq_api_key, {"read_replicas": parse_replicas(st.session_state.get("db_replicas", ""))})
 
     # Custom CSS for title and query output
     st.markdown("""
@@ -215,7 +320,9 @@ def main():
     st.markdown('<div class="almostsql-title">AlmostSQL</div>', unsafe_allow_html=True)
     
     if 'controller' not in st.session_state:
-        st.session_state.controller = ControllerAgent()
+        # Imported here so the connection form renders without loading the agent stack
+        from agents.controller_agent import ControllerAgent
+        st.session_state.controller = ControllerAgent(db_params, st.session_state.config, st.session_state)
     if 'results' not in st.session_state:
         st.session_state.results = []
     if 'confirm_needed' not in st.session_state:
@@ -227,8 +334,22 @@ def main():
     if 'new_schema_input' not in st.session_state:
         st.session_state.new_schema_input = ""
     
-    # Sidebar controls
-    available_schemas = get_available_schemas(db_params)
+    # Sidebar controls (the upload comes first so its local schema is offered in the same run)
+    csv_file = st.sidebar.file_uploader("Upload CSV", type=["csv"])
+    previous_upload = st.session_state.get(CSV_UPLOAD_KEY)
+    if csv_file is not None:
+        # Only the spooled file's path stays in the session; the contents never reach the prompt
+        st.session_state[CSV_UPLOAD_KEY] = spool_upload(csv_file, csv_file.name, csv_file.file_id, previous_upload)
+        st.sidebar.caption(f"Say 'upload csv into <table>' to load {csv_file.name}, or pick '{LOCAL_SCHEMA}' to query it in place")
+        if previous_upload and previous_upload is not st.session_state[CSV_UPLOAD_KEY]:
+            st.session_state.controller.release_local_engine()  # its copy of the replaced file is not reused
+    elif previous_upload:
+        discard_upload(st.session_state.pop(CSV_UPLOAD_KEY))
+        st.session_state.controller.release_local_engine()
+
+    available_schemas = get_available_schemas(st.session_state.controller.router)
+    if st.session_state.get(CSV_UPLOAD_KEY) and st.session_state.config.get("local_engine_enabled", True):
+        available_schemas = available_schemas + [LOCAL_SCHEMA]
     schema_name = st.sidebar.selectbox("Select Schema", available_schemas, key="schema_select")
     
     new_schema = st.sidebar.text_input("Create new schema:", key="new_schema_input")
@@ -237,7 +358,7 @@ def main():
             st.sidebar.error("Schema name must contain only letters, numbers, or underscores.")
         else:
             try:
-                create_schema(new_schema.lower(), db_params)
+                create_schema(new_schema.lower(), st.session_state.controller.router)
                 # Clear only after rerun
                 del st.session_state["new_schema_input"]  # Remove key safely
                 st.rerun()
@@ -245,62 +366,29 @@ def main():
                 st.sidebar.error(f"Error creating schema: {str(e)}")
 
     
-    csv_file = st.sidebar.file_uploader("Upload CSV", type=["csv"])
-    if csv_file is not None:
-        st.session_state.file_content = csv_file.read().decode("utf-8")
-    
-    # Display tables and columns in the sidebar
+    # Table names in the sidebar, one filtered page at a time; columns are read only for ticked tables
     st.sidebar.subheader(f"Tables in {schema_name}")
-    db = DBConnection(**db_params)
+    browser = st.session_state.controller.schema_browser
+    if schema_name == LOCAL_SCHEMA:
+        db = st.session_state.controller.local_engine()
+    else:
+        db = st.session_state.controller.router.connect(read_only=True)
     try:
-        tables = sorted(db.get_tables(schema_name))  # Sort tables alphabetically
-        if not tables:
-            st.sidebar.write("No tables found in this schema.")
+        search = st.sidebar.text_input("Filter tables", key="table_filter")
+        listing = browser.list_tables(db, schema_name, search)
+        if not listing["total"]:
+            st.sidebar.write("No tables match the filter." if search.strip() else "No tables found in this schema.")
         else:
-            html = """
-            <style>
-            .schema-table {
-                font-family: 'Courier New', Courier, monospace;
-                font-size: 14px;
-                margin: 10px 0;
-            }
-            .schema-table ul {
-                list-style-type: none;
-                padding-left: 20px;
-            }
-            .schema-table li {
-                margin: 5px 0;
-            }
-            .schema-table .table-name {
-                font-weight: bold;
-                color: #2c3e50;
-            }
-            .schema-table .key-indicator {
-                color: #e74c3c;
-                font-size: 12px;
-                margin-left: 5px;
-            }
-            </style>
-            <div class="schema-table">
-            """
-            for table in tables:
-                html += f"<p><span class='table-name'>{table}</span></p><ul>"
-                columns = db.get_columns(schema_name, table)
-                key_info = db.get_column_keys(schema_name, table)
-                for col in columns:
-                    key_label = ""
-                    if col in key_info:
-                        key_types = key_info[col]
-                        if "PRIMARY KEY" in key_types:
-                            key_label += " (PK)"
-                        if "FOREIGN KEY" in key_types:
-                            key_label += " (FK)"
-                        if "INDEX" in key_types and not ("PRIMARY KEY" in key_types or "FOREIGN KEY" in key_types):
-                            key_label += " (INDEX)"
-                    html += f"<li>{col}<span class='key-indicator'>{key_label}</span></li>"
-                html += "</ul>"
-            html += "</div>"
-            st.sidebar.markdown(html, unsafe_allow_html=True)
+            if listing["pages"] > 1:
+                # Keyed by schema and filter so the page resets when either changes
+                page = st.sidebar.number_input(f"Page (of {listing['pages']}, {listing['total']} tables)", min_value=1,
+                                               max_value=listing["pages"], value=1, key=f"table_page_{schema_name}_{search}")
+                listing = browser.list_tables(db, schema_name, search, page - 1, listing["version"])
+            st.sidebar.markdown(SCHEMA_TABLE_CSS, unsafe_allow_html=True)
+            for table in listing["tables"]:
+                if st.sidebar.checkbox(table, key=f"browse_{schema_name}.{table}"):
+                    details = browser.describe(db, schema_name, table, listing["version"])
+                    st.sidebar.markdown(format_table_details(details), unsafe_allow_html=True)
     except Exception as e:
         st.sidebar.error(f"Error fetching schema metadata: {str(e)}")
     finally:
@@ -310,19 +398,39 @@ def main():
                             value=st.session_state.input_value,
                             height=150,
                             key="query_input_box")
+    if st.sidebar.checkbox("Translate while typing", value=st.session_state.config.get("speculative_translation_enabled", False),
+                           key="speculative_translation", help="Start the LLM call once the query box is applied (Ctrl+Enter or click away)"):
+        st.session_state.controller.speculate(user_input, schema_name)
     
-    if st.button("Submit Query") and user_input and schema_name:
-        with st.spinner("Processing your query..."):
-            #st.session_state.input_value = " "
-            new_result = st.session_state.controller.process_query(user_input, schema_name)
-            st.session_state.results = [ensure_json_serializable(new_result)]
+    col1, col2 = st.columns([3, 1])
+    timeout_s = col2.number_input("Timeout (s)", min_value=0, value=int(st.session_state.config.get("query_max_execution_ms", 0) / 1000),
+                                  help="MAX_EXECUTION_TIME for SELECTs; 0 = no limit")
+    if col1.button("Submit Query") and user_input and schema_name:
+        if st.session_state.controller.is_csv_load(user_input, schema_name):
+            # CSV loads skip the LLM and report progress as batches land
+            load_bar = st.progress(0.0, text="Loading CSV...")
+            new_result = st.session_state.controller.load_csv(
+                user_input, schema_name, progress=lambda fraction, rows: load_bar.progress(min(fraction, 1.0), text=f"{rows:,} rows loaded"))
+            load_bar.empty()
+        else:
+            with st.spinner("Processing your query..."):
+                #st.session_state.input_value = " "
+                new_result = st.session_state.controller.start_query(user_input, schema_name, max_execution_ms=timeout_s * 1000)
+        st.session_state.results = [ensure_json_serializable(new_result)]
+        st.session_state.last_export = None
             
     if st.session_state.results:
         latest_result = st.session_state.results[-1]
-        if latest_result["status"] == "success":
+        if latest_result["status"] == "running":
+            query_progress()
+        elif latest_result["status"] == "success":
             st.success("Query executed successfully")
             if "result" in latest_result:
                 st.markdown(format_html_table(latest_result.get("result", "No output")), unsafe_allow_html=True)
+                export_sql = latest_result.get("generated_sql") or latest_result["sql_query"]
+                export_statement = classify(export_sql)
+                if isinstance(latest_result.get("result"), dict) and export_statement.statement_type == "SELECT" and export_statement.is_read_only and schema_name != LOCAL_SCHEMA:
+                    export_result_controls(export_sql, schema_name)
                 learning_output = latest_result["learning_output"]
 
                 with st.expander("Learning Output"):
@@ -333,6 +441,8 @@ def main():
                         st.markdown(f"""```sql
                         {sql_part.strip()}
                         """)
+                        if latest_result.get("cost_estimate"):
+                            st.caption(format_estimate(latest_result["cost_estimate"]))
                     else:
                         st.markdown(f"""```text
                         {learning_output}
@@ -342,57 +452,54 @@ def main():
                 st.markdown(f'<div class="sql-query"><pre>Inverse Query Executed: {latest_result["inverse_query"]}</pre></div>', unsafe_allow_html=True)
         elif latest_result["status"] == "error":
             st.error(latest_result["message"])
+            if latest_result.get("cost_estimate"):
+                st.caption(format_estimate(latest_result["cost_estimate"]))
         elif latest_result["status"] == "clarification_needed":
             st.warning(latest_result["message"])
+            # Only parser questions can be answered in place; other messages ask for a new request
+            if latest_result.get("followup"):
+                clarification = st.text_input("Your answer:", key=f"clarify_{abs(hash(latest_result['message']))}")
+                if st.button("Send Clarification") and clarification and schema_name:
+                    with st.spinner("Processing your clarification..."):
+                        clarified_result = st.session_state.controller.process_clarification(
+                            clarification, schema_name, max_execution_ms=timeout_s * 1000, user_input=latest_result.get("user_input"))
+                        st.session_state.results = [ensure_json_serializable(clarified_result)]
+                        st.session_state.last_export = None
+                        st.rerun()
         elif latest_result["status"] == "confirmation_needed":
             st.warning("Confirmation required for the following query:")
             st.markdown("**SQL Query:**")
             st.markdown(f"""```sql
             {latest_result["sql_query"]}
             """)
+            if latest_result.get("cost_estimate"):
+                st.caption(format_estimate(latest_result["cost_estimate"]))
+            preview = latest_result.get("preview")
+            if preview:
+                st.info(f"Dry run (rolled back): {preview['affected_rows']:,} row(s) would be affected")
+                with st.expander("Rows before / after (dry run)"):
+                    st.markdown("**Before**")
+                    st.markdown(format_html_table(preview["before"]), unsafe_allow_html=True)
+                    st.markdown("**After**")
+                    st.markdown(format_html_table(preview["after"]), unsafe_allow_html=True)
             # Use a unique key for the button to avoid Streamlit key conflicts
             confirm_button_key = f"confirm_{latest_result['sql_query']}_{id(latest_result)}"
             if st.button("Confirm Execution", key=confirm_button_key):
                 with st.spinner("Executing confirmed query..."):
-                    try:
-                        db = DBConnection(**db_params)
-                        operation_type, table_name, state_data, state_error = st.session_state.controller.history.capture_state(
-                            latest_result["sql_query"], schema_name
-                        )
-                        if state_error:
-                            st.session_state.results = [ensure_json_serializable({"status": "error", "message": state_error})]
-                        else:
-                            result_exec = db.execute_query(latest_result["sql_query"])
-                            result_exec_serialized = ensure_json_serializable(result_exec)
-                            version_id = st.session_state.controller.history.save_query(
-                                st.session_state.pending_query["input"],
-                                latest_result["sql_query"],
-                                schema_name,
-                                operation_type,
-                                table_name,
-                                state_data
-                            )
-                            st.session_state.results = [{
-                                "status": "success",
-                                "result": result_exec_serialized,
-                                "sql_query": latest_result["sql_query"],
-                                "learning_output": f"For your request: '{st.session_state.pending_query['input']}'\nGenerated SQL: {latest_result['sql_query']}",
-                                "version_id": version_id
-                            }]
-                            # Clear confirmation state
-                            st.session_state.confirm_needed = False
-                            st.session_state.pending_query = None
-                            st.session_state.input_value = " "
-                            st.success("Query executed successfully")
-                            st.rerun()
-                    except Exception as e:
-                        st.session_state.results = [ensure_json_serializable({"status": "error", "message": f"Error executing confirmed query: {str(e)}"})]
-                    finally:
-                        db.close()
-                    if st.session_state.results[-1]["status"] == "error":
-                        st.rerun()
+                    confirmed_result = st.session_state.controller.start_query(
+                        st.session_state.pending_query["input"],
+                        schema_name,
+                        sql_query=latest_result["sql_query"],
+                        confirmed=True,
+                        max_execution_ms=timeout_s * 1000
+                    )
+                    st.session_state.results = [ensure_json_serializable(confirmed_result)]
+                    st.session_state.last_export = None
+                    st.rerun()
     with st.expander("Query History"):
         history = st.session_state.controller.history.get_history()
+        cache = st.session_state.controller.history.db.prepared_cache_info()
+        st.caption(f"Prepared statement cache: {cache['hits']} hits, {cache['misses']} misses, {cache['size']}/{cache['capacity']} statements")
         if history:
             if st.button("Clear History"):
                 with st.spinner("Clearing history..."):
@@ -401,12 +508,40 @@ def main():
             
             for index, (version_id, user_q, sql_q, timestamp, schema_name) in enumerate(history):
                 st.write(f"Version {version_id} ({timestamp}): {user_q} (Schema: {schema_name or 'Unknown'})")
-                if st.button(f"Revert to Version {version_id}", key=f"revert_{version_id}_{index}"):
+                col1, col2 = st.columns(2)
+                if col1.button(f"Revert to Version {version_id}", key=f"revert_{version_id}_{index}"):
                     with st.spinner("Reverting to version..."):
                         revert_result = st.session_state.controller.revert_to_version(version_id)
                         st.session_state.results = [ensure_json_serializable(revert_result)] 
                         if revert_result["status"] == "error":
                             st.rerun()
+                if col2.button(f"Preview revert to before {version_id}", key=f"plan_{version_id}_{index}"):
+                    st.session_state.revert_plan = st.session_state.controller.revert_chain(version_id, dry_run=True)
+
+            plan = st.session_state.get("revert_plan")
+            if plan:
+                show_revert_plan(plan)
+
+    with st.expander("Index Advisor"):
+        if st.button("Analyze Query History", key="analyze_indexes"):
+            with st.spinner("Analyzing workload..."):
+                st.session_state.index_proposals = st.session_state.controller.index_advisor.analyze(schema_name)
+        proposals = st.session_state.get("index_proposals")
+        if proposals is not None and not proposals:
+            st.write("No new indexes suggested for the queries in this schema.")
+        for index, proposal in enumerate(proposals or []):
+            st.markdown(f"""```sql
+            {proposal["ddl"]}
+            """)
+            st.caption(f"Used by {proposal['frequency']} queries | ~{proposal['table_rows']:,} rows | benefit score {proposal['benefit']:,}")
+            if st.button("Validate in Sandbox", key=f"validate_index_{index}"):
+                with st.spinner("Comparing EXPLAIN plans on a sandbox copy..."):
+                    validation = st.session_state.controller.index_advisor.validate(proposal)
+                if validation["status"] == "success":
+                    st.write(f"Estimated rows examined on a {validation['sample_rows']:,}-row sample: "
+                             f"{validation['rows_examined_before']:,} before, {validation['rows_examined_after']:,} after")
+                else:
+                    st.error(validation["message"])
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,95 @@
+from functools import lru_cache
+import re
+
+_SPLIT_RE = re.compile(r"[^a-z0-9]+")
+_CAMEL_RE = re.compile(r"(?<=[a-z0-9])(?=[A-Z])")
+
+
+def _tokens(name):
+    """'storeId', 'store_id' and 'store id' all become ('store', 'id')."""
+    return tuple(t for t in _SPLIT_RE.split(_CAMEL_RE.sub(" ", name).lower()) if t)
+
+
+def _trigrams(key):
+    padded = f"  {key} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def _edit_distance(a, b):
+    if len(a) < len(b):
+        a, b = b, a
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, start=1):
+        current = [i]
+        for j, cb in enumerate(b, start=1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb)))
+        previous = current
+    return previous[-1]
+
+
+class ColumnIndex:
+    """Fuzzy column lookup for one table, built once from its column list.
+
+    Columns are keyed by their token-normalised form ("store id" == "store_id" ==
+    "storeId") and indexed by trigram, so a lookup only scores columns that share a
+    trigram with the fragment instead of scanning every column.
+    """
+    def __init__(self, columns):
+        self.columns = list(columns)
+        self.keys = ["".join(_tokens(c)) for c in self.columns]
+        self.token_sets = [set(_tokens(c)) for c in self.columns]
+        self.postings = {}
+        for position, key in enumerate(self.keys):
+            for gram in _trigrams(key):
+                self.postings.setdefault(gram, set()).add(position)
+
+    def best_matches(self, fragment, k=3):
+        """Up to k (column, score) pairs, best first; score is 1.0 for a normalised exact match."""
+        key = "".join(_tokens(fragment))
+        if not key:
+            return []
+        grams = _trigrams(key)
+        candidates = set()
+        for gram in grams:
+            candidates |= self.postings.get(gram, set())
+        fragment_tokens = set(_tokens(fragment))
+        scored = []
+        for position in candidates:
+            column_key = self.keys[position]
+            if column_key == key:
+                score = 1.0
+            else:
+                column_grams = _trigrams(column_key)
+                dice = 2 * len(grams & column_grams) / (len(grams) + len(column_grams))
+                similarity = 1 - _edit_distance(key, column_key) / max(len(key), len(column_key))
+                overlap = len(fragment_tokens & self.token_sets[position]) / len(fragment_tokens | self.token_sets[position])
+                score = round(max(dice, similarity, overlap) * 0.95, 4)  # never ties with an exact match
+            scored.append((self.columns[position], score))
+        scored.sort(key=lambda item: (-item[1], item[0]))
+        return scored[:k]
+
+    def match(self, fragment, min_score=0.6, margin=0.05):
+        """Return (column, confidence, alternatives).
+
+        column is None when nothing clears min_score, or when the runner-up is within
+        `margin` of the best match; alternatives then lists the tied columns.
+        """
+        matches = self.best_matches(fragment, k=5)
+        matches = [m for m in matches if m[1] >= min_score]
+        if not matches:
+            return None, 0.0, []
+        best_column, best_score = matches[0]
+        tied = [column for column, score in matches if best_score - score <= margin]
+        if len(tied) > 1:
+            return None, best_score, tied
+        return best_column, best_score, []
+
+
+@lru_cache(maxsize=256)
+def _cached_index(columns):
+    return ColumnIndex(columns)
+
+
+def column_index_for(columns):
+    """Shared ColumnIndex for a table's column list; rebuilt only when the columns change."""
+    return _cached_index(tuple(columns))
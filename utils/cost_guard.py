@@ -0,0 +1,186 @@
+import json
+from utils.sql_classifier import classify, split_statements, PUNCT
+from utils.logger import Logger
+
+EXPLAINABLE_TYPES = {"SELECT", "INSERT", "UPDATE", "DELETE"}
+# access_type values that read the whole table (ALL) or the whole index (index)
+FULL_SCAN_ACCESS = {"ALL", "index"}
+
+
+class QueryBlockedError(Exception):
+    def __init__(self, estimate):
+        super().__init__(f"Query blocked by cost guard: {estimate['reason']}")
+        self.estimate = estimate
+
+
+class ConfirmationRequiredError(Exception):
+    def __init__(self, estimate):
+        super().__init__(f"Query requires confirmation: {estimate['reason']}")
+        self.estimate = estimate
+
+
+def _as_number(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def _scan_plan(node, summary):
+    """Walk an EXPLAIN FORMAT=JSON tree, accumulating rows examined, full scans and cartesian joins."""
+    if isinstance(node, list):
+        for item in node:
+            _scan_plan(item, summary)
+        return
+    if not isinstance(node, dict):
+        return
+    for key, value in node.items():
+        if key == "nested_loop" and isinstance(value, list):
+            prefix_rows = 1.0
+            for position, entry in enumerate(value):
+                table = entry.get("table", {}) if isinstance(entry, dict) else {}
+                examined = _as_number(table.get("rows_examined_per_scan"))
+                summary["rows_examined"] += prefix_rows * examined
+                _record_table(table, summary, joined=position > 0)
+                produced = table.get("rows_produced_per_join")
+                prefix_rows = _as_number(produced) if produced is not None else prefix_rows * examined
+                _scan_plan(table, summary)  # materialized/attached subqueries
+        elif key == "table" and isinstance(value, dict):
+            summary["rows_examined"] += _as_number(value.get("rows_examined_per_scan"))
+            _record_table(value, summary, joined=False)
+            _scan_plan(value, summary)
+        elif isinstance(value, (dict, list)):
+            _scan_plan(value, summary)
+
+
+def _record_table(table, summary, joined):
+    name = table.get("table_name")
+    if not name:
+        return
+    if table.get("access_type") in FULL_SCAN_ACCESS:
+        summary["full_scans"].append(name)
+        # A joined table scanned in full with no join/filter condition pairs every row with every row
+        if joined and not table.get("attached_condition") and not table.get("ref"):
+            summary["cartesian_joins"].append(name)
+
+
+def summarize_plan(plan):
+    """Reduce an EXPLAIN FORMAT=JSON document to rows examined, query cost, full scans and cartesian joins."""
+    summary = {"rows_examined": 0.0, "full_scans": [], "cartesian_joins": []}
+    _scan_plan(plan, summary)
+    query_block = plan.get("query_block", {})
+    return {
+        "rows_examined": int(summary["rows_examined"]),
+        "query_cost": _as_number(query_block.get("cost_info", {}).get("query_cost")),
+        "full_scans": sorted(set(summary["full_scans"])),
+        "cartesian_joins": sorted(set(summary["cartesian_joins"]))
+    }
+
+
+class CostGuard:
+    """Pre-execution check that EXPLAINs LLM-generated SQL and decides how to run it.
+
+    Possible actions, most severe wins: block, confirm, limit (inject LIMIT into an
+    unbounded SELECT), timeout (add a MAX_EXECUTION_TIME hint), allow.
+    """
+    def __init__(self, settings):
+        self.settings = settings
+        self.logger = Logger()
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(config.settings)
+
+    def review(self, db, sql_query):
+        """EXPLAIN the query on `db`; returns an estimate dict, or None if the query cannot be explained."""
+        if not self.settings.get("cost_guard_enabled", True):
+            return None
+        try:
+            statements = split_statements(sql_query)
+        except ValueError:
+            return None
+        if len(statements) != 1:
+            return None
+        statement = classify(statements[0])
+        if statement.statement_type not in EXPLAINABLE_TYPES:
+            return None
+
+        try:
+            result = db.execute_query(f"EXPLAIN FORMAT=JSON {statements[0]}")
+            plan = json.loads(result["rows"][0][0])
+        except Exception as e:
+            db.reset_cursor()
+            self.logger.debug(f"Cost guard could not EXPLAIN query: {str(e)}")
+            return None
+
+        estimate = summarize_plan(plan)
+        estimate.update({"actions": [], "reason": "", "sql_query": statements[0]})
+        self._decide(statement, estimate)
+        return estimate
+
+    def _decide(self, statement, estimate):
+        rows = estimate["rows_examined"]
+        reasons = []
+        if rows >= self.settings["cost_guard_block_rows"]:
+            estimate["actions"].append("block")
+            reasons.append(f"estimated {rows:,} rows examined exceeds the block threshold of {self.settings['cost_guard_block_rows']:,}")
+        elif rows >= self.settings["cost_guard_confirm_rows"] or estimate["cartesian_joins"]:
+            estimate["actions"].append("confirm")
+            if estimate["cartesian_joins"]:
+                reasons.append(f"join without a join condition on {', '.join(estimate['cartesian_joins'])}")
+            if rows >= self.settings["cost_guard_confirm_rows"]:
+                reasons.append(f"estimated {rows:,} rows examined")
+
+        # Rewrites only apply to plain SELECTs; SELECT ... INTO / FOR UPDATE are left as written
+        if statement.statement_type == "SELECT" and statement.is_read_only:
+            if rows >= self.settings["cost_guard_limit_rows"] and not self._has_top_level_limit(statement):
+                limit = self.settings["cost_guard_auto_limit"]
+                estimate["sql_query"] = f"{estimate['sql_query'].rstrip().rstrip(';')} LIMIT {limit}"
+                estimate["actions"].append("limit")
+                reasons.append(f"LIMIT {limit} added to an unbounded SELECT")
+            if rows >= self.settings["cost_guard_timeout_rows"]:
+                timeout_ms = self.settings["cost_guard_max_execution_ms"]
+                estimate["sql_query"] = add_max_execution_time(estimate["sql_query"], timeout_ms)
+                estimate["actions"].append("timeout")
+                reasons.append(f"max execution time {timeout_ms} ms")
+
+        if not estimate["actions"]:
+            estimate["actions"].append("allow")
+        estimate["action"] = estimate["actions"][0]
+        estimate["reason"] = "; ".join(reasons)
+
+    def _has_top_level_limit(self, statement):
+        depth = 0
+        for token in statement.tokens:
+            if token.type == PUNCT and token.value == "(":
+                depth += 1
+            elif token.type == PUNCT and token.value == ")":
+                depth -= 1
+            elif depth == 0 and token.is_keyword("LIMIT"):
+                return True
+        return False
+
+
+def add_max_execution_time(sql_query, timeout_ms):
+    """Insert a MAX_EXECUTION_TIME optimizer hint after the first SELECT keyword (MySQL only honours it there)."""
+    if "MAX_EXECUTION_TIME(" in sql_query.upper().replace(" ", ""):
+        return sql_query
+    statement = classify(sql_query)
+    for token in statement.tokens:
+        if token.is_keyword("SELECT"):
+            return f"{sql_query[:token.end]} /*+ MAX_EXECUTION_TIME({int(timeout_ms)}) */{sql_query[token.end:]}"
+    return sql_query
+
+
+def format_estimate(estimate):
+    """One-line summary for display next to the SQL."""
+    if not estimate:
+        return ""
+    parts = [f"Estimated rows examined: {estimate['rows_examined']:,}"]
+    if estimate["full_scans"]:
+        parts.append(f"full scans: {', '.join(estimate['full_scans'])}")
+    if estimate["cartesian_joins"]:
+        parts.append(f"cartesian joins: {', '.join(estimate['cartesian_joins'])}")
+    if estimate.get("reason"):
+        parts.append(estimate["reason"])
+    return " | ".join(parts)
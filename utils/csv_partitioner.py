@@ -0,0 +1,70 @@
+"""Byte-range partitioning of CSV files for parallel parsing.
+
+split_ranges() cuts a file into chunks that start and end on line boundaries;
+parse_range() parses one chunk and is a top-level function so a process pool can
+run it. A quoted field containing a newline can straddle a boundary: parse_range
+detects that (odd quote count or a wrong field count) and raises ValueError, and
+callers fall back to reading the file serially.
+"""
+import csv
+import io
+import os
+
+
+def read_header(path, encoding="utf-8"):
+    """(column names, byte offset of the first data row)."""
+    with open(path, "rb") as f:
+        line = f.readline()
+        offset = f.tell()
+    header = next(csv.reader([line.decode(encoding).lstrip("\ufeff")]), [])
+    return [column.strip() for column in header], offset
+
+
+def split_ranges(path, chunk_bytes, start=0):
+    """[(start, end)] byte ranges from `start` to the end of the file, each ending just after a newline."""
+    size = os.path.getsize(path)
+    ranges = []
+    with open(path, "rb") as f:
+        while start < size:
+            end = start + chunk_bytes
+            if end < size:
+                f.seek(end)
+                f.readline()  # move the boundary to the end of the line it falls in
+                end = f.tell()
+            end = min(end, size)
+            ranges.append((start, end))
+            start = end
+    return ranges
+
+
+def parse_range(path, start, end, width, encoding="utf-8"):
+    """Rows of one byte range as tuples of `width` values; empty fields become None."""
+    with open(path, "rb") as f:
+        f.seek(start)
+        text = f.read(end - start).decode(encoding)
+    if text.count('"') % 2:
+        raise ValueError(f"quoted field crosses the chunk boundary at byte {start}")
+    rows = []
+    for row in csv.reader(io.StringIO(text)):
+        if not row:
+            continue
+        if len(row) != width:
+            raise ValueError(f"expected {width} fields, got {len(row)} in the chunk at byte {start}")
+        rows.append(tuple(value if value != "" else None for value in row))
+    return rows
+
+
+def read_sample(path, rows=5, encoding="utf-8"):
+    """(header, first `rows` data rows) without reading the rest of the file."""
+    with open(path, "r", encoding=encoding, newline="") as f:
+        reader = csv.reader(f)
+        header = [column.strip() for column in next(reader, [])]
+        if header:
+            header[0] = header[0].lstrip("\ufeff")
+        sample = []
+        for row in reader:
+            if len(sample) >= rows:
+                break
+            if row:
+                sample.append(row)
+    return header, sample
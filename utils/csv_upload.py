@@ -0,0 +1,59 @@
+"""Uploaded CSV files and the requests that load them.
+
+Uploads are copied in blocks to a temp file on disk, and only its path is kept in
+the session. Requests such as "upload csv into products" are recognised here, so
+they go to CSVLoaderAgent instead of the LLM.
+"""
+import os
+import re
+import shutil
+import tempfile
+
+# Session key of the current upload: {"path", "name", "file_id", "size"}
+CSV_UPLOAD_KEY = "csv_upload"
+# Uploads are spooled here only; the DuckDB LocalEngine may read no other files
+UPLOAD_DIR = os.path.join(tempfile.gettempdir(), "almostsql_uploads")
+_INTENT_RE = re.compile(r"\b(?:upload|load|import)\s+(?:the\s+)?(?:csv|data|file)\b|\bfrom\s+(?:the\s+)?csv\b")
+_TARGET_RE = re.compile(r"\binto\s+(?:the\s+)?(?:table\s+)?([\w.]+)")
+
+
+def is_csv_intent(user_input):
+    return bool(_INTENT_RE.search(user_input.lower()))
+
+
+def csv_target_table(user_input):
+    """Table named after "into" in a CSV request, or None."""
+    match = _TARGET_RE.search(user_input.lower())
+    if not match or match.group(1) == "table":
+        return None
+    return match.group(1).split(".")[-1]
+
+
+def column_name(header):
+    """CSV header as a column name for a new table: 'Order Date' -> 'order_date'."""
+    return re.sub(r"\W+", "_", header.strip().lower()).strip("_") or "column"
+
+
+def spool_upload(fileobj, name, file_id, previous=None):
+    """Copy an uploaded file to disk in 1 MiB blocks; returns the session entry for it.
+
+    `previous` (the last entry) is returned unchanged for the same upload, and its temp
+    file is removed when a different file replaces it.
+    """
+    if previous and previous.get("file_id") == file_id and os.path.exists(previous["path"]):
+        return previous
+    discard_upload(previous)
+    os.makedirs(UPLOAD_DIR, mode=0o700, exist_ok=True)
+    with tempfile.NamedTemporaryFile(prefix="almostsql_upload_", suffix=".csv", dir=UPLOAD_DIR, delete=False) as f:
+        fileobj.seek(0)
+        shutil.copyfileobj(fileobj, f, 1024 * 1024)
+        path = f.name
+    return {"path": path, "name": name, "file_id": file_id, "size": os.path.getsize(path)}
+
+
+def discard_upload(entry):
+    if entry and entry.get("path"):
+        try:
+            os.remove(entry["path"])
+        except OSError:
+            pass
@@ -0,0 +1,140 @@
+"""Inverse statements for schema changes, built from local metadata before the change runs.
+
+HistoryManager.capture_state reads SHOW CREATE TABLE (and, where the change destroys
+data, the affected rows) and stores the resulting steps with the version, so
+reverting DDL never has to ask the LLM.
+"""
+import re
+
+_INDEX_LINE_RE = re.compile(r"^(?:(?:UNIQUE|FULLTEXT|SPATIAL)\s+)?KEY\s+`((?:[^`]|``)+)`")
+_CONSTRAINT_LINE_RE = re.compile(r"^CONSTRAINT\s+`((?:[^`]|``)+)`")
+
+
+def quote(name):
+    """`schema`.`table` quoting for a possibly qualified, unquoted name."""
+    return ".".join("`" + part.replace("`", "``") + "`" for part in name.split("."))
+
+
+def qualify(name, schema_name):
+    return name if "." in name else f"{schema_name}.{name}"
+
+
+def parse_create_table(create_sql):
+    """Column and index definition lines of a SHOW CREATE TABLE statement.
+
+    Returns {"columns": [(name, line)], "indexes": {name: line}}; the primary key is
+    stored under "PRIMARY" and constraints (foreign keys, checks) under their names.
+    """
+    columns = []
+    indexes = {}
+    for line in create_sql.splitlines()[1:]:
+        line = line.strip().rstrip(",")
+        if line.startswith(")"):
+            break
+        if line.startswith("`"):
+            end = line.index("`", 1)
+            while line[end:end + 2] == "``":
+                end = line.index("`", end + 2)
+            columns.append((line[1:end].replace("``", "`"), line))
+        elif line.startswith("PRIMARY KEY"):
+            indexes["PRIMARY"] = line
+        else:
+            match = _INDEX_LINE_RE.match(line) or _CONSTRAINT_LINE_RE.match(line)
+            if match:
+                indexes[match.group(1).replace("``", "`")] = line
+    return {"columns": columns, "indexes": indexes}
+
+
+def primary_key_columns(layout):
+    """Column names of the PRIMARY KEY line of a parse_create_table() layout; [] without one."""
+    line = layout["indexes"].get("PRIMARY")
+    if not line:
+        return []
+    # PRIMARY KEY (`a`,`b`(10)) -> ["a", "b"]
+    return [name.replace("``", "`") for name in re.findall(r"`((?:[^`]|``)+)`", line[line.index("("):])]
+
+
+def qualified_create(create_sql, table):
+    """SHOW CREATE TABLE output rewritten to create `table` (schema-qualified) instead of the bare name."""
+    return re.sub(r"^CREATE TABLE `(?:[^`]|``)+`", lambda _: f"CREATE TABLE {quote(table)}", create_sql, count=1)
+
+
+def step(sql, params=None, kind="ddl"):
+    """One inverse statement; params is a list of rows for executemany (empty for DDL)."""
+    return {"kind": kind, "sql": sql, "params": params or []}
+
+
+def restore_rows_step(table, columns, rows):
+    placeholders = ", ".join(["%s"] * len(columns))
+    sql = f"INSERT INTO {quote(table)} ({', '.join(quote(c) for c in columns)}) VALUES ({placeholders})"
+    return step(sql, [list(row) for row in rows], "insert")
+
+
+def _column_line(layout, column):
+    for position, (name, line) in enumerate(layout["columns"]):
+        if name.lower() == column.lower():
+            placement = "FIRST" if position == 0 else f"AFTER {quote(layout['columns'][position - 1][0])}"
+            return line, placement
+    raise ValueError(f"column {column} not found")
+
+
+def _index_line(layout, name):
+    for index_name, line in layout["indexes"].items():
+        if index_name.lower() == name.lower():
+            return line
+    raise ValueError(f"index {name} not found")
+
+
+def alter_inverse(table, actions, layout, dropped_values=None):
+    """Inverse steps for ALTER TABLE `table` actions, newest action undone first.
+
+    layout is parse_create_table() of the table before the ALTER. dropped_values maps a
+    dropped column to [(*primary key values, value)] rows, restored with an UPDATE keyed on
+    the primary key after the column is re-added. Raises ValueError for actions with no known inverse.
+    """
+    current = table
+    rename_back = None
+    clauses = []
+    restores = []
+    for action in actions:
+        kind = action["action"]
+        column = action.get("column")
+        if kind == "RENAME_TABLE":
+            current = qualify(action["new_table"], table.split(".")[0]) if "." in table else action["new_table"]
+            rename_back = f"ALTER TABLE {quote(current)} RENAME TO {quote(table)}"
+        elif kind == "RENAME_COLUMN":
+            clauses.append(f"RENAME COLUMN {quote(action['new_column'])} TO {quote(action['old_column'])}")
+        elif kind == "ADD_COLUMN" and column:
+            clauses.append(f"DROP COLUMN {quote(column)}")
+        elif kind == "DROP_COLUMN":
+            line, placement = _column_line(layout, column)
+            clauses.append(f"ADD COLUMN {line} {placement}")
+            if dropped_values and dropped_values.get(column):
+                restores.append((column, dropped_values[column]))
+        elif kind in ("MODIFY_COLUMN", "ALTER_COLUMN"):
+            clauses.append(f"MODIFY COLUMN {_column_line(layout, column)[0]}")
+        elif kind == "CHANGE_COLUMN":
+            line, _ = _column_line(layout, column)
+            clauses.append(f"CHANGE COLUMN {quote(action['new_column'])} {line}")
+        elif kind == "ADD_PRIMARY":
+            clauses.append("DROP PRIMARY KEY")
+        elif kind == "DROP_PRIMARY":
+            clauses.append(f"ADD {_index_line(layout, 'PRIMARY')}")
+        elif kind in ("ADD_INDEX", "ADD_KEY", "ADD_UNIQUE", "ADD_FULLTEXT", "ADD_SPATIAL") and action.get("name"):
+            clauses.append(f"DROP INDEX {quote(action['name'])}")
+        elif kind == "ADD_CONSTRAINT" and action.get("name"):
+            clauses.append(f"DROP CONSTRAINT {quote(action['name'])}")
+        elif kind in ("DROP_INDEX", "DROP_KEY", "DROP_FOREIGN", "DROP_CONSTRAINT", "DROP_CHECK") and action.get("name"):
+            clauses.append(f"ADD {_index_line(layout, action['name'])}")
+        else:
+            raise ValueError(f"no inverse for ALTER action {kind}")
+
+    steps = [step(f"ALTER TABLE {quote(current)} {clause}") for clause in reversed(clauses)]
+    key_columns = primary_key_columns(layout)
+    for column, rows in restores:
+        where = " AND ".join(f"{quote(key)} = %s" for key in key_columns)
+        sql = f"UPDATE {quote(current)} SET {quote(column)} = %s WHERE {where}"
+        steps.append(step(sql, [[row[-1]] + list(row[:-1]) for row in rows], "update"))
+    if rename_back:
+        steps.append(step(rename_back))
+    return steps
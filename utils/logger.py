@@ -2,8 +2,17 @@ import logging
 import os
 from datetime import datetime
 
+_configured = False
+
 class Logger:
     def __init__(self):
+        global _configured
+        self.logger = logging.getLogger()
+        # Every agent builds a Logger; only the first one per process attaches handlers
+        if _configured:
+            return
+        _configured = True
+
         log_dir = "logs"
         if not os.path.exists(log_dir):
             os.makedirs(log_dir)
@@ -12,7 +21,6 @@ class Logger:
         log_file = os.path.join(log_dir, f"app_log_{timestamp}.log")
         
         # Set up file logging
-        self.logger = logging.getLogger()
         self.logger.setLevel(logging.DEBUG)
         
         # File handler
@@ -31,5 +39,8 @@ class Logger:
     def info(self, message):
         self.logger.info(message)
 
+    def warning(self, message):
+        self.logger.warning(message)
+
     def error(self, message):
-        self.logger.error(message)
\ No newline at end of file
+        self.logger.error(message)
@@ -0,0 +1,17 @@
+import string
+
+
+class PromptTemplate:
+    """Minimal stand-in for langchain's f-string PromptTemplate: named {fields}, all required."""
+    def __init__(self, input_variables, template):
+        fields = {name for _, name, _, _ in string.Formatter().parse(template) if name}
+        if fields != set(input_variables):
+            raise ValueError(f"Template fields {sorted(fields)} do not match input_variables {sorted(input_variables)}")
+        self.input_variables = list(input_variables)
+        self.template = template
+
+    def format(self, **kwargs):
+        missing = [name for name in self.input_variables if name not in kwargs]
+        if missing:
+            raise KeyError(f"Missing prompt variables: {', '.join(missing)}")
+        return self.template.format(**kwargs)
@@ -1,3 +1,12 @@
+from utils.sql_classifier import split_statements
+
 def validate_query(query):
-    query = query.lower()
-    return query.strip()
\ No newline at end of file
+    """Return the query without surrounding whitespace or trailing semicolons.
+
+    Literal and identifier case is preserved; raises ValueError for empty input
+    or unterminated quotes/comments.
+    """
+    statements = split_statements(query)
+    if not statements:
+        raise ValueError("Query is empty")
+    return "; ".join(statements)
@@ -0,0 +1,33 @@
+import threading
+import time
+
+class TokenBucket:
+    """Thread-safe token bucket; acquire() blocks until enough tokens have refilled."""
+    def __init__(self, capacity, refill_per_second):
+        self.capacity = float(capacity)
+        self.refill_per_second = float(refill_per_second)
+        self.tokens = float(capacity)
+        self.updated_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    @classmethod
+    def per_minute(cls, amount):
+        return cls(amount, amount / 60.0)
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.refill_per_second)
+        self.updated_at = now
+
+    def acquire(self, amount=1):
+        """Take `amount` tokens, sleeping as needed. Returns the seconds spent waiting."""
+        amount = min(float(amount), self.capacity)  # a single oversized request must still be able to run
+        start_time = time.monotonic()
+        while True:
+            with self.lock:
+                self._refill()
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return time.monotonic() - start_time
+                delay = (amount - self.tokens) / self.refill_per_second
+            time.sleep(delay)
@@ -0,0 +1,104 @@
+import csv
+import importlib.util
+import os
+import tempfile
+import time
+from datetime import datetime
+
+EXPORT_FORMATS = ("csv", "parquet")
+_INTEGER_TYPES = {"TINY", "SHORT", "LONG", "INT24", "LONGLONG", "YEAR", "BIT"}
+_FLOAT_TYPES = {"FLOAT", "DOUBLE"}
+
+
+def parquet_available():
+    # Checked without importing pyarrow, which is only loaded once a Parquet export runs
+    return importlib.util.find_spec("pyarrow") is not None
+
+
+def available_formats():
+    return [fmt for fmt in EXPORT_FORMATS if fmt != "parquet" or parquet_available()]
+
+
+def export_path(fmt, export_dir=None):
+    directory = export_dir or tempfile.gettempdir()
+    os.makedirs(directory, exist_ok=True)
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+    return os.path.join(directory, f"almostsql_export_{timestamp}.{fmt}")
+
+
+def _text(value):
+    if value is None or isinstance(value, str):
+        return value
+    if isinstance(value, (bytes, bytearray)):
+        return bytes(value).decode("utf-8", errors="replace")
+    return str(value)
+
+
+def write_csv(stream, path):
+    rows = 0
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(stream["columns"])
+        for chunk in stream["chunks"]:
+            writer.writerows([_text(value) for value in row] for row in chunk)
+            rows += len(chunk)
+    return rows
+
+
+def _arrow_type(pa, type_name):
+    unsigned = type_name.startswith("UNSIGNED ")
+    base = type_name.replace("UNSIGNED ", "")
+    if base in _INTEGER_TYPES:
+        return pa.uint64() if unsigned else pa.int64()
+    if base in _FLOAT_TYPES:
+        return pa.float64()
+    if base in ("DATE", "NEWDATE"):
+        return pa.date32()
+    if base in ("DATETIME", "TIMESTAMP"):
+        return pa.timestamp("us")
+    if base == "TIME":
+        return pa.duration("us")
+    # DECIMAL stays text to keep its exact precision, as in DBConnection._serialize_result
+    return pa.string()
+
+
+def write_parquet(stream, path):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    # Schema comes from the cursor's column types, not from the first chunk, so a column
+    # that happens to be all NULL in one chunk cannot change type mid-file
+    schema = pa.schema([(name, _arrow_type(pa, type_name)) for name, type_name in zip(stream["columns"], stream["types"])])
+    rows = 0
+    with pq.ParquetWriter(path, schema) as writer:
+        for chunk in stream["chunks"]:
+            arrays = []
+            for position, field in enumerate(schema):
+                values = [row[position] for row in chunk]
+                if field.type == pa.string():
+                    values = [_text(value) for value in values]
+                arrays.append(pa.array(values, type=field.type))
+            writer.write_table(pa.Table.from_arrays(arrays, schema=schema))
+            rows += len(chunk)
+    return rows
+
+
+def export_stream(stream, fmt, path):
+    """Write a DBConnection.stream_query result to `path`; returns rows, bytes and throughput."""
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unsupported export format '{fmt}'")
+    if fmt == "parquet" and not parquet_available():
+        raise ValueError("Parquet export requires pyarrow")
+    if fmt == "parquet":
+        import pyarrow.parquet  # noqa: F401 -- loaded up front so rows/s measures the export, not the import
+    start = time.perf_counter()
+    rows = write_parquet(stream, path) if fmt == "parquet" else write_csv(stream, path)
+    seconds = time.perf_counter() - start
+    return {
+        "path": path,
+        "format": fmt,
+        "rows": rows,
+        "bytes": os.path.getsize(path),
+        "seconds": round(seconds, 3),
+        "rows_per_second": round(rows / seconds, 1) if seconds > 0 else float(rows)
+    }
@@ -0,0 +1,132 @@
+import re
+import threading
+import zlib
+import numpy as np
+
+NGRAM_SIZES = (3, 4)
+DIMENSIONS = 2048
+_LITERAL_RE = re.compile(r"'[^']*'|\"[^\"]*\"|\b\d+(?:\.\d+)?\b")
+
+
+def normalize_request(text):
+    return " ".join(text.lower().split())
+
+
+def request_shape(text):
+    """The request with each literal replaced by <num> or <str>, and the literals in order.
+
+    "show orders for userid 45" -> ("show orders for userid <num>", ["45"]); requests with
+    the same shape differ only in their values and can share a parameterized translation.
+    """
+    literals = _LITERAL_RE.findall(" ".join(text.split()))  # original case: the values get bound as written
+    shape = _LITERAL_RE.sub(lambda m: "<str>" if m.group(0)[0] in "'\"" else "<num>", normalize_request(text))
+    return shape, literals
+
+
+def _vectorize(text):
+    """Hashed character n-gram counts, log-scaled and L2-normalised."""
+    padded = f" {normalize_request(text)} "
+    vector = np.zeros(DIMENSIONS, dtype=np.float32)
+    for size in NGRAM_SIZES:
+        for i in range(len(padded) - size + 1):
+            vector[zlib.crc32(padded[i:i + size].encode("utf-8")) % DIMENSIONS] += 1.0
+    np.log1p(vector, out=vector)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+class SimilarityIndex:
+    """In-process nearest-neighbour index over past (user_query, sql_query) translations.
+
+    Rows are appended as translations are saved, so the index never needs a rebuild;
+    vectors live in one preallocated float32 matrix that doubles when full. `loader`, if
+    given, returns earlier (user_query, sql_query, schema_name, version_id) rows; it runs
+    once, on first use, ahead of any newer row.
+    """
+    def __init__(self, capacity=256, loader=None):
+        self.vectors = np.zeros((capacity, DIMENSIONS), dtype=np.float32)
+        self.entries = []
+        self.positions = {}  # (schema, normalized request) -> row, so re-saved requests replace their old row
+        self.lock = threading.Lock()
+        self.loader = loader
+        self.load_lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def _ensure_loaded(self):
+        if self.loader is None:
+            return
+        with self.load_lock:
+            if self.loader is not None:
+                for user_query, sql_query, schema_name, version_id in self.loader():
+                    self._add(user_query, sql_query, schema_name, version_id)
+                self.loader = None
+
+    def add(self, user_query, sql_query, schema_name, version_id=None, tables=None, fingerprint=None):
+        self._ensure_loaded()
+        self._add(user_query, sql_query, schema_name, version_id, tables, fingerprint)
+
+    def _add(self, user_query, sql_query, schema_name, version_id=None, tables=None, fingerprint=None):
+        if not user_query or not sql_query or sql_query.startswith("CLARIFY:"):
+            return
+        key = (schema_name, normalize_request(user_query))
+        entry = {
+            "version_id": version_id,
+            "user_query": user_query,
+            "sql_query": sql_query,
+            "schema_name": schema_name,
+            "tables": tables or [],
+            "fingerprint": fingerprint,
+            "shape": request_shape(user_query)
+        }
+        vector = _vectorize(user_query)
+        with self.lock:
+            row = self.positions.get(key)
+            if row is None:
+                row = len(self.entries)
+                if row == len(self.vectors):
+                    grown = np.zeros((len(self.vectors) * 2, DIMENSIONS), dtype=np.float32)
+                    grown[:row] = self.vectors
+                    self.vectors = grown
+                self.entries.append(entry)
+                self.positions[key] = row
+            else:
+                self.entries[row] = entry
+            self.vectors[row] = vector
+
+    def get(self, text, schema_name):
+        """The entry saved for exactly this request (same words and literal values), else None."""
+        self._ensure_loaded()
+        with self.lock:
+            row = self.positions.get((schema_name, normalize_request(text)))
+            entry = self.entries[row] if row is not None else None
+        # normalize_request lowercases; literal values must also match in their original case
+        return entry if entry is not None and entry["shape"] == request_shape(text) else None
+
+    def search(self, text, schema_name, k=3, min_score=0.0):
+        """Top-k (score, entry) pairs from the same schema, best first."""
+        self._ensure_loaded()
+        with self.lock:
+            count = len(self.entries)
+            if not count:
+                return []
+            scores = self.vectors[:count] @ _vectorize(text)
+            entries = list(self.entries)
+        results = []
+        for row in np.argsort(-scores):
+            score = float(scores[row])
+            if score < min_score:
+                break
+            if entries[row]["schema_name"] == schema_name:
+                results.append((score, entries[row]))
+                if len(results) == k:
+                    break
+        return results
+
+    def clear(self):
+        self.loader = None
+        with self.lock:
+            self.vectors[:] = 0
+            self.entries = []
+            self.positions = {}
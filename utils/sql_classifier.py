@@ -0,0 +1,569 @@
+"""Token-level SQL tokenizer and statement classifier.
+
+Routing decisions (confirmation, state capture) used to be made with substring
+checks on the lowercased query, so a SELECT on `updated_at` or a table called
+`deleted_orders` looked destructive. Everything here works on tokens, so
+keywords inside string literals, comments and quoted identifiers are ignored,
+and clause text is sliced from the original query with its case preserved.
+"""
+import re
+
+WORD = "WORD"
+IDENT = "IDENT"        # `quoted` identifier
+STRING = "STRING"
+NUMBER = "NUMBER"
+PARAM = "PARAM"        # %s, %(name)s or ?
+VARIABLE = "VARIABLE"  # @var / @@var
+PUNCT = "PUNCT"
+
+# Statement types that need an explicit user confirmation before execution
+DESTRUCTIVE_TYPES = {"UPDATE", "DELETE", "ALTER"}
+READ_ONLY_TYPES = {"SELECT", "SHOW", "DESCRIBE", "EXPLAIN"}
+
+# Keywords that end a table list after FROM/JOIN/UPDATE/INTO
+_TABLE_LIST_END = {
+    "WHERE", "SET", "ON", "USING", "GROUP", "ORDER", "LIMIT", "HAVING", "VALUES", "VALUE",
+    "SELECT", "UNION", "JOIN", "INNER", "LEFT", "RIGHT", "CROSS", "STRAIGHT_JOIN", "NATURAL",
+    "OUTER", "FULL", "WINDOW", "FOR", "LOCK", "INTO", "PARTITION", "WITH", "USE", "IGNORE",
+    "FORCE", "RETURNING", "EXCEPT", "INTERSECT", "AS", "TABLESAMPLE", "LATERAL", "FROM"
+}
+# Keywords that end a top-level WHERE clause
+_WHERE_END = {"GROUP", "ORDER", "LIMIT", "HAVING", "WINDOW", "FOR", "UNION", "LOCK", "INTO", "EXCEPT", "INTERSECT"}
+# Functions whose argument syntax uses FROM (EXTRACT(YEAR FROM d) is not a table reference)
+_FROM_FUNCTIONS = {"EXTRACT", "TRIM", "SUBSTRING", "SUBSTR", "POSITION", "OVERLAY"}
+_MULTI_CHAR_OPERATORS = ("<=>", "<=", ">=", "<>", "!=", ":=", "||", "&&", "<<", ">>", "->>", "->")
+
+_NUMBER_RE = re.compile(r"0[xX][0-9a-fA-F]+|0[bB][01]+|(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?")
+_WORD_RE = re.compile(r"[A-Za-z_$\u0080-\uffff][\w$\u0080-\uffff]*")
+_PARAM_RE = re.compile(r"%\([^)]*\)s|%s|\?")
+_VARIABLE_RE = re.compile(r"@@?[\w$.]*")
+
+
+class SQLTokenizeError(ValueError):
+    pass
+
+
+class Token:
+    __slots__ = ("type", "value", "start", "end")
+
+    def __init__(self, type, value, start, end):
+        self.type = type
+        self.value = value
+        self.start = start
+        self.end = end
+
+    @property
+    def upper(self):
+        return self.value.upper() if self.type == WORD else None
+
+    def is_keyword(self, *keywords):
+        return self.type == WORD and self.value.upper() in keywords
+
+    def __repr__(self):
+        return f"Token({self.type}, {self.value!r})"
+
+
+def tokenize(sql):
+    """Split SQL into tokens, dropping whitespace and comments. Raises SQLTokenizeError on unterminated quotes."""
+    tokens = []
+    i = 0
+    n = len(sql)
+    while i < n:
+        ch = sql[i]
+        if ch.isspace():
+            i += 1
+        elif ch == "#" or (sql.startswith("--", i) and (i + 2 == n or sql[i + 2].isspace())):
+            newline = sql.find("\n", i)
+            i = n if newline == -1 else newline + 1
+        elif sql.startswith("/*", i):
+            close = sql.find("*/", i + 2)
+            if close == -1:
+                raise SQLTokenizeError("Unterminated comment")
+            i = close + 2
+        elif ch in ("'", '"', "`"):
+            j = i + 1
+            chars = []
+            while True:
+                if j >= n:
+                    kind = "identifier" if ch == "`" else "string"
+                    raise SQLTokenizeError(f"Unterminated {kind} starting at position {i}")
+                c = sql[j]
+                if c == "\\" and ch != "`" and j + 1 < n:
+                    chars.append(sql[j:j + 2])
+                    j += 2
+                elif c == ch:
+                    if j + 1 < n and sql[j + 1] == ch:  # doubled quote escapes itself
+                        chars.append(ch)
+                        j += 2
+                    else:
+                        j += 1
+                        break
+                else:
+                    chars.append(c)
+                    j += 1
+            tokens.append(Token(IDENT if ch == "`" else STRING, "".join(chars), i, j))
+            i = j
+        elif ch.isdigit() or (ch == "." and i + 1 < n and sql[i + 1].isdigit()):
+            match = _NUMBER_RE.match(sql, i)
+            tokens.append(Token(NUMBER, match.group(), i, match.end()))
+            i = match.end()
+        elif ch == "@":
+            match = _VARIABLE_RE.match(sql, i)
+            tokens.append(Token(VARIABLE, match.group(), i, match.end()))
+            i = match.end()
+        elif ch in ("%", "?") and _PARAM_RE.match(sql, i):
+            match = _PARAM_RE.match(sql, i)
+            tokens.append(Token(PARAM, match.group(), i, match.end()))
+            i = match.end()
+        else:
+            match = _WORD_RE.match(sql, i)
+            if match:
+                tokens.append(Token(WORD, match.group(), i, match.end()))
+                i = match.end()
+                continue
+            for op in _MULTI_CHAR_OPERATORS:
+                if sql.startswith(op, i):
+                    tokens.append(Token(PUNCT, op, i, i + len(op)))
+                    i += len(op)
+                    break
+            else:
+                tokens.append(Token(PUNCT, ch, i, i + 1))
+                i += 1
+    return tokens
+
+
+def split_statements(sql):
+    """Split on top-level semicolons; returns the statement texts without the separators."""
+    statements = []
+    start = 0
+    for token in tokenize(sql):
+        if token.type == PUNCT and token.value == ";":
+            text = sql[start:token.start].strip()
+            if text:
+                statements.append(text)
+            start = token.end
+    text = sql[start:].strip()
+    if text:
+        statements.append(text)
+    return statements
+
+
+class StatementInfo:
+    def __init__(self, sql, tokens, statement_type, tables=None, where_clause=None, details=None):
+        self.sql = sql
+        self.tokens = tokens
+        self.statement_type = statement_type
+        self.tables = tables or []        # every table referenced, target table first
+        self.where_clause = where_clause  # "WHERE ..." of the top-level statement, original case
+        self.details = details or {}      # statement-specific parse results (e.g. ALTER actions)
+
+    @property
+    def target_table(self):
+        return self.tables[0] if self.tables else None
+
+    @property
+    def is_read_only(self):
+        if self.statement_type not in READ_ONLY_TYPES:
+            return False
+        # SELECT ... INTO OUTFILE/@var and locking reads are not safe to treat as plain reads
+        return not self.details.get("select_into") and not self.details.get("locking_read")
+
+    @property
+    def requires_confirmation(self):
+        return self.statement_type in DESTRUCTIVE_TYPES or self.statement_type == "UNKNOWN"
+
+    def __repr__(self):
+        return f"StatementInfo({self.statement_type}, tables={self.tables}, where={self.where_clause!r})"
+
+
+def _name_at(tokens, i):
+    """Read a possibly schema-qualified name starting at tokens[i]; returns (name, next_index) or (None, i)."""
+    if i >= len(tokens) or tokens[i].type not in (WORD, IDENT):
+        return None, i
+    parts = [tokens[i].value]
+    j = i + 1
+    while j + 1 < len(tokens) and tokens[j].type == PUNCT and tokens[j].value == "." and tokens[j + 1].type in (WORD, IDENT):
+        parts.append(tokens[j + 1].value)
+        j += 2
+    return ".".join(parts), j
+
+
+def _skip_keywords(tokens, i, *keywords):
+    while i < len(tokens) and tokens[i].is_keyword(*keywords):
+        i += 1
+    return i
+
+
+def _depths(tokens):
+    """Parenthesis depth of every token, plus the function name (if any) that opened the innermost paren."""
+    depths = []
+    openers = []
+    depth = 0
+    for idx, token in enumerate(tokens):
+        if token.type == PUNCT and token.value == "(":
+            depths.append((depth, openers[-1] if openers else None))
+            prev = tokens[idx - 1] if idx > 0 else None
+            openers.append(prev.upper if prev is not None and prev.type == WORD else None)
+            depth += 1
+        elif token.type == PUNCT and token.value == ")":
+            depth = max(depth - 1, 0)
+            if openers:
+                openers.pop()
+            depths.append((depth, openers[-1] if openers else None))
+        else:
+            depths.append((depth, openers[-1] if openers else None))
+    return depths
+
+
+def _table_list(tokens, i, depths, refs=None):
+    """Read comma-separated table references (with optional aliases) starting at tokens[i].
+
+    When `refs` is given, each reference is appended as {"table", "alias", "start", "end"},
+    where start/end are character offsets of the table name in the statement.
+    """
+    tables = []
+    depth = depths[i][0] if i < len(tokens) else 0
+    while i < len(tokens):
+        if tokens[i].type == PUNCT and tokens[i].value == "(":
+            break  # derived table; its own FROM is picked up separately
+        name_start = i
+        name, i = _name_at(tokens, i)
+        if name is None or name.upper() in _TABLE_LIST_END:
+            break
+        tables.append(name)
+        name_end = tokens[i - 1].end
+        alias = None
+        # optional alias: [AS] alias
+        if i < len(tokens) and tokens[i].is_keyword("AS"):
+            i += 1
+        if i < len(tokens) and tokens[i].type in (WORD, IDENT) and not (tokens[i].upper or "") in _TABLE_LIST_END:
+            alias = tokens[i].value
+            i += 1
+        if refs is not None:
+            refs.append({"table": name, "alias": alias, "start": tokens[name_start].start, "end": name_end})
+        if i < len(tokens) and tokens[i].type == PUNCT and tokens[i].value == "," and depths[i][0] == depth:
+            i += 1
+            continue
+        break
+    return tables, i
+
+
+def _referenced_tables(tokens, depths, start=0, refs=None):
+    """Tables after every FROM/JOIN at any depth, skipping FROM inside EXTRACT()/TRIM()-style calls."""
+    tables = []
+    for i in range(start, len(tokens)):
+        token = tokens[i]
+        if token.is_keyword("FROM", "JOIN", "STRAIGHT_JOIN") and depths[i][1] not in _FROM_FUNCTIONS:
+            found, _ = _table_list(tokens, i + 1, depths, refs)
+            tables.extend(found)
+    return tables
+
+
+def _top_level_clause(sql, tokens, depths, keyword, end_keywords, start=0):
+    """Original text of the depth-0 clause introduced by `keyword`, up to the next depth-0 end keyword."""
+    begin = None
+    for i in range(start, len(tokens)):
+        if depths[i][0] != 0:
+            continue
+        if begin is None and tokens[i].is_keyword(keyword):
+            begin = i
+        elif begin is not None and (tokens[i].upper in end_keywords or (tokens[i].type == PUNCT and tokens[i].value == ";")):
+            return sql[tokens[begin].start:tokens[i - 1].end]
+    if begin is None:
+        return None
+    return sql[tokens[begin].start:tokens[-1].end]
+
+
+def _single_target(sql, tokens, begin, end, ref):
+    """The table of a single-table UPDATE/DELETE as written, alias kept, so its WHERE can be reused in a SELECT.
+
+    {"table", "alias", "expression" (e.g. "orders o"), "qualifier" (what the WHERE uses: alias or table)}
+    """
+    return {
+        "table": ref["table"],
+        "alias": ref["alias"],
+        "expression": sql[tokens[begin].start:tokens[end - 1].end],
+        "qualifier": ref["alias"] or sql[ref["start"]:ref["end"]]
+    }
+
+
+def _dedupe(names):
+    seen = set()
+    result = []
+    for name in names:
+        key = name.lower()
+        if key not in seen:
+            seen.add(key)
+            result.append(name)
+    return result
+
+
+def _literal(tokens):
+    """Python value of a single literal (optionally signed number, string or NULL); raises ValueError otherwise."""
+    sign = ""
+    if len(tokens) == 2 and tokens[0].type == PUNCT and tokens[0].value in ("-", "+"):
+        sign = tokens[0].value
+        tokens = tokens[1:]
+    if len(tokens) != 1:
+        raise ValueError("not a literal")
+    token = tokens[0]
+    if token.type == NUMBER and not token.value.lower().startswith(("0x", "0b")):
+        value = sign + token.value
+        return int(value) if value.lstrip("+-").isdigit() else float(value)
+    if not sign and token.type == STRING:
+        return token.value
+    if not sign and token.is_keyword("NULL"):
+        return None
+    raise ValueError("not a literal")
+
+
+def _values_rows(tokens, depths, i):
+    """Rows of a literal-only VALUES (...), (...) list starting at tokens[i]; None if any value is an expression."""
+    rows = []
+    base = depths[i][0] if i < len(tokens) else 0
+    while i < len(tokens) and tokens[i].type == PUNCT and tokens[i].value == "(":
+        row, element = [], []
+        i += 1
+        while i < len(tokens) and depths[i][0] > base:
+            if depths[i][0] == base + 1 and tokens[i].type == PUNCT and tokens[i].value == ",":
+                row.append(element)
+                element = []
+            else:
+                element.append(tokens[i])
+            i += 1
+        row.append(element)
+        try:
+            rows.append([_literal(element) for element in row])
+        except ValueError:
+            return None
+        i += 1  # closing paren
+        if i < len(tokens) and tokens[i].type == PUNCT and tokens[i].value == ",":
+            i += 1
+    if i < len(tokens) and not (tokens[i].type == PUNCT and tokens[i].value == ";"):
+        return None  # ON DUPLICATE KEY UPDATE etc.: rows are not plain inserts
+    return rows or None
+
+
+def _parse_alter(tokens, i):
+    """Collect ALTER TABLE actions (rename/add/drop/modify/change column, rename table)."""
+    actions = []
+    n = len(tokens)
+    depth = 0
+    action_start = True
+    while i < n:
+        token = tokens[i]
+        if token.type == PUNCT and token.value == "(":
+            depth += 1
+        elif token.type == PUNCT and token.value == ")":
+            depth -= 1
+        elif depth == 0 and token.type == PUNCT and token.value == ",":
+            action_start = True
+            i += 1
+            continue
+        elif depth == 0 and action_start and token.type == WORD:
+            action_start = False
+            verb = token.upper
+            j = i + 1
+            if verb == "RENAME":
+                if j < n and tokens[j].is_keyword("COLUMN"):
+                    old, j = _name_at(tokens, j + 1)
+                    if j < n and tokens[j].is_keyword("TO"):
+                        new, j = _name_at(tokens, j + 1)
+                        actions.append({"action": "RENAME_COLUMN", "old_column": old, "new_column": new})
+                elif j < n and tokens[j].is_keyword("TO", "AS"):
+                    new, j = _name_at(tokens, j + 1)
+                    actions.append({"action": "RENAME_TABLE", "new_table": new})
+                elif j < n and tokens[j].is_keyword("INDEX", "KEY"):
+                    actions.append({"action": "RENAME_INDEX"})
+                else:
+                    new, j = _name_at(tokens, j)
+                    actions.append({"action": "RENAME_TABLE", "new_table": new})
+            elif verb in ("ADD", "DROP", "MODIFY", "CHANGE", "ALTER"):
+                j = _skip_keywords(tokens, j, "COLUMN")
+                if verb in ("ADD", "DROP") and j < n and tokens[j].is_keyword(
+                        "INDEX", "KEY", "PRIMARY", "UNIQUE", "FOREIGN", "CONSTRAINT", "FULLTEXT", "SPATIAL", "CHECK", "PARTITION"):
+                    action = {"action": f"{verb}_{tokens[j].upper}"}
+                    k = _skip_keywords(tokens, j + 1, "INDEX", "KEY") if not tokens[j].is_keyword("PRIMARY") else n
+                    if k < n and not tokens[k].is_keyword("USING"):
+                        name, _ = _name_at(tokens, k)
+                        if name:
+                            action["name"] = name  # index/constraint name, when the statement gives one
+                    actions.append(action)
+                elif verb == "ADD" and j < n and tokens[j].type == PUNCT and tokens[j].value == "(":
+                    actions.append({"action": "ADD_COLUMN", "column": None})
+                else:
+                    if verb == "DROP":
+                        j = _skip_keywords(tokens, j, "IF", "EXISTS")
+                    elif verb == "ADD":
+                        j = _skip_keywords(tokens, j, "IF", "NOT", "EXISTS")
+                    column, j = _name_at(tokens, j)
+                    action = {"action": f"{verb}_COLUMN", "column": column}
+                    if verb == "CHANGE":
+                        action["new_column"], j = _name_at(tokens, j)
+                    actions.append(action)
+            else:
+                actions.append({"action": verb})
+            i = j
+            continue
+        i += 1
+    return actions
+
+
+def _classify_tokens(sql, tokens):
+    if not tokens:
+        return StatementInfo(sql, tokens, "EMPTY")
+    depths = _depths(tokens)
+    i = 0
+    cte_names = set()
+    # Leading CTEs: WITH [RECURSIVE] name AS (...), ... <statement>
+    if tokens[0].is_keyword("WITH"):
+        i = 1
+        while i < len(tokens) and not (depths[i][0] == 0 and tokens[i].is_keyword("SELECT", "UPDATE", "DELETE", "INSERT", "REPLACE", "TABLE", "VALUES")):
+            prev = tokens[i - 1]
+            if depths[i][0] == 0 and tokens[i].type in (WORD, IDENT) and (prev.is_keyword("WITH", "RECURSIVE") or prev.value == ","):
+                cte_names.add(tokens[i].value.lower())
+            i += 1
+        if i >= len(tokens):
+            return StatementInfo(sql, tokens, "UNKNOWN")
+    while i < len(tokens) and tokens[i].type == PUNCT and tokens[i].value == "(":
+        i += 1  # (SELECT ...) UNION (SELECT ...)
+    if i >= len(tokens) or tokens[i].type != WORD:
+        return StatementInfo(sql, tokens, "UNKNOWN")
+
+    verb = tokens[i].upper
+    where_clause = _top_level_clause(sql, tokens, depths, "WHERE", _WHERE_END, i)
+    details = {}
+
+    if verb in ("SELECT", "TABLE", "VALUES"):
+        refs = []
+        tables = [t for t in _referenced_tables(tokens, depths, refs=refs) if t.lower() not in cte_names]
+        details["table_refs"] = [ref for ref in refs if ref["table"].lower() not in cte_names]
+        top_level = [t.upper for t, (d, _) in zip(tokens, depths) if d == 0 and t.type == WORD]
+        details["select_into"] = "INTO" in top_level
+        details["locking_read"] = "FOR" in top_level and ("UPDATE" in top_level or "SHARE" in top_level) or "LOCK" in top_level
+        return StatementInfo(sql, tokens, "SELECT", _dedupe(tables), where_clause, details)
+
+    if verb in ("SHOW", "DESCRIBE", "DESC", "EXPLAIN"):
+        statement_type = "DESCRIBE" if verb == "DESC" else verb
+        return StatementInfo(sql, tokens, statement_type, _dedupe(_referenced_tables(tokens, depths)), where_clause)
+
+    if verb in ("INSERT", "REPLACE"):
+        j = _skip_keywords(tokens, i + 1, "LOW_PRIORITY", "DELAYED", "HIGH_PRIORITY", "IGNORE", "INTO")
+        target, j = _name_at(tokens, j)
+        if j < len(tokens) and tokens[j].type == PUNCT and tokens[j].value == "(" and j + 1 < len(tokens) and not tokens[j + 1].is_keyword("SELECT", "WITH"):
+            close = j + 1
+            while close < len(tokens) and depths[close][0] > depths[j][0]:
+                close += 1
+            details["columns"] = [t.value for t in tokens[j + 1:close] if t.type in (WORD, IDENT)]
+            j = close + 1
+        if j < len(tokens) and tokens[j].is_keyword("VALUES", "VALUE"):
+            # Literal rows let callers record exactly which keys an INSERT added
+            details["rows"] = _values_rows(tokens, depths, j + 1)
+        tables = ([target] if target else []) + _referenced_tables(tokens, depths, j)
+        return StatementInfo(sql, tokens, "INSERT", _dedupe(tables), None, details)
+
+    if verb == "UPDATE":
+        j = _skip_keywords(tokens, i + 1, "LOW_PRIORITY", "IGNORE")
+        refs = []
+        targets, k = _table_list(tokens, j, depths, refs)
+        single = len(targets) == 1 and k < len(tokens) and tokens[k].is_keyword("SET")
+        details["single_target"] = _single_target(sql, tokens, j, k, refs[0]) if single else None
+        tables = targets + _referenced_tables(tokens, depths, j, refs)
+        details["table_refs"] = refs
+        return StatementInfo(sql, tokens, "UPDATE", _dedupe(tables), where_clause, details)
+
+    if verb == "DELETE":
+        j = _skip_keywords(tokens, i + 1, "LOW_PRIORITY", "QUICK", "IGNORE")
+        refs = []
+        details["single_target"] = None
+        if j < len(tokens) and tokens[j].is_keyword("FROM"):
+            own = []
+            targets, k = _table_list(tokens, j + 1, depths, own)
+            if len(targets) == 1 and (k >= len(tokens) or tokens[k].upper in ("WHERE", "ORDER", "LIMIT") or tokens[k].value == ";"):
+                details["single_target"] = _single_target(sql, tokens, j + 1, k, own[0])
+        else:
+            targets, _ = _table_list(tokens, j, depths)  # DELETE t1, t2 FROM ...
+        tables = targets + _referenced_tables(tokens, depths, j, refs)
+        details["table_refs"] = refs
+        return StatementInfo(sql, tokens, "DELETE", _dedupe(tables), where_clause, details)
+
+    if verb == "DROP":
+        j = _skip_keywords(tokens, i + 1, "TEMPORARY")
+        if j < len(tokens) and tokens[j].is_keyword("TABLE", "TABLES"):
+            j = _skip_keywords(tokens, j + 1, "IF", "EXISTS")
+            tables, _ = _table_list(tokens, j, depths)
+            return StatementInfo(sql, tokens, "DROP_TABLE", tables)
+        if j < len(tokens) and tokens[j].is_keyword("INDEX"):
+            name, k = _name_at(tokens, j + 1)
+            target = _name_at(tokens, k + 1)[0] if k < len(tokens) and tokens[k].is_keyword("ON") else None
+            return StatementInfo(sql, tokens, "DROP_INDEX", [target] if target else [], None, {"index": name})
+        obj = tokens[j].upper if j < len(tokens) else None
+        return StatementInfo(sql, tokens, f"DROP_{obj}" if obj else "UNKNOWN")
+
+    if verb == "CREATE":
+        j = _skip_keywords(tokens, i + 1, "OR", "REPLACE", "TEMPORARY", "UNIQUE", "FULLTEXT", "SPATIAL")
+        if j < len(tokens) and tokens[j].is_keyword("TABLE"):
+            j = _skip_keywords(tokens, j + 1, "IF", "NOT", "EXISTS")
+            target, j = _name_at(tokens, j)
+            tables = ([target] if target else []) + _referenced_tables(tokens, depths, j)
+            if j < len(tokens) and tokens[j].is_keyword("LIKE"):
+                tables += _name_at(tokens, j + 1)[0:1]
+            return StatementInfo(sql, tokens, "CREATE_TABLE", _dedupe([t for t in tables if t]))
+        if j < len(tokens) and tokens[j].is_keyword("INDEX"):
+            on = next((k for k in range(j, len(tokens)) if tokens[k].is_keyword("ON")), None)
+            tables = [_name_at(tokens, on + 1)[0]] if on is not None else []
+            details["index"] = _name_at(tokens, j + 1)[0] if on != j + 1 else None
+            return StatementInfo(sql, tokens, "CREATE_INDEX", [t for t in tables if t], None, details)
+        obj = tokens[j].upper if j < len(tokens) else None
+        return StatementInfo(sql, tokens, f"CREATE_{obj}" if obj else "UNKNOWN")
+
+    if verb == "ALTER":
+        if i + 1 < len(tokens) and tokens[i + 1].is_keyword("TABLE"):
+            target, j = _name_at(tokens, i + 2)
+            details["actions"] = _parse_alter(tokens, j)
+            return StatementInfo(sql, tokens, "ALTER", [target] if target else [], None, details)
+        return StatementInfo(sql, tokens, "ALTER")
+
+    if verb == "TRUNCATE":
+        j = _skip_keywords(tokens, i + 1, "TABLE")
+        target, _ = _name_at(tokens, j)
+        return StatementInfo(sql, tokens, "TRUNCATE", [target] if target else [])
+
+    if verb == "RENAME" and i + 1 < len(tokens) and tokens[i + 1].is_keyword("TABLE", "TABLES"):
+        renames = []
+        j = i + 2
+        while j < len(tokens):
+            old, j = _name_at(tokens, j)
+            if old is None or j >= len(tokens) or not tokens[j].is_keyword("TO"):
+                break
+            new, j = _name_at(tokens, j + 1)
+            renames.append((old, new))
+            if j < len(tokens) and tokens[j].type == PUNCT and tokens[j].value == ",":
+                j += 1
+        details["renames"] = renames
+        return StatementInfo(sql, tokens, "RENAME_TABLE", _dedupe([name for pair in renames for name in pair if name]), None, details)
+
+    return StatementInfo(sql, tokens, verb)
+
+
+def classify(sql):
+    """Classify the first statement in `sql`. Unparseable input is reported as UNKNOWN (which requires confirmation)."""
+    statements = classify_all(sql)
+    return statements[0] if statements else StatementInfo(sql, [], "EMPTY")
+
+
+def classify_all(sql):
+    try:
+        statements = split_statements(sql)
+        return [_classify_tokens(statement, tokenize(statement)) for statement in statements]
+    except SQLTokenizeError:
+        return [StatementInfo(sql, [], "UNKNOWN")]
+
+
+def requires_confirmation(sql):
+    return any(info.requires_confirmation for info in classify_all(sql))
+
+
+def is_read_only(sql):
+    statements = classify_all(sql)
+    return bool(statements) and all(info.is_read_only for info in statements)
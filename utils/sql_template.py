@@ -0,0 +1,123 @@
+"""Parameterized SQL templates: one translation reused for requests that differ only in literals.
+
+"show orders for userid 45" -> SELECT ... WHERE userid = 45 is stored as
+shape "show orders for userid <num>" -> SELECT ... WHERE userid = %s with the request's
+first literal in that slot, so "show orders for userid 12" needs no LLM call.
+A template is only kept when every request literal appears exactly once among the
+SQL literals; literals the model added on its own (LIMIT 100, 'active') stay fixed.
+"""
+from collections import OrderedDict
+from decimal import Decimal
+import re
+import threading
+
+from utils.similarity_index import request_shape
+
+TEMPLATE_CACHE_SIZE = 512
+# Backquoted identifiers are matched only to be skipped; numbers must not touch a word character or dot
+_SQL_LITERAL_RE = re.compile(r"`[^`]*`|'(?:[^'\\]|\\.|'')*'|\"(?:[^\"\\]|\\.|\"\")*\"|(?<![\w.])\d+(?:\.\d+)?(?![\w.])")
+
+# (host, port, schema, shape) -> {"sql", "slots", "tables", "fingerprint"}, shared by every session
+_TEMPLATES = OrderedDict()
+_LOCK = threading.Lock()
+
+
+def literal_value(token):
+    """Python value of a request or SQL literal: str for quoted text, int or Decimal for numbers."""
+    if token[0] in "'\"":
+        return token[1:-1]
+    return Decimal(token) if "." in token else int(token)
+
+
+def build_template(user_query, sql_query):
+    """(shape, {"sql", "slots"}) for a translation, or None when its literals cannot be mapped safely.
+
+    slots lists, per %s in sql, the index of the request literal bound there and whether
+    the SQL had it quoted.
+    """
+    shape, literals = request_shape(user_query)
+    if not literals:
+        return None  # nothing to parameterize; exact reuse covers it
+    values = [literal_value(token) for token in literals]
+    if len(set(values)) != len(values):
+        return None  # "between 5 and 5": no way to tell which slot is which
+    parts = []
+    slots = []
+    position = 0
+    for match in _SQL_LITERAL_RE.finditer(sql_query):
+        token = match.group(0)
+        if token[0] == "`":
+            continue
+        value = literal_value(token)
+        quoted = isinstance(value, str)
+        # A request number may be written quoted in SQL (userid = '45'); request text never becomes a number
+        matches = [i for i, v in enumerate(values) if (str(v) == value if quoted else not isinstance(v, str) and v == value)]
+        if not matches:
+            continue
+        if matches[0] in [index for index, _ in slots]:
+            return None  # the same value twice in the SQL: one may be a model-chosen constant
+        parts.append(sql_query[position:match.start()].replace("%", "%%"))
+        parts.append("%s")
+        slots.append((matches[0], quoted))
+        position = match.end()
+    if len(slots) != len(values):
+        return None  # a request value the SQL does not use verbatim (case change, LIKE pattern, ...)
+    parts.append(sql_query[position:].replace("%", "%%"))
+    return shape, {"sql": "".join(parts), "slots": slots}
+
+
+class TemplateCache:
+    """Process-wide store of parameterized read-only translations, keyed by request shape.
+
+    HistoryManager.index_translation adds a template whenever it indexes a read-only
+    translation with a schema fingerprint; QueryParserAgent.lookup_translation binds new
+    values into it after checking the fingerprint, so a template dies with any change to
+    the columns of the tables it reads.
+    """
+    def __init__(self, db_params, enabled=True):
+        self.key_prefix = (db_params.get("host"), db_params.get("port", 3306))
+        self.enabled = enabled
+
+    @classmethod
+    def from_config(cls, db_params, config):
+        return cls(db_params, config.get("template_cache_enabled", True))
+
+    def learn(self, user_query, sql_query, schema_name, tables, fingerprint):
+        if not fingerprint:
+            return
+        built = build_template(user_query, sql_query)
+        if built is None:
+            return
+        shape, template = built
+        template.update(tables=[t.split(".")[-1] for t in tables], fingerprint=fingerprint)
+        with _LOCK:
+            _TEMPLATES[self.key_prefix + (schema_name, shape)] = template
+            _TEMPLATES.move_to_end(self.key_prefix + (schema_name, shape))
+            while len(_TEMPLATES) > TEMPLATE_CACHE_SIZE:
+                _TEMPLATES.popitem(last=False)
+
+    def lookup(self, user_query, schema_name):
+        """(template, params) for a request with a known shape, else None."""
+        if not self.enabled:
+            return None
+        shape, literals = request_shape(user_query)
+        if not literals:
+            return None
+        with _LOCK:
+            template = _TEMPLATES.get(self.key_prefix + (schema_name, shape))
+            if template is not None:
+                _TEMPLATES.move_to_end(self.key_prefix + (schema_name, shape))
+        if template is None:
+            return None
+        values = [literal_value(token) for token in literals]
+        return template, [str(values[index]) if quoted else values[index] for index, quoted in template["slots"]]
+
+    def invalidate(self, schema_name, tables=None):
+        """Drop templates reading any of `tables` (every template of the schema when None)."""
+        names = None if tables is None else {t.split(".")[-1].strip("`").lower() for t in tables}
+        with _LOCK:
+            for key in list(_TEMPLATES):
+                if key[:3] != self.key_prefix + (schema_name,):
+                    continue
+                if names is None or names & {t.lower() for t in _TEMPLATES[key]["tables"]}:
+                    del _TEMPLATES[key]